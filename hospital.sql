@@ -12,7 +12,9 @@
 CREATE TABLE IF NOT EXISTS especialidad (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     nombre VARCHAR NOT NULL,
-    descripcion TEXT NOT NULL
+    descripcion TEXT NOT NULL,
+    nombre_norm TEXT,           -- normalizar_texto(nombre): sin tildes ni mayúsculas
+    descripcion_norm TEXT       -- normalizar_texto(descripcion)
 );
 
 -- Tabla de médicos
@@ -25,6 +27,11 @@ CREATE TABLE IF NOT EXISTS medico (
     telefono VARCHAR NOT NULL UNIQUE,
     id_especialidad INTEGER NOT NULL,
     horario TEXT,
+    rut_hash TEXT,              -- índice ciego HMAC del RUT
+    correo_hash TEXT,           -- índice ciego HMAC del correo
+    telefono_hash TEXT,         -- índice ciego HMAC del teléfono
+    nombre_norm TEXT,           -- normalizar_texto(nombre): sin tildes ni mayúsculas
+    apellido_norm TEXT,         -- normalizar_texto(apellido)
     FOREIGN KEY (id_especialidad) REFERENCES especialidad(id)
         ON UPDATE NO ACTION ON DELETE NO ACTION
 );
@@ -44,7 +51,11 @@ CREATE TABLE IF NOT EXISTS paciente (
     nacionalidad VARCHAR NOT NULL,
     nombre_emergencia TEXT,
     apellido_emergencia TEXT,
-    telefono_emergencia TEXT
+    telefono_emergencia TEXT,
+    rut_hash TEXT,              -- índice ciego HMAC del RUT
+    correo_hash TEXT,           -- índice ciego HMAC del correo
+    nombre_norm TEXT,           -- normalizar_texto(nombre): sin tildes ni mayúsculas
+    apellido_norm TEXT          -- normalizar_texto(apellido)
 );
 
 -- Tabla de citas médicas
@@ -124,7 +135,7 @@ CREATE TABLE IF NOT EXISTS atencion (
 -- 2. CREACIÓN DE VISTAS
 -- ===========================================================
 
-CREATE VIEW vista_pacientes_medicos AS
+CREATE VIEW IF NOT EXISTS vista_pacientes_medicos AS
 SELECT 
     p.nombre || ' ' || p.apellido AS paciente,
     m.nombre || ' ' || m.apellido AS medico,
@@ -133,7 +144,7 @@ FROM cita c
 JOIN paciente p ON c.id_paciente = p.id
 JOIN medico m ON c.id_medico = m.id;
 
-CREATE VIEW vista_historial_completo AS
+CREATE VIEW IF NOT EXISTS vista_historial_completo AS
 SELECT 
     h.id AS id_historial,
     p.nombre || ' ' || p.apellido AS paciente,
@@ -149,10 +160,31 @@ JOIN tratamiento t ON h.id_tratamiento = t.id;
 -- 3. CREACIÓN DE ÍNDICES
 -- ===========================================================
 
-CREATE INDEX idx_paciente_rut ON paciente(rut);
-CREATE INDEX idx_cita_estado ON cita(estado);
-CREATE INDEX idx_diagnostico_medico ON diagnostico(id_medico);
-CREATE INDEX idx_medico_especialidad ON medico(id_especialidad);
+-- Los UNIQUE sobre rut/correo comparan texto cifrado (aleatorio);
+-- la unicidad real se garantiza sobre los índices ciegos.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_paciente_rut_hash ON paciente(rut_hash);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_paciente_correo_hash ON paciente(correo_hash);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_medico_rut_hash ON medico(rut_hash);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_medico_correo_hash ON medico(correo_hash);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_medico_telefono_hash ON medico(telefono_hash);
+CREATE INDEX IF NOT EXISTS idx_cita_estado ON cita(estado);
+CREATE INDEX IF NOT EXISTS idx_diagnostico_medico ON diagnostico(id_medico);
+CREATE INDEX IF NOT EXISTS idx_medico_especialidad ON medico(id_especialidad);
+-- Claves foráneas usadas en JOIN y en las verificaciones de eliminación,
+-- y columnas de ORDER BY de los listados (migración 4)
+CREATE INDEX IF NOT EXISTS idx_cita_paciente ON cita(id_paciente);
+CREATE INDEX IF NOT EXISTS idx_cita_medico ON cita(id_medico);
+CREATE INDEX IF NOT EXISTS idx_diagnostico_cita ON diagnostico(id_cita);
+CREATE INDEX IF NOT EXISTS idx_diagnostico_fecha ON diagnostico(fecha);
+CREATE INDEX IF NOT EXISTS idx_tratamiento_diagnostico ON tratamiento(id_diagnostico);
+CREATE INDEX IF NOT EXISTS idx_tratamiento_fecha_inicio ON tratamiento(fecha_inicio);
+CREATE INDEX IF NOT EXISTS idx_historial_paciente ON historial(id_paciente);
+CREATE INDEX IF NOT EXISTS idx_historial_diagnostico ON historial(id_diagnostico);
+CREATE INDEX IF NOT EXISTS idx_historial_tratamiento ON historial(id_tratamiento);
+CREATE INDEX IF NOT EXISTS idx_historial_cita ON historial(id_cita);
+CREATE INDEX IF NOT EXISTS idx_historial_fecha_registro ON historial(fecha_registro);
+CREATE INDEX IF NOT EXISTS idx_atencion_diagnostico ON atencion(id_diagnostico);
+CREATE INDEX IF NOT EXISTS idx_atencion_historial ON atencion(id_historial);
 
 -- ===========================================================
 -- 4. TABLA DE HORARIOS DE MÉDICOS (Nueva)
@@ -171,9 +203,105 @@ CREATE TABLE IF NOT EXISTS horario_medico (
         ON UPDATE NO ACTION ON DELETE CASCADE
 );
 
-CREATE INDEX IF NOT EXISTS idx_horario_medico_medico_dia ON horario_medico(id_medico, dia_semana);
+CREATE INDEX IF NOT EXISTS idx_horario_medico_medico_dia_hora ON horario_medico(id_medico, dia_semana, hora_inicio);
+
+
+
+-- ===========================================================
+-- 5. BÚSQUEDA DE TEXTO COMPLETO (FTS5, migración 5)
+-- ===========================================================
+-- Tablas de contenido externo sincronizadas por triggers; el tokenizador
+-- ignora tildes y mayúsculas.
+CREATE VIRTUAL TABLE IF NOT EXISTS diagnostico_fts USING fts5(
+    descripcion,
+    content='diagnostico', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS diagnostico_fts_ai AFTER INSERT ON diagnostico BEGIN
+    INSERT INTO diagnostico_fts(rowid, descripcion) VALUES (new.id, new.descripcion);
+END;
+CREATE TRIGGER IF NOT EXISTS diagnostico_fts_ad AFTER DELETE ON diagnostico BEGIN
+    INSERT INTO diagnostico_fts(diagnostico_fts, rowid, descripcion) VALUES ('delete', old.id, old.descripcion);
+END;
+CREATE TRIGGER IF NOT EXISTS diagnostico_fts_au AFTER UPDATE OF descripcion ON diagnostico BEGIN
+    INSERT INTO diagnostico_fts(diagnostico_fts, rowid, descripcion) VALUES ('delete', old.id, old.descripcion);
+    INSERT INTO diagnostico_fts(rowid, descripcion) VALUES (new.id, new.descripcion);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS tratamiento_fts USING fts5(
+    tratamiento,
+    content='tratamiento', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS tratamiento_fts_ai AFTER INSERT ON tratamiento BEGIN
+    INSERT INTO tratamiento_fts(rowid, tratamiento) VALUES (new.id, new.tratamiento);
+END;
+CREATE TRIGGER IF NOT EXISTS tratamiento_fts_ad AFTER DELETE ON tratamiento BEGIN
+    INSERT INTO tratamiento_fts(tratamiento_fts, rowid, tratamiento) VALUES ('delete', old.id, old.tratamiento);
+END;
+CREATE TRIGGER IF NOT EXISTS tratamiento_fts_au AFTER UPDATE OF tratamiento ON tratamiento BEGIN
+    INSERT INTO tratamiento_fts(tratamiento_fts, rowid, tratamiento) VALUES ('delete', old.id, old.tratamiento);
+    INSERT INTO tratamiento_fts(rowid, tratamiento) VALUES (new.id, new.tratamiento);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS historial_fts USING fts5(
+    observaciones, alergias, resultado_examen,
+    content='historial', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS historial_fts_ai AFTER INSERT ON historial BEGIN
+    INSERT INTO historial_fts(rowid, observaciones, alergias, resultado_examen) VALUES (new.id, new.observaciones, new.alergias, new.resultado_examen);
+END;
+CREATE TRIGGER IF NOT EXISTS historial_fts_ad AFTER DELETE ON historial BEGIN
+    INSERT INTO historial_fts(historial_fts, rowid, observaciones, alergias, resultado_examen) VALUES ('delete', old.id, old.observaciones, old.alergias, old.resultado_examen);
+END;
+CREATE TRIGGER IF NOT EXISTS historial_fts_au AFTER UPDATE OF observaciones, alergias, resultado_examen ON historial BEGIN
+    INSERT INTO historial_fts(historial_fts, rowid, observaciones, alergias, resultado_examen) VALUES ('delete', old.id, old.observaciones, old.alergias, old.resultado_examen);
+    INSERT INTO historial_fts(rowid, observaciones, alergias, resultado_examen) VALUES (new.id, new.observaciones, new.alergias, new.resultado_examen);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS atencion_fts USING fts5(
+    descripcion,
+    content='atencion', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS atencion_fts_ai AFTER INSERT ON atencion BEGIN
+    INSERT INTO atencion_fts(rowid, descripcion) VALUES (new.id, new.descripcion);
+END;
+CREATE TRIGGER IF NOT EXISTS atencion_fts_ad AFTER DELETE ON atencion BEGIN
+    INSERT INTO atencion_fts(atencion_fts, rowid, descripcion) VALUES ('delete', old.id, old.descripcion);
+END;
+CREATE TRIGGER IF NOT EXISTS atencion_fts_au AFTER UPDATE OF descripcion ON atencion BEGIN
+    INSERT INTO atencion_fts(atencion_fts, rowid, descripcion) VALUES ('delete', old.id, old.descripcion);
+    INSERT INTO atencion_fts(rowid, descripcion) VALUES (new.id, new.descripcion);
+END;
+
+-- ===========================================================
+-- 6. COLUMNAS NORMALIZADAS (migración 6)
+-- ===========================================================
+-- <campo>_norm guarda el texto sin tildes ni mayúsculas para búsquedas por
+-- prefijo con índice. Lo calcula la aplicación al insertar y actualizar
+-- (normalizar_texto); no hay triggers, para que cualquier cliente de SQLite
+-- pueda escribir en estas tablas (migración 8).
+CREATE INDEX IF NOT EXISTS idx_especialidad_nombre_norm ON especialidad(nombre_norm);
+CREATE INDEX IF NOT EXISTS idx_especialidad_descripcion_norm ON especialidad(descripcion_norm);
+CREATE INDEX IF NOT EXISTS idx_paciente_nombre_norm ON paciente(nombre_norm);
+CREATE INDEX IF NOT EXISTS idx_paciente_apellido_norm ON paciente(apellido_norm);
+CREATE INDEX IF NOT EXISTS idx_medico_nombre_norm ON medico(nombre_norm);
+CREATE INDEX IF NOT EXISTS idx_medico_apellido_norm ON medico(apellido_norm);
 
+-- ===========================================================
+-- 7. PAGINACIÓN POR CURSOR (migración 7)
+-- ===========================================================
+-- Cubre el orden (fecha, hora, id) de los listados de citas; reemplaza a
+-- idx_cita_fecha. historial usa idx_historial_fecha_registro.
+CREATE INDEX IF NOT EXISTS idx_cita_fecha_hora ON cita(fecha, hora);
 
+-- ===========================================================
+-- VERSIÓN DEL ESQUEMA
+-- ===========================================================
+-- Debe coincidir con la última migración de modulos/db/migraciones.py
+PRAGMA user_version = 8;
 
 -- ===========================================================
 -- FIN DEL SCRIPT
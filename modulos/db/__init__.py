@@ -1,18 +1,25 @@
-from .db import conectar, existe_tabla_id
+from .db import conectar, abrir_conexion, transaccion, estadisticas_pool, existe_tabla_id
+from .db import existe_ids, ids_faltantes
 from .utilidades import formatear_rut, validar_rut, validar_email, validar_telefono
-from .busqueda import buscar_registros_exactos
+from .busqueda import buscar_registros_exactos, buscar_registros, iterar_registros
 
 # También importamos los módulos principales para que estén disponibles
 from . import (
+    asesor_indices,
     atencion,
     busqueda,
     cita,
+    dataframes,
     db,
     diagnostico,
     especialidad,
     historial,
+    importacion,
     medico,
+    migraciones,
     paciente,
+    recifrado,
+    registro,
     tratamiento,
     utilidades
 )
@@ -20,21 +27,34 @@ from . import (
 # Exponer las funciones y módulos principales
 __all__ = [
     'conectar',
+    'abrir_conexion',
+    'transaccion',
+    'estadisticas_pool',
     'existe_tabla_id',
+    'existe_ids',
+    'ids_faltantes',
     'formatear_rut',
     'validar_rut',
     'validar_email',
     'validar_telefono',
     'buscar_registros_exactos',
+    'buscar_registros',
+    'iterar_registros',
+    'asesor_indices',
     'atencion',
     'busqueda',
     'cita',
+    'dataframes',
     'db',
     'diagnostico',
     'especialidad',
     'historial',
+    'importacion',
     'medico',
+    'migraciones',
     'paciente',
+    'recifrado',
+    'registro',
     'tratamiento',
     'utilidades'
 ]
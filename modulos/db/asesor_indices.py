@@ -0,0 +1,119 @@
+import re
+import sqlite3
+from collections import OrderedDict
+from contextlib import contextmanager
+from .db import DB_PATH, pool_conexiones, registrar_funciones
+
+# ======================================================
+# ASESOR DE ÍNDICES
+# ======================================================
+# Registra el SQL que emiten las funciones de modulos/db (set_trace_callback
+# sobre las conexiones del pool), le aplica EXPLAIN QUERY PLAN y reporta los
+# recorridos completos de tabla (SCAN) y los ordenamientos en B-tree temporal.
+
+SENTENCIAS_ANALIZABLES = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+# Pasos del plan que no indican un problema aunque empiecen por SCAN (un
+# recorrido por índice es el orden pedido por un listado sin filtros)
+SCAN_INOFENSIVOS = ("VIRTUAL TABLE", "CONSTANT ROW", "USING INDEX", "USING COVERING INDEX")
+
+_LITERALES = re.compile(r"x'[0-9a-fA-F]*'|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def normalizar_sql(sql):
+    """Reemplaza literales por '?' y compacta espacios, para agrupar consultas iguales."""
+    return " ".join(_LITERALES.sub("?", sql).split())
+
+
+@contextmanager
+def capturar_consultas():
+    """
+    with capturar_consultas() as consultas: ...
+
+    Durante el bloque, las conexiones que entrega el pool registran cada
+    sentencia ejecutada (con los parámetros ya expandidos). Al salir,
+    'consultas' es un OrderedDict {sql_normalizado: {'ejemplo': sql, 'veces': n}}.
+    """
+    consultas = OrderedDict()
+
+    def _registrar(sql):
+        if not sql.lstrip().upper().startswith(SENTENCIAS_ANALIZABLES):
+            return
+        clave = normalizar_sql(sql)
+        entrada = consultas.setdefault(clave, {'ejemplo': sql, 'veces': 0})
+        entrada['veces'] += 1
+
+    anterior = pool_conexiones.rastreo
+    pool_conexiones.rastreo = _registrar
+    try:
+        yield consultas
+    finally:
+        pool_conexiones.rastreo = anterior
+
+
+def plan_consulta(cursor, sql):
+    """Devuelve los pasos de EXPLAIN QUERY PLAN como lista de textos."""
+    cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+    return [fila[3] for fila in cursor.fetchall()]
+
+
+def problemas_plan(pasos):
+    """Filtra del plan los recorridos completos y los B-tree temporales."""
+    problemas = []
+    for paso in pasos:
+        if paso.startswith("SCAN ") and not any(x in paso for x in SCAN_INOFENSIVOS):
+            problemas.append(paso)
+        elif "USE TEMP B-TREE" in paso:
+            problemas.append(paso)
+    return problemas
+
+
+def analizar_consultas(consultas, ruta=DB_PATH):
+    """
+    Aplica EXPLAIN QUERY PLAN a las consultas capturadas.
+
+    Args:
+        consultas: Resultado de capturar_consultas()
+        ruta: Base de datos sobre la que se planifican
+
+    Returns:
+        list: [{'sql', 'veces', 'plan', 'problemas'}], primero las que tienen
+            problemas y, entre ellas, las más ejecutadas
+    """
+    hallazgos = []
+    # Conexión aparte y fuera del pool: EXPLAIN no ejecuta la sentencia
+    conexion = sqlite3.connect(ruta)
+    registrar_funciones(conexion)
+    try:
+        cursor = conexion.cursor()
+        for clave, entrada in consultas.items():
+            try:
+                pasos = plan_consulta(cursor, entrada['ejemplo'])
+            except sqlite3.Error as e:
+                pasos = [f"(no se pudo planificar: {e})"]
+            hallazgos.append({
+                'sql': clave,
+                'veces': entrada['veces'],
+                'plan': pasos,
+                'problemas': problemas_plan(pasos),
+            })
+    finally:
+        conexion.close()
+    hallazgos.sort(key=lambda h: (not h['problemas'], -h['veces']))
+    return hallazgos
+
+
+def informe(hallazgos, solo_problemas=True):
+    """Texto legible con el resultado de analizar_consultas."""
+    lineas = []
+    con_problemas = [h for h in hallazgos if h['problemas']]
+    lineas.append(
+        f"Consultas distintas: {len(hallazgos)} | con SCAN o B-tree temporal: {len(con_problemas)}"
+    )
+    for hallazgo in (con_problemas if solo_problemas else hallazgos):
+        lineas.append("")
+        lineas.append(f"[{hallazgo['veces']}x] {hallazgo['sql']}")
+        for paso in hallazgo['plan']:
+            marca = "  ⚠️ " if paso in hallazgo['problemas'] else "     "
+            lineas.append(f"{marca}{paso}")
+    return "\n".join(lineas)
@@ -1,67 +1,76 @@
-from .db import conectar
+import sqlite3
+from .db import abrir_conexion, seleccionar_columnas, primera_referencia_faltante, LECTURA_TAMANO_BLOQUE
+from .busqueda import iterar_registros
+
+# Columnas disponibles en obtener_atenciones (nombre -> expresión SQL), en el orden por defecto
+COLUMNAS_ATENCIONES = {
+    "id": "a.id",
+    "descripcion": "a.descripcion",
+    "diagnostico": "d.descripcion",
+    "historial": "h.observaciones",
+    "fecha_registro": "h.fecha_registro",
+}
+ORIGEN_ATENCIONES = """atencion a
+                JOIN diagnostico d ON a.id_diagnostico = d.id
+                JOIN historial h ON a.id_historial = h.id"""
 
 def eliminar_atencion(id_atencion):
     try:
-        conn, cursor = conectar()
-        cursor.execute("DELETE FROM atencion WHERE id = ?", (id_atencion,))
-        cambios = cursor.rowcount
-        conn.commit()
-        conn.close()
+        with abrir_conexion() as (conn, cursor):
+            cursor.execute("DELETE FROM atencion WHERE id = ?", (id_atencion,))
+            cambios = cursor.rowcount
+            conn.commit()
         if cambios > 0:
             return True, f"Atención ID {id_atencion} eliminada correctamente"
         return False, f"No se encontró la atención con ID {id_atencion}"
     except Exception as e:
-        try:
-            conn.close()
-        except:
-            pass
         return False, str(e)
 
 def agregar_atencion(id_diagnostico, id_historial, descripcion):
-    from .db import existe_tabla_id
-    
-    # Validar que existan las referencias
-    if not existe_tabla_id("diagnostico", id_diagnostico):
-        return False, "El diagnóstico especificado no existe"
-    if not existe_tabla_id("historial", id_historial):
-        return False, "El historial especificado no existe"
-    
     try:
-        conn, cursor = conectar()
-        cursor.execute("""
-            INSERT INTO atencion (id_diagnostico, id_historial, descripcion)
-            VALUES (?, ?, ?)
-        """, (id_diagnostico, id_historial, descripcion))
-        id_generado = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with abrir_conexion() as (conn, cursor):
+            cursor.execute("""
+                INSERT INTO atencion (id_diagnostico, id_historial, descripcion)
+                VALUES (?, ?, ?)
+            """, (id_diagnostico, id_historial, descripcion))
+            id_generado = cursor.lastrowid
+            conn.commit()
         return True, f"Atención ID {id_generado} agregada correctamente"
+    except sqlite3.IntegrityError as e:
+        mensaje = primera_referencia_faltante([
+            ("diagnostico", id_diagnostico, "El diagnóstico especificado no existe"),
+            ("historial", id_historial, "El historial especificado no existe"),
+        ])
+        return False, mensaje or str(e)
     except Exception as e:
-        try:
-            conn.close()
-        except:
-            pass
         return False, str(e)
 
-def obtener_atenciones():
+def obtener_atenciones(columnas=None):
+    """Devuelve las atenciones como tuplas en el orden de 'columnas' (None = COLUMNAS_ATENCIONES)."""
+    _, select = seleccionar_columnas(COLUMNAS_ATENCIONES, columnas)
     try:
-        conn, cursor = conectar()
-        cursor.execute("""
-            SELECT a.id, a.descripcion,
-                   d.descripcion AS diagnostico,
-                   h.observaciones AS historial,
-                   h.fecha_registro
-            FROM atencion a
-            JOIN diagnostico d ON a.id_diagnostico = d.id
-            JOIN historial h ON a.id_historial = h.id
-            ORDER BY h.fecha_registro DESC
-        """)
-        datos = cursor.fetchall()
-        conn.close()
-        return datos
+        with abrir_conexion() as (_, cursor):
+            cursor.execute(f"""
+                SELECT {select}
+                FROM {ORIGEN_ATENCIONES}
+                ORDER BY h.fecha_registro DESC
+            """)
+            return cursor.fetchall()
     except Exception as e:
-        try:
-            conn.close()
-        except:
-            pass
         return []
+
+def iterar_atenciones(columnas=None, tamano_bloque=LECTURA_TAMANO_BLOQUE, **opciones):
+    """
+    Generador sobre las atenciones, de la más reciente a la más antigua
+    (fecha de registro del historial), leídas con fetchmany: memoria
+    constante aunque la tabla sea grande.
+
+    Args:
+        columnas: Columnas de COLUMNAS_ATENCIONES (None = todas)
+        tamano_bloque: Filas por fetchmany
+        **opciones: filtros, entre, en... como en buscar_registros
+    """
+    opciones.setdefault("orden", ["-fecha_registro"])
+    return iterar_registros(
+        COLUMNAS_ATENCIONES, tamano_bloque, origen=ORIGEN_ATENCIONES, columnas=columnas, **opciones
+    )
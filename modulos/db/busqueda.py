@@ -1,4 +1,265 @@
-from .db import conectar, TABLAS_VALIDAS
+import json
+import re
+from .db import abrir_conexion, TABLAS_VALIDAS, TABLAS_TEXTO_COMPLETO, COLUMNAS_NORMALIZADAS, COLUMNAS_INDICE_CIEGO
+from .db import COLUMNAS_TABLAS, LECTURA_TAMANO_BLOQUE, seleccionar_columnas
+from .utilidades import normalizar_texto
+
+# ======================================================
+# CONSTRUCTOR DE CONSULTAS VALIDADAS
+# ======================================================
+def _columnas_disponibles(tabla):
+    """Whitelist {nombre: expresión SQL} para filtrar y ordenar.
+
+    Con un nombre de tabla son sus columnas de COLUMNAS_TABLAS más las
+    <campo>_norm y <campo>_hash; con un dict (consultas con JOIN) se usa tal cual.
+    """
+    if isinstance(tabla, str):
+        if tabla not in COLUMNAS_TABLAS:
+            raise ValueError(f"Tabla '{tabla}' no permitida. Tablas válidas: {TABLAS_VALIDAS}")
+        nombres = list(COLUMNAS_TABLAS[tabla])
+        nombres += [f"{campo}_norm" for campo in COLUMNAS_NORMALIZADAS.get(tabla, ())]
+        nombres += [f"{campo}_hash" for campo in COLUMNAS_INDICE_CIEGO.get(tabla, ())]
+        return {nombre: nombre for nombre in nombres}
+    return dict(tabla)
+
+def _expresion(disponibles, columna):
+    if columna not in disponibles:
+        raise ValueError(f"Columna no permitida: '{columna}'. Columnas válidas: {list(disponibles)}")
+    return disponibles[columna]
+
+def _vacio(valor):
+    return valor is None or (isinstance(valor, str) and valor.strip() == "")
+
+def _parsear_orden(disponibles, orden):
+    """["fecha", "-id"] -> [(nombre, expresión, descendente)], terminando siempre
+    en 'id' (si está disponible) para que el orden sea total y sirva de cursor."""
+    if orden is None:
+        orden = ["id"] if "id" in disponibles else []
+    elif isinstance(orden, str):
+        orden = [orden]
+    partes = []
+    for item in orden:
+        descendente = item.startswith("-")
+        nombre = item[1:] if descendente else item
+        partes.append((nombre, _expresion(disponibles, nombre), descendente))
+    if partes and "id" in disponibles and all(nombre != "id" for nombre, _, _ in partes):
+        partes.append(("id", disponibles["id"], partes[-1][2]))
+    return partes
+
+def _condicion_cursor(partes, despues_de):
+    """Condición keyset "después de esta fila" para el orden dado."""
+    if len(despues_de) != len(partes):
+        raise ValueError(f"El cursor debe tener {len(partes)} valores: {[p[0] for p in partes]}")
+    direcciones = {descendente for _, _, descendente in partes}
+    if len(direcciones) == 1:
+        # Misma dirección en todas: comparación de tuplas, que usa el índice
+        operador = "<" if direcciones.pop() else ">"
+        expresiones = ", ".join(expr for _, expr, _ in partes)
+        marcas = ", ".join("?" for _ in partes)
+        return f"({expresiones}) {operador} ({marcas})", list(despues_de)
+    # Direcciones mixtas: (a > ?) OR (a = ? AND b < ?) OR ...
+    ramas = []
+    params = []
+    for i, (_, expr, descendente) in enumerate(partes):
+        iguales = [f"{partes[j][1]} = ?" for j in range(i)]
+        ramas.append("(" + " AND ".join(iguales + [f"{expr} {'<' if descendente else '>'} ?"]) + ")")
+        params.extend(despues_de[:i])
+        params.append(despues_de[i])
+    return "(" + " OR ".join(ramas) + ")", params
+
+def _condiciones(disponibles, filtros=None, entre=None, en=None, prefijo=None, contiene=None):
+    """Condiciones WHERE (y sus parámetros, en orden) de los filtros de construir_consulta."""
+    condiciones = []
+    params = []
+    for columna, valor in (filtros or {}).items():
+        expr = _expresion(disponibles, columna)
+        if _vacio(valor):
+            continue
+        condiciones.append(f"{expr} = ?")
+        params.append(valor)
+    for columna, rango in (entre or {}).items():
+        expr = _expresion(disponibles, columna)
+        desde, hasta = rango
+        if not _vacio(desde):
+            condiciones.append(f"{expr} >= ?")
+            params.append(desde)
+        if not _vacio(hasta):
+            condiciones.append(f"{expr} <= ?")
+            params.append(hasta)
+    for columna, valores in (en or {}).items():
+        expr = _expresion(disponibles, columna)
+        condiciones.append(f"{expr} IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(valores), default=str))
+    for columna, texto in (prefijo or {}).items():
+        expr = _expresion(disponibles, columna)
+        if _vacio(texto):
+            continue
+        condiciones.append(f"{expr} >= ? AND {expr} < ?")
+        params.extend(rango_prefijo(texto))
+    for columna, texto in (contiene or {}).items():
+        expr = _expresion(disponibles, columna)
+        if _vacio(texto):
+            continue
+        # normalizar() es la función SQL de registrar_funciones (conexiones del pool)
+        condiciones.append(f"instr(normalizar({expr}), ?) > 0")
+        params.append(normalizar_texto(texto).strip())
+    return condiciones, params
+
+def construir_consulta(tabla, columnas=None, filtros=None, entre=None, en=None, prefijo=None,
+                       contiene=None, alguno=None, texto_completo=None, orden=None, limite=None,
+                       despues_de=None, origen=None):
+    """
+    Construye un SELECT validado contra la whitelist de columnas.
+
+    Args:
+        tabla: Nombre de tabla (COLUMNAS_TABLAS) o dict {nombre: expresión SQL}
+            para consultas con JOIN, en cuyo caso 'origen' es el FROM ... JOIN
+        columnas: Proyección (None = todas las columnas públicas)
+        filtros: {"columna": valor} igualdad; valores vacíos o None se ignoran
+        entre: {"columna": (desde, hasta)} rango inclusivo; un extremo None queda abierto
+        en: {"columna": iterable} pertenencia (IN)
+        prefijo: {"columna": texto} comienza con 'texto' (rango sobre el índice;
+            distingue mayúsculas, usar las columnas <campo>_norm para ignorarlas)
+        contiene: {"columna": texto} contiene 'texto' sin distinguir mayúsculas
+            ni tildes (recorre la tabla: sirve para columnas del JOIN sin índice)
+        alguno: {"filtros"|"entre"|"en"|"prefijo"|"contiene": {...}} grupo de
+            condiciones del que basta que se cumpla una (OR), p. ej.
+            {"en": {"id": ids_fts}, "contiene": {"medico": texto}}
+        texto_completo: (tabla, texto) solo filas que coinciden con la búsqueda
+            FTS5 de 'tabla' (JOIN con <tabla>_fts), ordenadas primero por
+            relevancia (rank). Requiere 'tabla' como dict con la columna 'id'
+        orden: Lista de columnas, con '-' delante para descendente; se agrega 'id'
+            al final como desempate (por defecto ordena por id)
+        limite: Máximo de filas
+        despues_de: Cursor keyset: valores de la última fila vista para las
+            columnas de 'orden' (incluido el 'id' agregado)
+        origen: FROM para cuando 'tabla' es un dict
+
+    Returns:
+        tuple: (sql, parámetros, nombres de columnas)
+
+    Raises:
+        ValueError: Si la tabla o alguna columna no está permitida
+    """
+    disponibles = _columnas_disponibles(tabla)
+    nombres, select = seleccionar_columnas(tabla, columnas)
+    if isinstance(tabla, str):
+        origen = tabla
+    elif not origen:
+        raise ValueError("Debe indicar 'origen' cuando 'tabla' es un dict de columnas.")
+
+    condiciones, params = _condiciones(disponibles, filtros, entre, en, prefijo, contiene)
+    if alguno:
+        opcionales, valores = _condiciones(disponibles, **alguno)
+        if opcionales:
+            condiciones.append("(" + " OR ".join(f"({condicion})" for condicion in opcionales) + ")")
+            params.extend(valores)
+
+    partes = _parsear_orden(disponibles, orden)
+    if despues_de is not None:
+        condicion, valores = _condicion_cursor(partes, despues_de)
+        condiciones.append(condicion)
+        params.extend(valores)
+
+    ordenar = [f"{expr} {'DESC' if desc else 'ASC'}" for _, expr, desc in partes]
+    if texto_completo is not None:
+        tabla_fts, texto = texto_completo
+        if tabla_fts not in TABLAS_TEXTO_COMPLETO:
+            raise ValueError(f"Tabla '{tabla_fts}' sin búsqueda de texto. Tablas válidas: {set(TABLAS_TEXTO_COMPLETO)}")
+        # Con un nombre de tabla las columnas van sin prefijo y chocarían con las de <tabla>_fts
+        if isinstance(tabla, str) or "id" not in disponibles:
+            raise ValueError("texto_completo requiere 'tabla' como dict con la columna 'id'.")
+        if despues_de is not None:
+            raise ValueError("texto_completo no admite cursor (el orden por relevancia no es keyset).")
+        consulta = consulta_texto_completo(texto)
+        if consulta is None:
+            # Sin palabras que buscar no hay coincidencias (como en buscar_texto)
+            condiciones.append("0")
+        else:
+            origen = f"{origen} JOIN {tabla_fts}_fts ON {tabla_fts}_fts.rowid = {disponibles['id']}"
+            condiciones.append(f"{tabla_fts}_fts MATCH ?")
+            params.append(consulta)
+            ordenar.insert(0, f"{tabla_fts}_fts.rank")
+
+    # Seguro usar f-string: tabla y expresiones vienen de la whitelist
+    sql = f"SELECT {select} FROM {origen}"
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    if ordenar:
+        sql += " ORDER BY " + ", ".join(ordenar)
+    if limite is not None:
+        sql += " LIMIT ?"
+        params.append(int(limite))
+    return sql, params, nombres
+
+def buscar_registros(tabla, **opciones):
+    """
+    Ejecuta construir_consulta(tabla, **opciones) y retorna lista de diccionarios.
+    Los errores de validación se propagan (ValueError); los de la base se
+    informan y retornan [].
+    """
+    sql, params, nombres = construir_consulta(tabla, **opciones)
+    try:
+        with abrir_conexion() as (_, cursor):
+            cursor.execute(sql, params)
+            filas = cursor.fetchall()
+        return [dict(zip(nombres, fila)) for fila in filas]
+    except Exception as e:
+        print(f"Error en buscar_registros: {e}")
+        return []
+
+def iterar_bloques(tabla, tamano_bloque=LECTURA_TAMANO_BLOQUE, **opciones):
+    """
+    Generador: ejecuta construir_consulta(tabla, **opciones) y entrega las
+    filas en listas de hasta 'tamano_bloque' diccionarios (fetchmany), sin
+    cargar nunca el resultado completo.
+
+    La conexión del pool queda tomada (y la lectura ve una misma instantánea)
+    hasta agotar el generador o cerrarlo. A diferencia de buscar_registros,
+    los errores de la base se propagan: un recorrido a medias no debe
+    confundirse con uno completo.
+    """
+    sql, params, nombres = construir_consulta(tabla, **opciones)
+    with abrir_conexion() as (_, cursor):
+        cursor.execute(sql, params)
+        while True:
+            filas = cursor.fetchmany(tamano_bloque)
+            if not filas:
+                break
+            yield [dict(zip(nombres, fila)) for fila in filas]
+
+def iterar_registros(tabla, tamano_bloque=LECTURA_TAMANO_BLOQUE, **opciones):
+    """Generador fila a fila sobre iterar_bloques (mismo uso que buscar_registros)."""
+    for bloque in iterar_bloques(tabla, tamano_bloque, **opciones):
+        yield from bloque
+
+def cursor_siguiente(filas, tabla, orden=None):
+    """Cursor keyset (para 'despues_de') a partir de la última fila de una página."""
+    if not filas:
+        return None
+    ultima = filas[-1]
+    return tuple(ultima[nombre] for nombre, _, _ in _parsear_orden(_columnas_disponibles(tabla), orden))
+
+def buscar_pagina(tabla, tamano, despues_de=None, **opciones):
+    """
+    Una página keyset: lee 'tamano' + 1 filas para saber si hay más.
+    Memoria y tiempo dependen del tamaño de página, no del de la tabla
+    (con un índice que cubra el orden).
+
+    Returns:
+        tuple: (filas, cursor de la página siguiente o None si es la última)
+    """
+    columnas = opciones.pop("columnas", None)
+    if columnas is not None:
+        # El cursor se arma con las columnas de orden: se agregan si faltan
+        columnas = [columnas] if isinstance(columnas, str) else list(columnas)
+        orden = _parsear_orden(_columnas_disponibles(tabla), opciones.get("orden"))
+        columnas += [nombre for nombre, _, _ in orden if nombre not in columnas]
+    filas = buscar_registros(tabla, columnas=columnas, limite=tamano + 1, despues_de=despues_de, **opciones)
+    if len(filas) <= tamano:
+        return filas, None
+    filas = filas[:tamano]
+    return filas, cursor_siguiente(filas, tabla, opciones.get("orden"))
 
 def buscar_registros_exactos(tabla, filtros=None):
     """
@@ -9,42 +270,107 @@ def buscar_registros_exactos(tabla, filtros=None):
         filtros: dict {"columna": valor}. Valores vacíos o None se ignoran.
     
     Returns:
-        list: Lista de diccionarios con los registros encontrados
+        list: Lista de diccionarios con los registros encontrados, ordenados por id
     
     Raises:
-        ValueError: Si la tabla no está en TABLAS_VALIDAS
+        ValueError: Si la tabla o alguna columna no está en la whitelist
     """
-    if filtros is None:
-        filtros = {}
-    
-    # Validar tabla contra whitelist
-    if tabla not in TABLAS_VALIDAS:
-        raise ValueError(f"Tabla '{tabla}' no permitida. Tablas válidas: {TABLAS_VALIDAS}")
+    return buscar_registros(tabla, filtros=filtros)
+
+def consulta_texto_completo(texto):
+    """
+    Convierte lo que escribe el usuario en una consulta FTS5 segura: cada
+    palabra se busca como prefijo y todas deben aparecer ("hiper arte" ->
+    "hiper"* "arte"*). Retorna None si no hay palabras.
+    """
+    palabras = re.findall(r"\w+", texto or "")
+    if not palabras:
+        return None
+    return " ".join(f'"{palabra}"*' for palabra in palabras)
+
+def buscar_texto(tabla, texto, limite=None):
+    """
+    Búsqueda de texto completo (FTS5) en las columnas de TABLAS_TEXTO_COMPLETO,
+    insensible a mayúsculas y tildes y por prefijo de palabra.
+
+    Args:
+        tabla: 'diagnostico', 'tratamiento', 'historial' o 'atencion'
+        texto: Texto ingresado por el usuario
+        limite: Máximo de resultados (None = todos)
+
+    Returns:
+        list: IDs de la tabla ordenados por relevancia (bm25)
+
+    Raises:
+        ValueError: Si la tabla no tiene búsqueda de texto completo
+    """
+    if tabla not in TABLAS_TEXTO_COMPLETO:
+        raise ValueError(f"Tabla '{tabla}' sin búsqueda de texto. Tablas válidas: {set(TABLAS_TEXTO_COMPLETO)}")
+    consulta = consulta_texto_completo(texto)
+    if consulta is None:
+        return []
 
     try:
-        conexion, cursor = conectar()
-        # Seguro usar f-string porque tabla fue validada
-        query = f"SELECT * FROM {tabla}"
-        params = []
-        condiciones = []
-
-        for col, val in filtros.items():
-            if val is None or (isinstance(val, str) and val.strip() == ""):
-                continue
-            condiciones.append(f"{col} = ?")
-            params.append(val)
+        with abrir_conexion() as (_, cursor):
+            cursor.execute(
+                f"SELECT rowid FROM {tabla}_fts WHERE {tabla}_fts MATCH ? ORDER BY rank LIMIT ?",
+                (consulta, -1 if limite is None else int(limite))
+            )
+            return [fila[0] for fila in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error en buscar_texto: {e}")
+        return []
+
+def rango_prefijo(prefijo):
+    """Límites [desde, hasta) que abarcan los textos que comienzan con 'prefijo';
+    con ellos SQLite recorre solo ese tramo del índice."""
+    return prefijo, prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+
+def buscar_ids_normalizados(tabla, prefijos=None, contiene=None):
+    """
+    Búsqueda insensible a tildes y mayúsculas sobre las columnas <campo>_norm
+    de COLUMNAS_NORMALIZADAS. Todas las condiciones deben cumplirse.
+
+    Args:
+        tabla: 'especialidad', 'paciente' o 'medico'
+        prefijos: dict {"campo": texto} — el campo comienza con el texto (usa índice)
+        contiene: dict {"campo": texto} — el campo contiene el texto
+            Valores vacíos o None se ignoran.
 
-        if condiciones:
-            query += " WHERE " + " AND ".join(condiciones)
+    Returns:
+        list | None: IDs encontrados en orden, o None si no hay ningún filtro
 
-        query += " ORDER BY id"
-        cursor.execute(query, params)
-        columnas = [desc[0] for desc in cursor.description]
-        filas = cursor.fetchall()
-        conexion.close()
+    Raises:
+        ValueError: Si la tabla o algún campo no tiene columna normalizada
+    """
+    if tabla not in COLUMNAS_NORMALIZADAS:
+        raise ValueError(f"Tabla '{tabla}' sin columnas normalizadas. Tablas válidas: {set(COLUMNAS_NORMALIZADAS)}")
 
-        return [dict(zip(columnas, fila)) for fila in filas]
+    condiciones = []
+    params = []
+    for tipo, filtros in (("prefijo", prefijos), ("contiene", contiene)):
+        for campo, valor in (filtros or {}).items():
+            if campo not in COLUMNAS_NORMALIZADAS[tabla]:
+                raise ValueError(f"Campo '{campo}' sin columna normalizada en '{tabla}'")
+            texto = normalizar_texto(valor).strip() if valor else ""
+            if not texto:
+                continue
+            if tipo == "prefijo":
+                condiciones.append(f"{campo}_norm >= ? AND {campo}_norm < ?")
+                params.extend(rango_prefijo(texto))
+            else:
+                condiciones.append(f"instr({campo}_norm, ?) > 0")
+                params.append(texto)
+    if not condiciones:
+        return None
 
+    try:
+        with abrir_conexion() as (_, cursor):
+            cursor.execute(
+                f"SELECT id FROM {tabla} WHERE {' AND '.join(condiciones)} ORDER BY id",
+                params
+            )
+            return [fila[0] for fila in cursor.fetchall()]
     except Exception as e:
-        print(f"Error en buscar_registros_exactos: {e}")
+        print(f"Error en buscar_ids_normalizados: {e}")
         return []
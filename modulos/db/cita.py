@@ -1,141 +1,267 @@
-from .db import conectar, existe_tabla_id
-from .busqueda import buscar_registros_exactos
+import sqlite3
+from .db import abrir_conexion, transaccion, seleccionar_columnas, descifrar_lote, LECTURA_TAMANO_BLOQUE
+from .db import ids_faltantes, primera_referencia_faltante, describir_faltantes
+from .busqueda import buscar_registros, buscar_pagina, iterar_registros
+from .paciente import id_paciente_por_rut
+
+SQL_INSERTAR_CITA = """INSERT INTO cita (fecha, hora, estado, motivo, id_paciente, id_medico)
+                   VALUES (?, ?, ?, ?, ?, ?)"""
+
+def _fila_cita(fecha, hora, motivo, id_paciente, id_medico, estado="PENDIENTE"):
+    return (str(fecha), hora.strftime("%H:%M:%S"), estado.strip().upper(), motivo.strip(), id_paciente, id_medico)
 
 def agregar_cita(fecha, hora, motivo, id_paciente, id_medico, estado="PENDIENTE"):
-    if not existe_tabla_id("paciente", id_paciente):
+    # cita.id_medico admite NULL en el esquema, así que la FK no rechaza un None:
+    # se valida aquí, igual que agregar_citas_lote (ids_faltantes)
+    if id_paciente is None:
         return False, "El paciente indicado no existe"
-    if not existe_tabla_id("medico", id_medico):
+    if id_medico is None:
         return False, "El médico indicado no existe"
-
+    # Las claves foráneas las valida SQLite; solo se consulta qué faltó si el INSERT falla
     try:
-        conexion, cursor = conectar()
-        cursor.execute(
-            """INSERT INTO cita (fecha, hora, estado, motivo, id_paciente, id_medico)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (str(fecha), hora.strftime("%H:%M:%S"), estado.strip().upper(), motivo.strip(), id_paciente, id_medico)
-        )
-        conexion.commit()
-        id_insertado = cursor.lastrowid
-        conexion.close()
+        with abrir_conexion() as (conexion, cursor):
+            cursor.execute(SQL_INSERTAR_CITA, _fila_cita(fecha, hora, motivo, id_paciente, id_medico, estado))
+            conexion.commit()
+            id_insertado = cursor.lastrowid
         return True, f"Cita agregada correctamente con ID {id_insertado}"
+    except sqlite3.IntegrityError as e:
+        mensaje = primera_referencia_faltante([
+            ("paciente", id_paciente, "El paciente indicado no existe"),
+            ("medico", id_medico, "El médico indicado no existe"),
+        ])
+        return False, mensaje or f"Error al agregar cita: {e}"
     except Exception as e:
         return False, f"Error al agregar cita: {e}"
 
 
-def mostrar_citas():
-    """Devuelve todas las citas como lista de diccionarios con nombres de columnas reales."""
-    conexion, cursor = conectar()
-    cursor.execute("SELECT * FROM cita")
-    filas = cursor.fetchall()
-    columnas = [desc[0] for desc in cursor.description]
-    conexion.close()
-    return [dict(zip(columnas, fila)) for fila in filas]
+def agregar_citas_lote(citas):
+    """
+    Inserta muchas citas validando todas las referencias con una sola consulta
+    y escribiendo en una sola transacción (todas o ninguna).
+
+    Args:
+        citas: Iterable de tuplas (fecha, hora, motivo, id_paciente, id_medico[, estado])
+
+    Returns:
+        tuple: (ok, mensaje, ids insertados en el mismo orden)
+    """
+    citas = list(citas)
+    if not citas:
+        return True, "No hay citas para agregar", []
+
+    faltantes = ids_faltantes({
+        "paciente": [cita[3] for cita in citas],
+        "medico": [cita[4] for cita in citas],
+    })
+    if faltantes:
+        return False, f"Referencias inexistentes ({describir_faltantes(faltantes)})", []
+
+    try:
+        ids = []
+        with transaccion(), abrir_conexion() as (_, cursor):
+            for cita in citas:
+                cursor.execute(SQL_INSERTAR_CITA, _fila_cita(*cita))
+                ids.append(cursor.lastrowid)
+        return True, f"{len(ids)} cita(s) agregada(s) correctamente", ids
+    except Exception as e:
+        return False, f"Error al agregar citas: {e}", []
+
+
+def mostrar_citas(columnas=None):
+    """Devuelve todas las citas como lista de diccionarios con nombres de columnas reales.
+    columnas: lista de columnas a traer (None = todas), validada contra la whitelist de 'cita'.
+    """
+    nombres, select = seleccionar_columnas("cita", columnas)
+    with abrir_conexion() as (conexion, cursor):
+        cursor.execute(f"SELECT {select} FROM cita")
+        filas = cursor.fetchall()
+    return [dict(zip(nombres, fila)) for fila in filas]
+
+# Orden de los listados paginados: más recientes primero; 'id' desempata
+# (idx_cita_fecha_hora, migración 7)
+ORDEN_CITAS = ["-fecha", "-hora"]
+
+def pagina_citas(tamano, despues_de=None, columnas=None, filtros=None, en=None):
+    """
+    Una página de citas ordenadas por (fecha, hora, id) descendente, con
+    paginación por cursor: solo se leen 'tamano' filas aunque la tabla sea grande.
+
+    Args:
+        tamano: Citas por página
+        despues_de: Cursor devuelto por la página anterior (None = primera página)
+        columnas: Columnas a traer (None = todas); se agregan las del orden
+        filtros: {"columna": valor} igualdad, como en buscar_registros
+        en: {"columna": iterable} pertenencia, como en buscar_registros
+
+    Returns:
+        tuple: (lista de diccionarios, cursor de la página siguiente o None)
+    """
+    return buscar_pagina(
+        "cita", tamano, despues_de,
+        columnas=columnas, filtros=filtros, en=en, orden=ORDEN_CITAS
+    )
+
+# Columnas del detalle de citas para la grilla (nombre -> expresión SQL)
+COLUMNAS_CITAS_DETALLE = {
+    "id": "c.id",
+    "fecha": "c.fecha",
+    "hora": "c.hora",
+    "estado": "c.estado",
+    "motivo": "c.motivo",
+    "id_paciente": "c.id_paciente",
+    "id_medico": "c.id_medico",
+    "paciente": "p.nombre || ' ' || p.apellido",
+    "rut_paciente": "p.rut",
+    "medico": "m.nombre || ' ' || m.apellido",
+    "especialidad": "e.nombre",
+}
+ORIGEN_CITAS_DETALLE = """cita c
+                LEFT JOIN paciente p ON c.id_paciente = p.id
+                LEFT JOIN medico m ON c.id_medico = m.id
+                LEFT JOIN especialidad e ON m.id_especialidad = e.id"""
+
+def _descifrar_ruts_pacientes(filas):
+    """Descifra en una sola llamada a descifrar_lote el RUT de todas las filas."""
+    if filas and "rut_paciente" in filas[0]:
+        ruts = descifrar_lote([fila["rut_paciente"] for fila in filas])
+        for fila, rut in zip(filas, ruts):
+            fila["rut_paciente"] = rut
+    return filas
+
+def obtener_citas_detalle(filtros=None, en=None, limite=None):
+    """
+    Citas con lo que muestra la grilla (nombre y RUT del paciente, nombre y
+    especialidad del médico) en una sola consulta con JOIN; los RUT se
+    descifran en lote. Más recientes primero.
+
+    Args:
+        filtros: {"columna": valor} igualdad sobre COLUMNAS_CITAS_DETALLE
+        en: {"columna": iterable} pertenencia, p. ej. {"id_paciente": ids}
+        limite: Máximo de citas (None = todas)
+
+    Returns:
+        list: Diccionarios con las claves de COLUMNAS_CITAS_DETALLE
+    """
+    filas = buscar_registros(
+        COLUMNAS_CITAS_DETALLE, origen=ORIGEN_CITAS_DETALLE,
+        filtros=filtros, en=en, limite=limite, orden=ORDEN_CITAS
+    )
+    return _descifrar_ruts_pacientes(filas)
+
+def pagina_citas_detalle(tamano, despues_de=None, filtros=None, en=None):
+    """
+    Igual que obtener_citas_detalle, pero una página por cursor (fecha, hora, id).
+
+    Returns:
+        tuple: (lista de diccionarios, cursor de la página siguiente o None)
+    """
+    filas, siguiente = buscar_pagina(
+        COLUMNAS_CITAS_DETALLE, tamano, despues_de, origen=ORIGEN_CITAS_DETALLE,
+        filtros=filtros, en=en, orden=ORDEN_CITAS
+    )
+    return _descifrar_ruts_pacientes(filas), siguiente
+
+def iterar_citas(columnas=None, tamano_bloque=LECTURA_TAMANO_BLOQUE, **opciones):
+    """
+    Generador sobre las citas (por id, o por 'orden') leídas con fetchmany:
+    memoria constante aunque la tabla sea grande.
+
+    Args:
+        columnas: Columnas a traer (None = todas)
+        tamano_bloque: Filas por fetchmany
+        **opciones: filtros, entre, en, orden... como en buscar_registros
+    """
+    return iterar_registros("cita", tamano_bloque, columnas=columnas, **opciones)
 
 def eliminar_cita(id_cita):
-    if not existe_tabla_id("cita", id_cita):
-        return False, "No existe cita con ese ID"
     try:
-        conexion, cursor = conectar()
-        cursor.execute("DELETE FROM cita WHERE id=?", (id_cita,))
-        conexion.commit()
-        conexion.close()
+        with abrir_conexion() as (conexion, cursor):
+            cursor.execute("DELETE FROM cita WHERE id=?", (id_cita,))
+            cambios = cursor.rowcount
+            conexion.commit()
+        if not cambios:
+            return False, "No existe cita con ese ID"
         return True, f"Cita ID {id_cita} eliminada correctamente"
+    except sqlite3.IntegrityError:
+        return False, "No se puede eliminar: la cita tiene diagnósticos o historiales asociados."
     except Exception as e:
         return False, f"Error al eliminar cita."
 
 def actualizar_cita(id_cita, fecha, hora, estado, motivo, id_paciente, id_medico):
-    if not existe_tabla_id("cita", id_cita):
-        return False, "No existe cita con ese ID"
-    if not existe_tabla_id("paciente", id_paciente):
-        return False, "Paciente no existe"
-    if not existe_tabla_id("medico", id_medico):
-        return False, "Médico no existe"
     try:
-        conexion, cursor = conectar()
-
-        hora_str = hora.strftime("%H:%M:%S") if hasattr(hora, "strftime") else str(hora)
-        estado_str = estado.strip().upper()
-        motivo_str = motivo.strip()
-        id_paciente = int(id_paciente)
-        id_medico = int(id_medico)
-
-        cursor.execute(
-            """UPDATE cita
-               SET fecha=?, hora=?, estado=?, motivo=?, id_paciente=?, id_medico=?
-               WHERE id=?""",
-            (str(fecha), hora_str, estado_str, motivo_str, id_paciente, id_medico, int(id_cita))
-        )
-        conexion.commit()
-        conexion.close()
+        id_cita, id_paciente, id_medico = int(id_cita), int(id_paciente), int(id_medico)
+    except (TypeError, ValueError):
+        return False, "ID de cita, paciente o médico inválido"
+    hora_str = hora.strftime("%H:%M:%S") if hasattr(hora, "strftime") else str(hora)
+    estado_str = estado.strip().upper()
+    motivo_str = motivo.strip()
+
+    try:
+        with abrir_conexion() as (conexion, cursor):
+            cursor.execute(
+                """UPDATE cita
+                   SET fecha=?, hora=?, estado=?, motivo=?, id_paciente=?, id_medico=?
+                   WHERE id=?""",
+                (str(fecha), hora_str, estado_str, motivo_str, id_paciente, id_medico, id_cita)
+            )
+            cambios = cursor.rowcount
+            conexion.commit()
+        if not cambios:
+            return False, "No existe cita con ese ID"
         return True, f"Cita ID {id_cita} actualizada correctamente"
+    except sqlite3.IntegrityError as e:
+        mensaje = primera_referencia_faltante([
+            ("paciente", id_paciente, "Paciente no existe"),
+            ("medico", id_medico, "Médico no existe"),
+        ])
+        return False, mensaje or f"Error al actualizar cita: {e}"
     except Exception as e:
-        import traceback
-        print("[ERROR actualizar_cita]:", e)
-        traceback.print_exc()
         return False, f"Error al actualizar cita: {e}"
 
-def buscar_citas(id_paciente=None, id_medico=None, fecha=None, estado=None, rut=None, id_cita=None):
+def buscar_citas(id_paciente=None, id_medico=None, fecha=None, estado=None, rut=None, id_cita=None,
+                 desde=None, hasta=None):
     """
-    Busca citas filtrando por paciente, médico, fecha, estado, rut de paciente o id de cita.
+    Busca citas filtrando por paciente, médico, fecha (o rango desde/hasta),
+    estado, rut de paciente o id de cita. Los filtros de la tabla se resuelven
+    en SQLite con índices; el rut se traduce primero a id_paciente con su
+    índice ciego (rut_hash), así la búsqueda es una sola consulta por
+    idx_cita_paciente.
     """
-    filtros = {}
-    if id_cita:
-        filtros["id"] = id_cita
-    if id_paciente:
-        filtros["id_paciente"] = id_paciente
-    if id_medico:
-        filtros["id_medico"] = id_medico
-    if fecha:
-        filtros["fecha"] = fecha
-    if estado:
-        filtros["estado"] = estado
-
-    # Búsqueda base (sin rut porque cita no tiene ese campo)
-    base = buscar_registros_exactos("cita", filtros)
+    filtros = {
+        "id": id_cita or None,
+        "id_paciente": id_paciente or None,
+        "id_medico": id_medico or None,
+        "fecha": str(fecha) if fecha else None,
+        "estado": estado or None,
+    }
 
     if rut:
-        # Filtrar por rut del paciente descifrándolo
-        from .db import descifrar_dato
-        filtradas = []
-        # map id_paciente -> rut descifrado (cache)
-        cache_rut = {}
-        for cita in base:
-            pid = cita.get("id_paciente")
-            if pid is None:
-                continue
-            if pid not in cache_rut:
-                conexion, cursor = conectar()
-                cursor.execute("SELECT rut FROM paciente WHERE id=?", (pid,))
-                fila = cursor.fetchone()
-                conexion.close()
-                if fila and fila[0]:
-                    try:
-                        cache_rut[pid] = descifrar_dato(fila[0])
-                    except Exception:
-                        cache_rut[pid] = fila[0]
-                else:
-                    cache_rut[pid] = None
-            if cache_rut[pid] == rut:
-                filtradas.append(cita)
-        return filtradas
-    return base
+        id_por_rut = id_paciente_por_rut(rut)
+        # Sin paciente con ese RUT, o distinto del id_paciente pedido: no hay citas
+        if id_por_rut is None or (filtros["id_paciente"] and int(filtros["id_paciente"]) != id_por_rut):
+            return []
+        filtros["id_paciente"] = id_por_rut
+
+    return buscar_registros(
+        "cita",
+        filtros=filtros,
+        entre={"fecha": (str(desde) if desde else None, str(hasta) if hasta else None)},
+    )
 
 
 def mostrar_paciente_nombre(id_paciente):
     # Consulta a la base de datos para obtener el nombre del paciente con el ID proporcionado
-    conexion, cursor = conectar()
-    cursor.execute("SELECT nombre, apellido FROM paciente WHERE id=?", (id_paciente,))
-    paciente = cursor.fetchone()
-    conexion.close()
+    with abrir_conexion() as (conexion, cursor):
+        cursor.execute("SELECT nombre, apellido FROM paciente WHERE id=?", (id_paciente,))
+        paciente = cursor.fetchone()
     return f"{paciente[0]} {paciente[1]}" if paciente else "Desconocido"
 
 def mostrar_paciente_rut(id_paciente):
     # Consulta a la base de datos para obtener el RUT del paciente con el ID proporcionado
     from .db import descifrar_dato
-    conexion, cursor = conectar()
-    cursor.execute("SELECT rut FROM paciente WHERE id=?", (id_paciente,))
-    paciente = cursor.fetchone()
-    conexion.close()
+    with abrir_conexion() as (conexion, cursor):
+        cursor.execute("SELECT rut FROM paciente WHERE id=?", (id_paciente,))
+        paciente = cursor.fetchone()
     if paciente and paciente[0]:
         return descifrar_dato(paciente[0])  # Descifrar el RUT antes de mostrarlo
     return "Desconocido"
@@ -0,0 +1,114 @@
+import pandas as pd
+from .db import abrir_conexion, descifrar_lote
+from .busqueda import construir_consulta
+from .atencion import COLUMNAS_ATENCIONES, ORIGEN_ATENCIONES
+from .cita import ORDEN_CITAS
+from .diagnostico import COLUMNAS_DIAGNOSTICOS, ORIGEN_DIAGNOSTICOS
+from .historial import COLUMNAS_HISTORIALES, ORIGEN_HISTORIALES
+from .medico import COLUMNAS_MEDICOS, ORIGEN_MEDICOS, CAMPOS_CIFRADOS_MEDICO
+from .paciente import CAMPOS_CIFRADOS_PACIENTE
+from .tratamiento import COLUMNAS_TRATAMIENTOS, ORIGEN_TRATAMIENTOS
+
+# ======================================================
+# RESULTADOS COMO DATAFRAME
+# ======================================================
+# Variantes de los listados que devuelven un pandas.DataFrame leído
+# directamente del cursor (sin listas de diccionarios intermedias) y con
+# tipos útiles para filtrar de forma vectorizada en la interfaz.
+
+# Pocos valores distintos: 'category' ocupa menos y compara más rápido
+COLUMNAS_CATEGORICAS = ("estado", "genero", "sistema_salud", "nacionalidad", "especialidad")
+
+# Fechas ISO guardadas como texto -> datetime64 (las inválidas quedan NaT)
+COLUMNAS_FECHA = (
+    "fecha", "fecha_registro", "fecha_inicio", "fecha_termino", "fecha_cita", "fecha_nacimiento"
+)
+
+# Las que son DATE (sin hora): la interfaz las muestra como fecha, no como
+# "AAAA-MM-DD 00:00:00" (ver columnas_fecha en modulos/ui/common.py)
+COLUMNAS_SOLO_FECHA = ("fecha", "fecha_inicio", "fecha_termino", "fecha_cita", "fecha_nacimiento")
+
+
+def aplicar_tipos(df):
+    """Convierte in situ las columnas categóricas y de fecha presentes en df."""
+    for columna in df.columns:
+        if columna in COLUMNAS_CATEGORICAS:
+            df[columna] = df[columna].astype("category")
+        elif columna in COLUMNAS_FECHA:
+            df[columna] = pd.to_datetime(df[columna], errors="coerce", format="ISO8601")
+    return df
+
+
+def consultar_dataframe(tabla, cifrados=(), **opciones):
+    """
+    Ejecuta construir_consulta(tabla, **opciones) y retorna un DataFrame con
+    una columna por columna pedida, en el mismo orden.
+
+    Args:
+        tabla: Nombre de tabla o dict {nombre: expresión SQL} (ver construir_consulta)
+        cifrados: Columnas cifradas; cada una se descifra con una sola
+            llamada a descifrar_lote
+        **opciones: columnas, filtros, entre, en, orden, limite, origen...
+
+    Returns:
+        pandas.DataFrame: Vacío (con las columnas pedidas) si no hay filas
+
+    Raises:
+        ValueError: Si la tabla o alguna columna no está permitida
+    """
+    sql, params, nombres = construir_consulta(tabla, **opciones)
+    with abrir_conexion() as (_, cursor):
+        cursor.execute(sql, params)
+        # Tuplas del cursor directo al DataFrame, sin diccionarios por fila
+        df = pd.DataFrame.from_records(cursor.fetchall(), columns=nombres)
+    for campo in cifrados:
+        if campo in df.columns and not df.empty:
+            df[campo] = descifrar_lote(df[campo].tolist())
+    return aplicar_tipos(df)
+
+
+def citas_df(columnas=None, **opciones):
+    """Citas, de la más reciente a la más antigua."""
+    opciones.setdefault("orden", ORDEN_CITAS)
+    return consultar_dataframe("cita", columnas=columnas, **opciones)
+
+
+def especialidades_df(columnas=None, **opciones):
+    """Especialidades ordenadas por id."""
+    return consultar_dataframe("especialidad", columnas=columnas, **opciones)
+
+
+def pacientes_df(columnas=None, **opciones):
+    """Pacientes ordenados por id, con los campos cifrados ya descifrados."""
+    return consultar_dataframe("paciente", CAMPOS_CIFRADOS_PACIENTE, columnas=columnas, **opciones)
+
+
+def medicos_df(columnas=None, **opciones):
+    """Médicos (con el nombre de su especialidad) ordenados por id, descifrados."""
+    return consultar_dataframe(
+        COLUMNAS_MEDICOS, CAMPOS_CIFRADOS_MEDICO, origen=ORIGEN_MEDICOS, columnas=columnas, **opciones
+    )
+
+
+def diagnosticos_df(columnas=None, **opciones):
+    """Diagnósticos, del más reciente al más antiguo (columnas de COLUMNAS_DIAGNOSTICOS)."""
+    opciones.setdefault("orden", ["-fecha"])
+    return consultar_dataframe(COLUMNAS_DIAGNOSTICOS, origen=ORIGEN_DIAGNOSTICOS, columnas=columnas, **opciones)
+
+
+def tratamientos_df(columnas=None, **opciones):
+    """Tratamientos, del más reciente al más antiguo (columnas de COLUMNAS_TRATAMIENTOS)."""
+    opciones.setdefault("orden", ["-fecha_inicio"])
+    return consultar_dataframe(COLUMNAS_TRATAMIENTOS, origen=ORIGEN_TRATAMIENTOS, columnas=columnas, **opciones)
+
+
+def historiales_df(columnas=None, **opciones):
+    """Historiales, del más reciente al más antiguo (columnas de COLUMNAS_HISTORIALES)."""
+    opciones.setdefault("orden", ["-fecha_registro"])
+    return consultar_dataframe(COLUMNAS_HISTORIALES, origen=ORIGEN_HISTORIALES, columnas=columnas, **opciones)
+
+
+def atenciones_df(columnas=None, **opciones):
+    """Atenciones, de la más reciente a la más antigua (columnas de COLUMNAS_ATENCIONES)."""
+    opciones.setdefault("orden", ["-fecha_registro"])
+    return consultar_dataframe(COLUMNAS_ATENCIONES, origen=ORIGEN_ATENCIONES, columnas=columnas, **opciones)
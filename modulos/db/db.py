@@ -1,6 +1,20 @@
 import os
+import hmac
+import json
+import base64
+import hashlib
 import sqlite3
-from cryptography.fernet import Fernet
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from cryptography.fernet import Fernet, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from .utilidades import normalizar_texto
 
 # ======================================================
 # RUTAS
@@ -9,6 +23,7 @@ BASE_PATH = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))  # carpe
 DB_PATH = os.path.join(BASE_PATH, "hospital.db")
 SQL_PATH = os.path.join(BASE_PATH, "hospital.sql")
 KEY_PATH = os.path.join(BASE_PATH, "clave.key")
+KEY_INDICE_PATH = os.path.join(BASE_PATH, "clave_indice.key")
 
 # ======================================================
 # WHITELIST DE TABLAS VÁLIDAS (Prevención SQL Injection)
@@ -18,56 +33,626 @@ TABLAS_VALIDAS = {
     'tratamiento', 'historial', 'atencion', 'horario_medico'
 }
 
+# ======================================================
+# CONFIGURACIÓN DE CIFRADO Y DESCIFRADO EN LOTE
+# ======================================================
+# Valen para descifrar_lote y cifrar_lote. "hilos" comparte el proceso (seguro
+# dentro de Streamlit); "procesos" reparte el trabajo entre varios núcleos:
+# con valores cortos casi todo el costo de AES-GCM (y de los tokens Fernet
+# heredados) es código Python por valor, que se ejecuta con el GIL tomado.
+DESCIFRADO_MODO = os.environ.get("HOSPITAL_DESCIFRADO_MODO", "hilos")
+DESCIFRADO_WORKERS = int(os.environ.get("HOSPITAL_DESCIFRADO_WORKERS", os.cpu_count() or 1))
+DESCIFRADO_TAMANO_LOTE = int(os.environ.get("HOSPITAL_DESCIFRADO_LOTE", 512))
+
+# ======================================================
+# CONFIGURACIÓN DEL POOL DE CONEXIONES
+# ======================================================
+# Conexiones inactivas que se conservan abiertas para reutilizar
+POOL_MAX_INACTIVAS = int(os.environ.get("HOSPITAL_POOL_MAX", 8))
+PRAGMAS_CONEXION = (
+    "PRAGMA journal_mode = WAL",        # lectores y escritor no se bloquean entre sí
+    "PRAGMA synchronous = NORMAL",      # seguro con WAL y mucho más barato que FULL
+    "PRAGMA cache_size = -16000",       # ~16 MB de caché de páginas por conexión
+    "PRAGMA mmap_size = 268435456",     # 256 MB leídos vía mmap
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# ======================================================
+# CONFIGURACIÓN DE LECTURA POR BLOQUES
+# ======================================================
+# Filas por fetchmany en las funciones iterar_* (memoria constante)
+LECTURA_TAMANO_BLOQUE = int(os.environ.get("HOSPITAL_LECTURA_BLOQUE", 500))
+
+# ======================================================
+# CONFIGURACIÓN DE CACHÉ DE DESCIFRADO
+# ======================================================
+# Máximo de entradas y de bytes aproximados en memoria; 0 desactiva la caché.
+CACHE_DESCIFRADO_MAX = int(os.environ.get("HOSPITAL_CACHE_MAX", 50000))
+CACHE_DESCIFRADO_BYTES = int(os.environ.get("HOSPITAL_CACHE_BYTES", 32 * 1024 * 1024))
+
+# ======================================================
+# WHITELIST DE COLUMNAS POR TABLA (proyecciones y filtros)
+# ======================================================
+# Solo columnas públicas: los índices ciegos (<campo>_hash) quedan fuera.
+COLUMNAS_TABLAS = {
+    'especialidad': ('id', 'nombre', 'descripcion'),
+    'medico': ('id', 'rut', 'nombre', 'apellido', 'correo', 'telefono', 'id_especialidad', 'horario'),
+    'paciente': (
+        'id', 'rut', 'nombre', 'apellido', 'fecha_nacimiento', 'correo', 'telefono', 'genero',
+        'direccion', 'sistema_salud', 'nacionalidad',
+        'nombre_emergencia', 'apellido_emergencia', 'telefono_emergencia'
+    ),
+    'cita': ('id', 'fecha', 'hora', 'estado', 'motivo', 'id_paciente', 'id_medico'),
+    'diagnostico': ('id', 'fecha', 'descripcion', 'id_medico', 'id_cita'),
+    'tratamiento': ('id', 'fecha_inicio', 'fecha_termino', 'tratamiento', 'id_diagnostico'),
+    'historial': (
+        'id', 'fecha_registro', 'id_diagnostico', 'id_tratamiento', 'observaciones',
+        'alergias', 'resultado_examen', 'id_paciente', 'id_cita'
+    ),
+    'atencion': ('id', 'id_diagnostico', 'id_historial', 'descripcion'),
+    'horario_medico': ('id', 'id_medico', 'dia_semana', 'hora_inicio', 'hora_fin', 'tipo'),
+}
+
+# ======================================================
+# BÚSQUEDA DE TEXTO COMPLETO (FTS5)
+# ======================================================
+# tabla -> columnas de texto libre indexadas en <tabla>_fts (ver migraciones.py)
+TABLAS_TEXTO_COMPLETO = {
+    'diagnostico': ('descripcion',),
+    'tratamiento': ('tratamiento',),
+    'historial': ('observaciones', 'alergias', 'resultado_examen'),
+    'atencion': ('descripcion',),
+}
+
+# ======================================================
+# BÚSQUEDA INSENSIBLE A TILDES (columnas <campo>_norm)
+# ======================================================
+# tabla -> columnas con copia normalizada e indexada <campo>_norm. La calcula
+# la aplicación con normalizar_texto en cada INSERT/UPDATE (no hay triggers,
+# ver migración 8)
+COLUMNAS_NORMALIZADAS = {
+    'especialidad': ('nombre', 'descripcion'),
+    'paciente': ('nombre', 'apellido'),
+    'medico': ('nombre', 'apellido'),
+}
+
+# tabla -> campos cifrados con índice ciego <campo>_hash (indice_ciego); se
+# pueden usar como filtro de igualdad, pero nunca se proyectan
+COLUMNAS_INDICE_CIEGO = {
+    'paciente': ('rut', 'correo'),
+    'medico': ('rut', 'correo', 'telefono'),
+}
+
 # ======================================================
 # GESTIÓN DE CLAVE DE CIFRADO
 # ======================================================
-def obtener_fernet():
-    if not os.path.exists(KEY_PATH):
+# Formato compacto de campo cifrado (BLOB), versión 1 (AES-256-GCM):
+#   versión (1 byte) | id de clave (4 bytes) | nonce (12 bytes) | cifrado + tag (16 bytes)
+# La cabecera (versión + id de clave) va autenticada como dato asociado.
+# Los tokens Fernet antiguos (texto base64) se siguen descifrando.
+FORMATO_AESGCM_V1 = 1
+LARGO_CABECERA = 5
+LARGO_NONCE = 12
+LARGO_TAG = 16
+
+# 'clave.key' es un llavero: una clave Fernet por línea. La primera es la
+# activa (con ella se cifra); las siguientes solo se usan para descifrar
+# datos que aún no se han rotado (ver modulos/db/recifrado.py).
+INTERVALO_REVISION_LLAVERO = 1.0  # segundos entre revisiones de mtime
+
+class ClaveDesconocida(ValueError):
+    """El dato fue cifrado con una clave que no está en el llavero cargado."""
+
+def leer_claves(ruta=KEY_PATH, avisar=True):
+    """Lee (o crea) 'clave.key' y devuelve la lista de claves Fernet en bytes."""
+    if not os.path.exists(ruta):
         print("No se encontró 'clave.key'. Creando una nueva clave de cifrado...")
-        clave = Fernet.generate_key()
-        with open(KEY_PATH, "wb") as f:
+        guardar_claves([Fernet.generate_key()], ruta)
+        print(f"🔑 Clave generada y guardada en: {ruta}")
+    elif avisar:
+        print(f"🔑 Clave de cifrado ya existe en: {ruta}")
+    with open(ruta, "rb") as f:
+        claves = [linea.strip() for linea in f.read().splitlines() if linea.strip()]
+    try:
+        if not claves:
+            raise ValueError
+        for clave in claves:
+            Fernet(clave)
+    except Exception:
+        raise ValueError("El archivo 'clave.key' está dañado o no es una clave válida.")
+    return claves
+
+def guardar_claves(claves, ruta=KEY_PATH):
+    """Escribe el llavero de forma atómica (archivo temporal + reemplazo)."""
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(b"\n".join(claves) + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+def derivar_clave_aesgcm(clave):
+    """Deriva la clave AES-256-GCM a partir de la clave Fernet (HKDF-SHA256),
+    de modo que 'clave.key' siga siendo el único secreto a respaldar.
+    """
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"hospital-campos-aesgcm-v1",
+    ).derive(base64.urlsafe_b64decode(clave))
+
+def calcular_id_clave(clave):
+    """Identificador corto (4 bytes) de la clave, guardado en cada BLOB cifrado."""
+    return hashlib.sha256(clave.strip()).digest()[:4]
+
+class Llavero:
+    """Cifradores construidos a partir de las claves de 'clave.key'."""
+
+    def __init__(self, claves, mtime=None):
+        self.claves = list(claves)
+        self.mtime = mtime
+        self.fernet = MultiFernet([Fernet(clave) for clave in self.claves])
+        self.aes = {calcular_id_clave(clave): AESGCM(derivar_clave_aesgcm(clave)) for clave in self.claves}
+        self.id_activa = calcular_id_clave(self.claves[0])
+        self.aes_activa = self.aes[self.id_activa]
+
+    @classmethod
+    def desde_archivo(cls, ruta=KEY_PATH, avisar=False):
+        # El mtime se toma antes de leer: si el archivo cambia entremedio,
+        # la siguiente revisión lo detecta y vuelve a cargarlo.
+        mtime = os.stat(ruta).st_mtime_ns if os.path.exists(ruta) else None
+        claves = leer_claves(ruta, avisar)
+        if mtime is None:
+            mtime = os.stat(ruta).st_mtime_ns
+        return cls(claves, mtime)
+
+    def aes_para(self, id_token):
+        aes = self.aes.get(id_token)
+        if aes is None:
+            raise ClaveDesconocida("El dato fue cifrado con una clave que no está en 'clave.key'.")
+        return aes
+
+def obtener_fernet():
+    return Llavero.desde_archivo().fernet
+
+llavero = Llavero.desde_archivo(avisar=True)
+_llavero_revisado = time.monotonic()
+
+# ======================================================
+# CACHÉ LRU DE TEXTO DESCIFRADO
+# ======================================================
+class CacheDescifrado:
+    """Caché LRU acotada (texto cifrado -> texto plano), segura entre hilos.
+
+    Se limita por número de entradas y por un presupuesto aproximado de bytes;
+    al superar cualquiera de los dos se descartan las entradas menos usadas.
+    """
+
+    # Sobrecosto aproximado por entrada (objetos str + nodo del OrderedDict)
+    SOBRECOSTO_ENTRADA = 160
+
+    def __init__(self, max_entradas, max_bytes):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    @property
+    def activa(self):
+        return self.max_entradas > 0 and self.max_bytes > 0
+
+    def _tamano(self, clave, valor):
+        return len(clave) + len(valor) + self.SOBRECOSTO_ENTRADA
+
+    def obtener(self, clave):
+        """Retorna el texto plano cacheado o None si no está."""
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is None:
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        if not self.activa or clave is None or valor is None:
+            return
+        tamano = self._tamano(clave, valor)
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= self._tamano(clave, anterior)
+            self._datos[clave] = valor
+            self._bytes += tamano
+            while len(self._datos) > self.max_entradas or self._bytes > self.max_bytes:
+                clave_vieja, valor_viejo = self._datos.popitem(last=False)
+                self._bytes -= self._tamano(clave_vieja, valor_viejo)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._datos),
+                "bytes": self._bytes,
+                "max_entradas": self.max_entradas,
+                "max_bytes": self.max_bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": (self.aciertos / total) if total else 0.0,
+            }
+
+cache_descifrado = CacheDescifrado(CACHE_DESCIFRADO_MAX, CACHE_DESCIFRADO_BYTES)
+
+def recargar_clave():
+    """Vuelve a leer 'clave.key' (por ejemplo tras una rotación).
+    Vacía la caché de descifrado y descarta el pool de descifrado,
+    cuyos procesos tendrían la clave anterior.
+    """
+    global llavero, _llavero_revisado, _pool_descifrado
+    llavero = Llavero.desde_archivo()
+    _llavero_revisado = time.monotonic()
+    cache_descifrado.limpiar()
+    with _pool_descifrado_lock:
+        if _pool_descifrado is not None:
+            _pool_descifrado.shutdown(wait=False)
+            _pool_descifrado = None
+
+def refrescar_llavero(forzar=False):
+    """Recarga el llavero si 'clave.key' cambió en disco (p. ej. una rotación
+    lanzada desde otro proceso). Sin forzar, revisa el mtime como máximo una vez
+    cada INTERVALO_REVISION_LLAVERO segundos. Retorna True si se recargó.
+    """
+    global _llavero_revisado
+    ahora = time.monotonic()
+    if not forzar and ahora - _llavero_revisado < INTERVALO_REVISION_LLAVERO:
+        return False
+    _llavero_revisado = ahora
+    try:
+        mtime = os.stat(KEY_PATH).st_mtime_ns
+    except OSError:
+        return False
+    if mtime == llavero.mtime:
+        return False
+    recargar_clave()
+    return True
+
+def hay_indices_ciegos(ruta=DB_PATH):
+    """True si la base ya tiene filas de paciente o médico con índices ciegos.
+    Abre una conexión aparte, fuera del pool (se usa al cargar el módulo).
+    """
+    if not os.path.exists(ruta):
+        return False
+    conexion = sqlite3.connect(ruta)
+    try:
+        for tabla in ("paciente", "medico"):
+            try:
+                fila = conexion.execute(
+                    f"SELECT 1 FROM {tabla} WHERE rut_hash IS NOT NULL OR correo_hash IS NOT NULL LIMIT 1"
+                ).fetchone()
+            except sqlite3.OperationalError:
+                continue  # Tabla o columna aún sin crear (base nueva o migración pendiente)
+            if fila is not None:
+                return True
+        return False
+    finally:
+        conexion.close()
+
+def obtener_clave_indice():
+    """Carga (o crea) la clave HMAC usada para los índices ciegos.
+    Es independiente de 'clave.key' para que una rotación del cifrado
+    no obligue a recalcular los índices.
+
+    Raises:
+        ValueError: Si falta 'clave_indice.key' y la base ya tiene índices
+            ciegos (una clave nueva dejaría de encontrar a los registros
+            existentes y los UNIQUE no detectarían duplicados), o si el
+            archivo está dañado
+    """
+    if not os.path.exists(KEY_INDICE_PATH):
+        if hay_indices_ciegos():
+            raise ValueError(
+                f"No se encontró '{KEY_INDICE_PATH}' y la base ya tiene índices ciegos calculados "
+                "con ella. Restaure la clave desde un respaldo; no se generará una nueva."
+            )
+        print("No se encontró 'clave_indice.key'. Creando una nueva clave de índice...")
+        clave = base64.urlsafe_b64encode(os.urandom(32))
+        with open(KEY_INDICE_PATH, "wb") as f:
             f.write(clave)
-        print(f"🔑 Clave generada y guardada en: {KEY_PATH}")
+        print(f"🔑 Clave de índice generada y guardada en: {KEY_INDICE_PATH}")
     else:
-        print(f"🔑 Clave de cifrado ya existe en: {KEY_PATH}")
-        with open(KEY_PATH, "rb") as f:
-            clave = f.read()
-        try:
-            Fernet(clave)
-        except Exception:
-            raise ValueError("El archivo 'clave.key' está dañado o no es una clave válida.")
-    return Fernet(clave)
+        with open(KEY_INDICE_PATH, "rb") as f:
+            clave = f.read().strip()
+    try:
+        clave_bytes = base64.urlsafe_b64decode(clave)
+    except Exception:
+        clave_bytes = b""
+    if len(clave_bytes) != 32:
+        raise ValueError("El archivo 'clave_indice.key' está dañado o no es una clave válida.")
+    return clave_bytes
 
-fernet = obtener_fernet()
+clave_indice = obtener_clave_indice()
 
 # ======================================================
-# CREACIÓN DE BASE DE DATOS
+# POOL DE CONEXIONES
 # ======================================================
-if not os.path.exists(DB_PATH):
-    print("Base de datos no existe. Creando desde hospital.sql...")
-    conexion = sqlite3.connect(DB_PATH)
-    cursor = conexion.cursor()
+def registrar_funciones(conexion):
+    """Funciones SQL propias disponibles en las conexiones de la aplicación
+    (p. ej. normalizar() para consultas ad hoc). El esquema no depende de
+    ellas: cualquier cliente de SQLite puede escribir en la base.
+    """
+    conexion.create_function("normalizar", 1, normalizar_texto, deterministic=True)
+
+class PoolConexiones:
+    """Conexiones SQLite persistentes ya configuradas con PRAGMAS_CONEXION.
+
+    Cada conexión se entrega a un solo hilo a la vez (check_same_thread=False
+    solo permite que la use otro hilo después); las llamadas anidadas del mismo
+    hilo reciben conexiones distintas. Al devolverla se revierte lo no confirmado.
+    'preparar' se ejecuta una sola vez, sobre la primera conexión entregada
+    (p. ej. para aplicar migraciones).
+    """
+
+    def __init__(self, ruta, max_inactivas, preparar=None):
+        self.ruta = ruta
+        self.max_inactivas = max_inactivas
+        self._inactivas = []
+        self._lock = threading.Lock()
+        self._preparar = preparar
+        self._lock_preparar = threading.Lock()
+        self.rastreo = None  # callback de set_trace_callback (ver asesor_indices.py)
+        self.creadas = 0
+        self.reutilizadas = 0
+        self.descartadas = 0
+        self.en_uso = 0
+
+    def _nueva(self):
+        conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        for pragma in PRAGMAS_CONEXION:
+            conexion.execute(pragma)
+        registrar_funciones(conexion)
+        return conexion
+
+    def obtener(self):
+        with self._lock:
+            conexion = self._inactivas.pop() if self._inactivas else None
+            if conexion is not None:
+                self.reutilizadas += 1
+            self.en_uso += 1
+        if conexion is None:
+            try:
+                conexion = self._nueva()
+            except Exception:
+                with self._lock:
+                    self.en_uso -= 1
+                raise
+            with self._lock:
+                self.creadas += 1
+        if self._preparar is not None:
+            try:
+                self._preparar_una_vez(conexion)
+            except Exception:
+                self.liberar(conexion)
+                raise
+        conexion.set_trace_callback(self.rastreo)
+        return conexion
+
+    def _preparar_una_vez(self, conexion):
+        with self._lock_preparar:
+            if self._preparar is not None:
+                self._preparar(conexion)
+                self._preparar = None
+
+    def liberar(self, conexion):
+        try:
+            if conexion.in_transaction:
+                conexion.rollback()
+            sana = True
+        except sqlite3.Error:
+            sana = False
+        with self._lock:
+            self.en_uso -= 1
+            if sana and len(self._inactivas) < self.max_inactivas:
+                self._inactivas.append(conexion)
+                return
+            self.descartadas += 1
+        conexion.close()
+
+    def cerrar(self):
+        """Cierra las conexiones inactivas (las que están en uso se cierran al devolverse)."""
+        with self._lock:
+            inactivas, self._inactivas = self._inactivas, []
+        for conexion in inactivas:
+            conexion.close()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "creadas": self.creadas,
+                "reutilizadas": self.reutilizadas,
+                "descartadas": self.descartadas,
+                "en_uso": self.en_uso,
+                "inactivas": len(self._inactivas),
+                "max_inactivas": self.max_inactivas,
+            }
+
+
+class ConexionAgrupada:
+    """Envuelve una sqlite3.Connection del pool; close() la devuelve al pool."""
+
+    __slots__ = ("_conexion", "_pool")
+
+    def __init__(self, conexion, pool):
+        self._conexion = conexion
+        self._pool = pool
+
+    def __getattr__(self, nombre):
+        if self._conexion is None:
+            raise sqlite3.ProgrammingError("La conexión ya fue devuelta al pool.")
+        return getattr(self._conexion, nombre)
+
+    def close(self):
+        if self._conexion is not None:
+            conexion, self._conexion = self._conexion, None
+            self._pool.liberar(conexion)
+
+
+class ConexionEnTransaccion:
+    """Vista de la conexión de una transaccion() en curso. commit() y close()
+    no hacen nada, porque solo confirma el bloque transaccion() más externo;
+    rollback() marca toda la unidad de trabajo para revertirse.
+    """
+
+    __slots__ = ("_transaccion",)
+
+    def __init__(self, transaccion_activa):
+        self._transaccion = transaccion_activa
+
+    def __getattr__(self, nombre):
+        return getattr(self._transaccion.conexion, nombre)
 
-    if not os.path.exists(SQL_PATH):
-        raise FileNotFoundError(f"No se encontró hospital.sql en: {SQL_PATH}")
+    def commit(self):
+        pass
 
-    with open(SQL_PATH, "r", encoding="utf-8") as f:
-        sql_script = f.read()
+    def close(self):
+        pass
 
-    cursor.executescript(sql_script)
-    conexion.commit()
-    conexion.close()
-    print(f"✅ Base de datos creada correctamente en: {DB_PATH}")
-else:
-    print(f"✅ Base de datos ya existe en: {DB_PATH}")
+    def rollback(self):
+        self._transaccion.revertir()
+
+
+class Transaccion:
+    """Unidad de trabajo activa en el hilo actual (ver transaccion())."""
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.profundidad = 0
+        self.revertida = False
+        self._puntos = 0
+
+    def revertir(self):
+        """Descarta todo lo hecho en la unidad de trabajo al cerrar el bloque externo."""
+        self.revertida = True
+
+    @contextmanager
+    def punto_guardado(self):
+        """SAVEPOINT: si el bloque lanza una excepción solo se deshace lo suyo."""
+        self._puntos += 1
+        nombre = f"sp_{self._puntos}"
+        self.conexion.execute(f"SAVEPOINT {nombre}")
+        try:
+            yield
+        except BaseException:
+            self.conexion.execute(f"ROLLBACK TO {nombre}")
+            self.conexion.execute(f"RELEASE {nombre}")
+            raise
+        else:
+            self.conexion.execute(f"RELEASE {nombre}")
+
+
+def preparar_esquema(conexion):
+    """Aplica las migraciones pendientes (modulos/db/migraciones.py). Se llama de
+    forma diferida con la primera conexión del proceso, no al importar el módulo.
+    Si una migración falla, ErrorMigracion llega a quien pidió la conexión y el
+    pool lo vuelve a intentar con la siguiente.
+    """
+    from .migraciones import aplicar_migraciones
+    aplicar_migraciones(conexion)
+
+pool_conexiones = PoolConexiones(DB_PATH, POOL_MAX_INACTIVAS, preparar=preparar_esquema)
+_estado_hilo = threading.local()
+
+def estadisticas_pool():
+    """Contadores del pool de conexiones (creadas, reutilizadas, en uso, ...)."""
+    return pool_conexiones.estadisticas()
 
 # ======================================================
 # FUNCIONES DE CONEXIÓN Y UTILIDAD
 # ======================================================
+def transaccion_actual():
+    """Retorna la Transaccion activa en este hilo o None."""
+    return getattr(_estado_hilo, "transaccion", None)
+
 def conectar():
-    conexion = sqlite3.connect(DB_PATH)
-    cursor = conexion.cursor()
-    return conexion, cursor
+    """Toma una conexión del pool. Retorna (conexion, cursor); conexion.close()
+    la devuelve al pool. Preferir abrir_conexion() en código nuevo.
+    Dentro de transaccion() retorna la conexión compartida de la transacción.
+    """
+    activa = transaccion_actual()
+    if activa is not None:
+        conexion = ConexionEnTransaccion(activa)
+    else:
+        conexion = ConexionAgrupada(pool_conexiones.obtener(), pool_conexiones)
+    return conexion, conexion.cursor()
+
+@contextmanager
+def abrir_conexion():
+    """Uso: with abrir_conexion() as (conexion, cursor): ...
+    Al salir la conexión vuelve al pool; lo que no se confirmó con commit()
+    se revierte. Dentro de transaccion() se une a ella: commit() queda en
+    manos del bloque externo y una excepción solo deshace este bloque.
+    """
+    activa = transaccion_actual()
+    if activa is not None:
+        with activa.punto_guardado():
+            conexion = ConexionEnTransaccion(activa)
+            yield conexion, conexion.cursor()
+        return
+    conexion, cursor = conectar()
+    try:
+        yield conexion, cursor
+    finally:
+        conexion.close()
+
+@contextmanager
+def transaccion():
+    """Unidad de trabajo: with transaccion() as tx: ...
+
+    Todas las funciones de modulos/db llamadas dentro del bloque (en el mismo
+    hilo) comparten una conexión, y se confirma una sola vez al salir: un solo
+    fsync y cambios atómicos. Si el bloque lanza una excepción o se llamó a
+    tx.revertir(), no se guarda nada. Los bloques anidados se unen al externo.
+    """
+    activa = transaccion_actual()
+    if activa is not None:
+        activa.profundidad += 1
+        try:
+            with activa.punto_guardado():
+                yield activa
+        finally:
+            activa.profundidad -= 1
+        return
+
+    conexion = pool_conexiones.obtener()
+    activa = Transaccion(conexion)
+    _estado_hilo.transaccion = activa
+    try:
+        # IMMEDIATE toma el bloqueo de escritura al inicio y evita fallar a mitad
+        conexion.execute("BEGIN IMMEDIATE")
+        yield activa
+        if activa.revertida:
+            conexion.rollback()
+        else:
+            conexion.commit()
+    except BaseException:
+        conexion.rollback()
+        raise
+    finally:
+        _estado_hilo.transaccion = None
+        pool_conexiones.liberar(conexion)
 
 def existe_tabla_id(tabla, id_val):
     """Verifica si existe un registro con el ID dado en la tabla.
@@ -85,62 +670,336 @@ def existe_tabla_id(tabla, id_val):
     if tabla not in TABLAS_VALIDAS:
         raise ValueError(f"Tabla '{tabla}' no permitida. Tablas válidas: {TABLAS_VALIDAS}")
     
-    conexion, cursor = conectar()
-    # Seguro usar f-string porque tabla fue validada
-    cursor.execute(f"SELECT 1 FROM {tabla} WHERE id = ?", (id_val,))
-    existe = cursor.fetchone() is not None
-    conexion.close()
-    return existe
+    with abrir_conexion() as (_, cursor):
+        # Seguro usar f-string porque tabla fue validada
+        cursor.execute(f"SELECT 1 FROM {tabla} WHERE id = ?", (id_val,))
+        return cursor.fetchone() is not None
+
+def _ids_json(ids):
+    """Serializa ids no nulos como arreglo JSON para consultarlos con json_each()."""
+    return json.dumps(sorted({int(i) for i in ids if i is not None}))
+
+def existe_ids(tabla, ids):
+    """Retorna el subconjunto de 'ids' que existe en la tabla, en una sola consulta.
+
+    Raises:
+        ValueError: Si la tabla no está en TABLAS_VALIDAS
+    """
+    if tabla not in TABLAS_VALIDAS:
+        raise ValueError(f"Tabla '{tabla}' no permitida. Tablas válidas: {TABLAS_VALIDAS}")
+    with abrir_conexion() as (_, cursor):
+        cursor.execute(
+            f"SELECT id FROM {tabla} WHERE id IN (SELECT value FROM json_each(?))",
+            (_ids_json(ids),)
+        )
+        return {fila[0] for fila in cursor.fetchall()}
+
+def ids_faltantes(referencias):
+    """Verifica ids de varias tablas en un solo viaje a la base (UNION ALL).
+
+    Args:
+        referencias: dict {tabla: iterable de ids}
+
+    Returns:
+        dict: {tabla: set de ids que no existen}; solo incluye tablas con faltantes.
+            Un id None siempre cuenta como faltante.
+    """
+    pedidos = {}
+    for tabla, ids in referencias.items():
+        if tabla not in TABLAS_VALIDAS:
+            raise ValueError(f"Tabla '{tabla}' no permitida. Tablas válidas: {TABLAS_VALIDAS}")
+        pedidos.setdefault(tabla, set()).update(ids)
+    if not pedidos:
+        return {}
+
+    consultas = []
+    params = []
+    for tabla, ids in pedidos.items():
+        consultas.append(f"SELECT '{tabla}', id FROM {tabla} WHERE id IN (SELECT value FROM json_each(?))")
+        params.append(_ids_json(ids))
+    with abrir_conexion() as (_, cursor):
+        cursor.execute(" UNION ALL ".join(consultas), params)
+        encontrados = cursor.fetchall()
+
+    existentes = {tabla: set() for tabla in pedidos}
+    for tabla, id_val in encontrados:
+        existentes[tabla].add(id_val)
+    faltantes = {}
+    for tabla, ids in pedidos.items():
+        faltan = {i for i in ids if i is None or int(i) not in existentes[tabla]}
+        if faltan:
+            faltantes[tabla] = faltan
+    return faltantes
+
+def primera_referencia_faltante(referencias):
+    """Traduce un error de clave foránea a un mensaje legible.
+
+    Args:
+        referencias: Lista ordenada de (tabla, id, mensaje)
+
+    Returns:
+        str | None: Mensaje de la primera referencia que no existe
+    """
+    faltantes = ids_faltantes({tabla: [id_val] for tabla, id_val, _ in referencias})
+    for tabla, id_val, mensaje in referencias:
+        if id_val in faltantes.get(tabla, ()):
+            return mensaje
+    return None
+
+def describir_faltantes(faltantes):
+    """Texto corto para un resultado de ids_faltantes: 'paciente: 4, 9; medico: 2'."""
+    return "; ".join(
+        f"{tabla}: {', '.join(str(i) for i in sorted(ids, key=str))}"
+        for tabla, ids in faltantes.items()
+    )
+
+def seleccionar_columnas(disponibles, columnas=None):
+    """Valida una proyección y construye la lista del SELECT.
+
+    Args:
+        disponibles: Nombre de tabla (se usa COLUMNAS_TABLAS) o dict ordenado
+            {nombre_columna: expresión SQL} para consultas con JOIN
+        columnas: Lista de columnas pedidas, en el orden deseado (None = todas)
+
+    Returns:
+        tuple: (lista de nombres, texto para el SELECT)
+
+    Raises:
+        ValueError: Si se pide una columna que no está en la whitelist
+    """
+    if isinstance(disponibles, str):
+        if disponibles not in COLUMNAS_TABLAS:
+            raise ValueError(f"Tabla '{disponibles}' no permitida. Tablas válidas: {TABLAS_VALIDAS}")
+        disponibles = {col: col for col in COLUMNAS_TABLAS[disponibles]}
+
+    if columnas is None:
+        nombres = list(disponibles)
+    else:
+        nombres = [columnas] if isinstance(columnas, str) else list(columnas)
+        if not nombres:
+            raise ValueError("Debe indicar al menos una columna.")
+        invalidas = [c for c in nombres if c not in disponibles]
+        if invalidas:
+            raise ValueError(f"Columnas no permitidas: {invalidas}. Columnas válidas: {list(disponibles)}")
+
+    # Seguro usar los nombres en el SQL porque fueron validados contra la whitelist
+    select = ", ".join(
+        disponibles[nombre] if disponibles[nombre] == nombre else f"{disponibles[nombre]} AS {nombre}"
+        for nombre in nombres
+    )
+    return nombres, select
 
 # ======================================================
 # FUNCIONES DE CIFRADO Y DESCIFRADO
 # ======================================================
+# Todo token Fernet empieza con el byte de versión 0x80 y una marca de tiempo,
+# que en base64 quedan como este prefijo.
+PREFIJO_FERNET = "gAAAAA"
+
+def _cifrar_aesgcm(texto, llav):
+    cabecera = bytes((FORMATO_AESGCM_V1,)) + llav.id_activa
+    nonce = os.urandom(LARGO_NONCE)
+    return cabecera + nonce + llav.aes_activa.encrypt(nonce, texto.encode(), cabecera)
+
+def _descifrar_token(token, llav):
+    """Descifra un BLOB versionado (AES-GCM) o un token Fernet heredado (str)."""
+    if isinstance(token, str):
+        return llav.fernet.decrypt(token.encode()).decode()
+    token = bytes(token)
+    if len(token) < LARGO_CABECERA + LARGO_NONCE + LARGO_TAG or token[0] != FORMATO_AESGCM_V1:
+        raise ValueError("Formato de dato cifrado desconocido.")
+    aes = llav.aes_para(token[1:LARGO_CABECERA])
+    nonce = token[LARGO_CABECERA:LARGO_CABECERA + LARGO_NONCE]
+    return aes.decrypt(nonce, token[LARGO_CABECERA + LARGO_NONCE:], token[:LARGO_CABECERA]).decode()
+
+def es_cifrado(valor):
+    """Distingue un dato cifrado de uno en texto plano sin intentar descifrarlo.
+    Solo revisa la forma (cabecera del BLOB versionado o prefijo y largo mínimo
+    de un token Fernet); la autenticidad la comprueba el descifrado.
+    """
+    if isinstance(valor, (bytes, memoryview)):
+        return len(valor) >= LARGO_CABECERA + LARGO_NONCE + LARGO_TAG and valor[0] == FORMATO_AESGCM_V1
+    if isinstance(valor, str):
+        # El token Fernet más corto (un bloque AES) ocupa 100 caracteres
+        return len(valor) >= 100 and valor.startswith(PREFIJO_FERNET)
+    return False
+
+def requiere_recifrado(valor, id_activa=None):
+    """True si el valor es un token Fernet antiguo o un BLOB cifrado con una
+    clave distinta de la activa, es decir, si la rotación debe reescribirlo.
+    """
+    if isinstance(valor, str):
+        return es_cifrado(valor)
+    if isinstance(valor, (bytes, memoryview)):
+        return bytes(valor[1:LARGO_CABECERA]) != (id_activa or llavero.id_activa)
+    return False
+
 def cifrar_dato(texto):
     """Cifra cualquier dato convirtiéndolo a cadena previamente.
-    Acepta None, str, date, datetime, int, etc. Retorna str cifrado.
+    Acepta None, str, date, datetime, int, etc. Retorna bytes en el formato
+    versionado (ver FORMATO_AESGCM_V1), que SQLite guarda como BLOB.
     """
     if texto is None:
         return None
     if not isinstance(texto, str):
         texto = str(texto)
-    return fernet.encrypt(texto.encode()).decode()
+    refrescar_llavero()
+    return _cifrar_aesgcm(texto, llavero)
 
 def descifrar_dato(texto_cifrado):
     if texto_cifrado is None:
         return None
-    return fernet.decrypt(texto_cifrado.encode()).decode()
+    if cache_descifrado.activa:
+        texto = cache_descifrado.obtener(texto_cifrado)
+        if texto is not None:
+            return texto
+    texto = _descifrar(texto_cifrado)
+    cache_descifrado.guardar(texto_cifrado, texto)
+    return texto
 
 # ======================================================
-# ASEGURAR TABLA HORARIO_MEDICO (migración ligera)
+# CIFRADO Y DESCIFRADO EN LOTE (paralelo)
 # ======================================================
-def asegurar_tabla_horario():
+_pool_descifrado = None
+_pool_descifrado_lock = threading.Lock()
+_llavero_worker = None
+
+def _iniciar_worker_descifrado(claves):
+    """Inicializador de cada proceso del pool: construye su propio llavero."""
+    global _llavero_worker
+    _llavero_worker = Llavero(claves)
+
+def _descifrar(token):
+    """Descifra con el llavero del proceso actual. Si el token usa una clave
+    que no está cargada, vuelve a leer 'clave.key' una vez (otro proceso pudo
+    haberla rotado) antes de fallar.
+    """
+    global _llavero_worker
     try:
-        conexion, cursor = conectar()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='horario_medico'")
-        existe = cursor.fetchone() is not None
-        if not existe:
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS horario_medico (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    id_medico INTEGER NOT NULL,
-                    dia_semana INTEGER NOT NULL CHECK(dia_semana BETWEEN 0 AND 6),
-                    hora_inicio TIME NOT NULL,
-                    hora_fin TIME NOT NULL,
-                    tipo TEXT,
-                    FOREIGN KEY (id_medico) REFERENCES medico(id)
-                        ON UPDATE NO ACTION ON DELETE CASCADE
-                );
-                """
-            )
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_horario_medico_medico_dia ON horario_medico(id_medico, dia_semana);")
-            conexion.commit()
-        conexion.close()
-    except Exception as e:
-        try:
-            conexion.close()
-        except Exception:
-            pass
-        print(f"[WARN] No se pudo asegurar la tabla horario_medico: {e}")
+        return _descifrar_token(token, _llavero_worker or llavero)
+    except ClaveDesconocida:
+        if _llavero_worker is not None:
+            _llavero_worker = Llavero.desde_archivo()
+        elif not refrescar_llavero(forzar=True):
+            raise
+        return _descifrar_token(token, _llavero_worker or llavero)
+
+def _descifrar_bloque(bloque, tolerar_texto_plano=False):
+    """Descifra un bloque de textos en orden. Se ejecuta dentro del pool."""
+    resultado = []
+    for texto in bloque:
+        if texto is None:
+            resultado.append(None)
+            continue
+        if tolerar_texto_plano and not es_cifrado(texto):
+            resultado.append(texto)
+            continue
+        resultado.append(_descifrar(texto))
+    return resultado
+
+def _obtener_pool_descifrado():
+    global _pool_descifrado
+    with _pool_descifrado_lock:
+        if _pool_descifrado is None:
+            if DESCIFRADO_MODO == "procesos":
+                _pool_descifrado = ProcessPoolExecutor(
+                    max_workers=DESCIFRADO_WORKERS,
+                    initializer=_iniciar_worker_descifrado,
+                    initargs=(llavero.claves,)
+                )
+            else:
+                _pool_descifrado = ThreadPoolExecutor(
+                    max_workers=DESCIFRADO_WORKERS,
+                    thread_name_prefix="descifrado"
+                )
+        return _pool_descifrado
+
+def descifrar_lote(textos, tolerar_texto_plano=False):
+    """Descifra muchos textos en una sola llamada conservando el orden.
+
+    Divide la entrada en bloques de DESCIFRADO_TAMANO_LOTE y los reparte en el
+    pool configurado (DESCIFRADO_MODO / DESCIFRADO_WORKERS). Las entradas
+    pequeñas se descifran en el hilo actual para no pagar el costo del pool.
+    Los valores presentes en la caché de descifrado no se vuelven a descifrar.
+
+    Args:
+        textos: Iterable de textos cifrados (None se conserva como None)
+        tolerar_texto_plano: Si es True, los valores en texto plano (ver
+            es_cifrado) se devuelven tal cual; un dato cifrado inválido
+            sigue lanzando excepción
+
+    Returns:
+        list: Textos descifrados en el mismo orden de entrada
+    """
+    textos = list(textos)
+    resultado = [None] * len(textos)
+    refrescar_llavero()
+
+    # Resolver primero desde la caché; solo se descifran los faltantes
+    pendientes_pos = []
+    pendientes = []
+    for pos, texto in enumerate(textos):
+        if texto is None:
+            continue
+        if cache_descifrado.activa:
+            plano = cache_descifrado.obtener(texto)
+            if plano is not None:
+                resultado[pos] = plano
+                continue
+        pendientes_pos.append(pos)
+        pendientes.append(texto)
+
+    tamano = max(1, DESCIFRADO_TAMANO_LOTE)
+    if len(pendientes) <= tamano or DESCIFRADO_WORKERS <= 1:
+        descifrados = _descifrar_bloque(pendientes, tolerar_texto_plano)
+    else:
+        bloques = [pendientes[i:i + tamano] for i in range(0, len(pendientes), tamano)]
+        pool = _obtener_pool_descifrado()
+        descifrados = []
+        for parte in pool.map(_descifrar_bloque, bloques, repeat(tolerar_texto_plano)):
+            descifrados.extend(parte)
+
+    for pos, cifrado, plano in zip(pendientes_pos, pendientes, descifrados):
+        resultado[pos] = plano
+        cache_descifrado.guardar(cifrado, plano)
+    return resultado
+
+def _cifrar_bloque(bloque):
+    """Cifra un bloque de textos en orden. Se ejecuta dentro del pool."""
+    llav = _llavero_worker or llavero
+    return [None if texto is None else _cifrar_aesgcm(texto, llav) for texto in bloque]
+
+def cifrar_lote(textos):
+    """Cifra muchos datos en una sola llamada conservando el orden.
+
+    Contraparte de descifrar_lote para cargas masivas: usa el mismo pool
+    (DESCIFRADO_MODO / DESCIFRADO_WORKERS) y los mismos bloques de
+    DESCIFRADO_TAMANO_LOTE. Cada valor se convierte a str como en cifrar_dato.
+
+    Args:
+        textos: Iterable de datos (None se conserva como None)
+
+    Returns:
+        list: BLOBs cifrados en el mismo orden de entrada
+    """
+    textos = [None if texto is None else str(texto) for texto in textos]
+    refrescar_llavero()
+    tamano = max(1, DESCIFRADO_TAMANO_LOTE)
+    if len(textos) <= tamano or DESCIFRADO_WORKERS <= 1:
+        return _cifrar_bloque(textos)
+    bloques = [textos[i:i + tamano] for i in range(0, len(textos), tamano)]
+    resultado = []
+    for parte in _obtener_pool_descifrado().map(_cifrar_bloque, bloques):
+        resultado.extend(parte)
+    return resultado
 
-asegurar_tabla_horario()
+def indice_ciego(valor):
+    """Calcula el índice ciego (HMAC-SHA256) de un dato sensible.
+    Es determinista, por lo que permite buscar por igualdad y aplicar UNIQUE
+    sobre columnas cifradas sin descifrar fila por fila.
+    Se normaliza con strip() y lower() antes de calcularlo.
+    """
+    if valor is None:
+        return None
+    texto = str(valor).strip().lower()
+    return hmac.new(clave_indice, texto.encode(), hashlib.sha256).hexdigest()
@@ -1,93 +1,114 @@
-from .db import conectar
+import sqlite3
+from .db import abrir_conexion, seleccionar_columnas, primera_referencia_faltante, LECTURA_TAMANO_BLOQUE
+from .busqueda import iterar_registros
+
+# Columnas disponibles en obtener_diagnosticos (nombre -> expresión SQL), en el orden por defecto
+COLUMNAS_DIAGNOSTICOS = {
+    "id": "d.id",
+    "fecha": "d.fecha",
+    "descripcion": "d.descripcion",
+    "medico": "m.nombre || ' ' || m.apellido",
+    "fecha_cita": "c.fecha",
+    "motivo_cita": "c.motivo",
+}
+ORIGEN_DIAGNOSTICOS = """diagnostico d
+                JOIN medico m ON d.id_medico = m.id
+                JOIN cita c ON d.id_cita = c.id"""
 
 def eliminar_diagnostico(id_diagnostico):
     try:
-        conn, cursor = conectar()
-        # Primero verificar si hay registros relacionados
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM tratamiento 
-            WHERE id_diagnostico = ?
-        """, (id_diagnostico,))
-        if cursor.fetchone()[0] > 0:
-            return False, "No se puede eliminar el diagnóstico porque tiene tratamientos asociados"
+        with abrir_conexion() as (conn, cursor):
+            # Primero verificar si hay registros relacionados
+            cursor.execute("""
+                SELECT COUNT(*) 
+                FROM tratamiento 
+                WHERE id_diagnostico = ?
+            """, (id_diagnostico,))
+            if cursor.fetchone()[0] > 0:
+                return False, "No se puede eliminar el diagnóstico porque tiene tratamientos asociados"
         
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM historial 
-            WHERE id_diagnostico = ?
-        """, (id_diagnostico,))
-        if cursor.fetchone()[0] > 0:
-            return False, "No se puede eliminar el diagnóstico porque tiene historiales asociados"
+            cursor.execute("""
+                SELECT COUNT(*) 
+                FROM historial 
+                WHERE id_diagnostico = ?
+            """, (id_diagnostico,))
+            if cursor.fetchone()[0] > 0:
+                return False, "No se puede eliminar el diagnóstico porque tiene historiales asociados"
             
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM atencion 
-            WHERE id_diagnostico = ?
-        """, (id_diagnostico,))
-        if cursor.fetchone()[0] > 0:
-            return False, "No se puede eliminar el diagnóstico porque tiene atenciones asociadas"
+            cursor.execute("""
+                SELECT COUNT(*) 
+                FROM atencion 
+                WHERE id_diagnostico = ?
+            """, (id_diagnostico,))
+            if cursor.fetchone()[0] > 0:
+                return False, "No se puede eliminar el diagnóstico porque tiene atenciones asociadas"
         
-        # Si no hay registros relacionados, eliminar
-        cursor.execute("DELETE FROM diagnostico WHERE id = ?", (id_diagnostico,))
-        cambios = cursor.rowcount
-        conn.commit()
-        conn.close()
+            # Si no hay registros relacionados, eliminar
+            cursor.execute("DELETE FROM diagnostico WHERE id = ?", (id_diagnostico,))
+            cambios = cursor.rowcount
+            conn.commit()
         if cambios > 0:
             return True, f"Diagnóstico ID {id_diagnostico} eliminado correctamente"
         return False, f"No se encontró el diagnóstico con ID {id_diagnostico}"
     except Exception as e:
-        try:
-            conn.close()
-        except:
-            pass
         return False, str(e)
 
 def agregar_diagnostico(fecha, descripcion, id_medico, id_cita):
-    from .db import existe_tabla_id
-    
-    # Validar que existan las referencias
-    if not existe_tabla_id("medico", id_medico):
-        return False, "El médico especificado no existe"
-    if not existe_tabla_id("cita", id_cita):
-        return False, "La cita especificada no existe"
-    
     try:
-        conn, cursor = conectar()
-        cursor.execute("""
-            INSERT INTO diagnostico (fecha, descripcion, id_medico, id_cita)
-            VALUES (?, ?, ?, ?)
-        """, (fecha, descripcion, id_medico, id_cita))
-        id_generado = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with abrir_conexion() as (conn, cursor):
+            cursor.execute("""
+                INSERT INTO diagnostico (fecha, descripcion, id_medico, id_cita)
+                VALUES (?, ?, ?, ?)
+            """, (fecha, descripcion, id_medico, id_cita))
+            id_generado = cursor.lastrowid
+            conn.commit()
         return True, f"Diagnóstico ID {id_generado} agregado correctamente"
+    except sqlite3.IntegrityError as e:
+        mensaje = primera_referencia_faltante([
+            ("medico", id_medico, "El médico especificado no existe"),
+            ("cita", id_cita, "La cita especificada no existe"),
+        ])
+        return False, mensaje or str(e)
     except Exception as e:
-        try:
-            conn.close()
-        except:
-            pass
         return False, str(e)
 
-def obtener_diagnosticos():
+def obtener_diagnosticos(columnas=None):
+    """Devuelve los diagnósticos como tuplas en el orden de 'columnas' (None = COLUMNAS_DIAGNOSTICOS)."""
+    _, select = seleccionar_columnas(COLUMNAS_DIAGNOSTICOS, columnas)
     try:
-        conn, cursor = conectar()
-        cursor.execute("""
-            SELECT d.id, d.fecha, d.descripcion,
-                   m.nombre || ' ' || m.apellido AS medico,
-                   c.fecha AS fecha_cita,
-                   c.motivo AS motivo_cita
-            FROM diagnostico d
-            JOIN medico m ON d.id_medico = m.id
-            JOIN cita c ON d.id_cita = c.id
-            ORDER BY d.fecha DESC
-        """)
-        datos = cursor.fetchall()
-        conn.close()
+        with abrir_conexion() as (conn, cursor):
+            cursor.execute(f"""
+                SELECT {select}
+                FROM {ORIGEN_DIAGNOSTICOS}
+                ORDER BY d.fecha DESC
+            """)
+            datos = cursor.fetchall()
         return datos
     except Exception as e:
-        try:
-            conn.close()
-        except:
-            pass
         return []
+
+def descripciones_diagnosticos():
+    """Descripciones distintas de diagnóstico (para los filtros de la interfaz)."""
+    try:
+        with abrir_conexion() as (conn, cursor):
+            cursor.execute(
+                "SELECT DISTINCT descripcion FROM diagnostico WHERE descripcion IS NOT NULL ORDER BY descripcion"
+            )
+            return [fila[0] for fila in cursor.fetchall()]
+    except Exception as e:
+        return []
+
+def iterar_diagnosticos(columnas=None, tamano_bloque=LECTURA_TAMANO_BLOQUE, **opciones):
+    """
+    Generador sobre los diagnósticos, del más reciente al más antiguo, leídos
+    con fetchmany: memoria constante aunque la tabla sea grande.
+
+    Args:
+        columnas: Columnas de COLUMNAS_DIAGNOSTICOS (None = todas)
+        tamano_bloque: Filas por fetchmany
+        **opciones: filtros, entre, en... como en buscar_registros
+    """
+    opciones.setdefault("orden", ["-fecha"])
+    return iterar_registros(
+        COLUMNAS_DIAGNOSTICOS, tamano_bloque, origen=ORIGEN_DIAGNOSTICOS, columnas=columnas, **opciones
+    )
@@ -1,6 +1,14 @@
 import sqlite3
-from .db import conectar, existe_tabla_id
+from .db import abrir_conexion, existe_tabla_id, seleccionar_columnas
 from .busqueda import buscar_registros_exactos
+from .utilidades import normalizar_texto
+
+SQL_INSERTAR_ESPECIALIDAD = """INSERT INTO especialidad (nombre, descripcion, nombre_norm, descripcion_norm)
+                               VALUES (?, ?, ?, ?)"""
+
+def fila_especialidad(nombre, descripcion):
+    """Parámetros de SQL_INSERTAR_ESPECIALIDAD (con las columnas _norm)."""
+    return (nombre, descripcion, normalizar_texto(nombre), normalizar_texto(descripcion))
 
 def agregar_especialidad(nombre, descripcion=""):
     if not nombre.strip():
@@ -8,57 +16,43 @@ def agregar_especialidad(nombre, descripcion=""):
     if not descripcion:
         descripcion = "(Sin descripción)"
     try:
-        conexion, cursor = conectar()
-        # Evitar duplicados por nombre (insensible a mayúsculas/minúsculas)
-        cursor.execute("SELECT id FROM especialidad WHERE lower(nombre) = lower(?)", (nombre.strip(),))
-        if cursor.fetchone():
-            conexion.close()
-            return False, "Ya existe una especialidad con ese nombre"
+        with abrir_conexion() as (conexion, cursor):
+            # Evitar duplicados por nombre (insensible a mayúsculas y tildes, con índice)
+            cursor.execute("SELECT id FROM especialidad WHERE nombre_norm = ?", (normalizar_texto(nombre.strip()),))
+            if cursor.fetchone():
+                return False, "Ya existe una especialidad con ese nombre"
 
-        cursor.execute(
-            "INSERT INTO especialidad (nombre, descripcion) VALUES (?, ?)",
-            (nombre.strip().title(), descripcion.strip())
-        )
-        conexion.commit()
-        id_insertado = cursor.lastrowid
-        conexion.close()
+            cursor.execute(
+                SQL_INSERTAR_ESPECIALIDAD,
+                fila_especialidad(nombre.strip().title(), descripcion.strip())
+            )
+            conexion.commit()
+            id_insertado = cursor.lastrowid
         return True, f"Especialidad '{nombre.strip().title()}' agregada correctamente con ID {id_insertado}"
     except Exception as e:
-        try:
-            conexion.close()
-        except Exception:
-            pass
         return False, str(e)
 
-def mostrar_especialidades():
-    """Devuelve todas las especialidades como lista de diccionarios con nombres de columnas reales."""
-    conexion, cursor = conectar()
-    cursor.execute("SELECT * FROM especialidad")
-    filas = cursor.fetchall()
-    columnas = [desc[0] for desc in cursor.description]
-    conexion.close()
-    return [dict(zip(columnas, fila)) for fila in filas]
+def mostrar_especialidades(columnas=None):
+    """Devuelve todas las especialidades como lista de diccionarios con nombres de columnas reales.
+    columnas: lista de columnas a traer (None = todas), validada contra la whitelist de 'especialidad'.
+    """
+    nombres, select = seleccionar_columnas("especialidad", columnas)
+    with abrir_conexion() as (conexion, cursor):
+        cursor.execute(f"SELECT {select} FROM especialidad")
+        filas = cursor.fetchall()
+    return [dict(zip(nombres, fila)) for fila in filas]
 
 def eliminar_especialidad(id_esp):
     if not existe_tabla_id("especialidad", id_esp):
         return False, "No existe especialidad con ese ID"
     try:
-        conexion, cursor = conectar()
-        cursor.execute("DELETE FROM especialidad WHERE id = ?", (id_esp,))
-        conexion.commit()
-        conexion.close()
+        with abrir_conexion() as (conexion, cursor):
+            cursor.execute("DELETE FROM especialidad WHERE id = ?", (id_esp,))
+            conexion.commit()
         return True, f"Especialidad ID {id_esp} eliminada correctamente"
     except sqlite3.IntegrityError:
-        try:
-            conexion.close()
-        except Exception:
-            pass
         return False, "No se puede eliminar: existen médicos u otros registros que la referencian"
     except Exception as e:
-        try:
-            conexion.close()
-        except Exception:
-            pass
         return False, str(e)
 
 def actualizar_especialidad(id_esp, nombre, descripcion):
@@ -68,28 +62,23 @@ def actualizar_especialidad(id_esp, nombre, descripcion):
     if not nombre.strip():
         return False, "El nombre es obligatorio"
     try:
-        conexion, cursor = conectar()
-        # Evitar duplicado de nombre con otro ID
-        cursor.execute(
-            "SELECT id FROM especialidad WHERE lower(nombre) = lower(?) AND id <> ?",
-            (nombre.strip(), id_esp)
-        )
-        if cursor.fetchone():
-            conexion.close()
-            return False, "Ya existe otra especialidad con ese nombre"
+        with abrir_conexion() as (conexion, cursor):
+            # Evitar duplicado de nombre con otro ID
+            cursor.execute(
+                "SELECT id FROM especialidad WHERE nombre_norm = ? AND id <> ?",
+                (normalizar_texto(nombre.strip()), id_esp)
+            )
+            if cursor.fetchone():
+                return False, "Ya existe otra especialidad con ese nombre"
 
-        cursor.execute(
-            "UPDATE especialidad SET nombre = ?, descripcion = ? WHERE id = ?",
-            (nombre.strip().title(), descripcion.strip(), id_esp)
-        )
-        conexion.commit()
-        conexion.close()
+            cursor.execute(
+                """UPDATE especialidad SET nombre = ?, descripcion = ?, nombre_norm = ?, descripcion_norm = ?
+                   WHERE id = ?""",
+                (*fila_especialidad(nombre.strip().title(), descripcion.strip()), id_esp)
+            )
+            conexion.commit()
         return True, f"Especialidad ID {id_esp} actualizada correctamente"
     except Exception as e:
-        try:
-            conexion.close()
-        except Exception:
-            pass
         return False, str(e)
 
 def buscar_especialidades(nombre=None, id_especialidad=None):
@@ -1,84 +1,157 @@
-from .db import conectar
+import sqlite3
+from .db import abrir_conexion, transaccion, seleccionar_columnas, LECTURA_TAMANO_BLOQUE
+from .db import ids_faltantes, primera_referencia_faltante, describir_faltantes
+from .busqueda import buscar_pagina, iterar_registros
 from datetime import datetime
 
+# Columnas disponibles en obtener_historiales (nombre -> expresión SQL), en el orden por defecto
+COLUMNAS_HISTORIALES = {
+    "id": "h.id",
+    "fecha_registro": "h.fecha_registro",
+    "paciente": "p.nombre || ' ' || p.apellido",
+    "diagnostico": "d.descripcion",
+    "tratamiento": "t.tratamiento",
+    "observaciones": "h.observaciones",
+    "alergias": "h.alergias",
+    "resultado_examen": "h.resultado_examen",
+}
+
+ORIGEN_HISTORIALES = """historial h
+                JOIN paciente p ON h.id_paciente = p.id
+                JOIN diagnostico d ON h.id_diagnostico = d.id
+                JOIN tratamiento t ON h.id_tratamiento = t.id"""
+
 def eliminar_historial(id_historial):
     try:
-        conn, cursor = conectar()
-        # Primero verificar si hay registros relacionados
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM atencion 
-            WHERE id_historial = ?
-        """, (id_historial,))
-        if cursor.fetchone()[0] > 0:
-            return False, "No se puede eliminar el historial porque tiene atenciones asociadas"
+        with abrir_conexion() as (conn, cursor):
+            # Primero verificar si hay registros relacionados
+            cursor.execute("""
+                SELECT COUNT(*) 
+                FROM atencion 
+                WHERE id_historial = ?
+            """, (id_historial,))
+            if cursor.fetchone()[0] > 0:
+                return False, "No se puede eliminar el historial porque tiene atenciones asociadas"
         
-        # Si no hay registros relacionados, eliminar
-        cursor.execute("DELETE FROM historial WHERE id = ?", (id_historial,))
-        cambios = cursor.rowcount
-        conn.commit()
-        conn.close()
+            # Si no hay registros relacionados, eliminar
+            cursor.execute("DELETE FROM historial WHERE id = ?", (id_historial,))
+            cambios = cursor.rowcount
+            conn.commit()
         if cambios > 0:
             return True, f"Historial ID {id_historial} eliminado correctamente"
         return False, f"No se encontró el historial con ID {id_historial}"
     except Exception as e:
-        try:
-            conn.close()
-        except:
-            pass
         return False, str(e)
 
+SQL_INSERTAR_HISTORIAL = """
+                INSERT INTO historial (fecha_registro, id_diagnostico, id_tratamiento, observaciones, alergias, resultado_examen, id_paciente, id_cita)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """
+
 def agregar_historial(fecha_registro, id_diagnostico, id_tratamiento, observaciones, alergias, resultado_examen, id_paciente, id_cita):
-    from .db import existe_tabla_id
-    
-    # Validar que existan las referencias
-    if not existe_tabla_id("diagnostico", id_diagnostico):
-        return False, "El diagnóstico especificado no existe"
-    if not existe_tabla_id("tratamiento", id_tratamiento):
-        return False, "El tratamiento especificado no existe"
-    if not existe_tabla_id("paciente", id_paciente):
-        return False, "El paciente especificado no existe"
-    if not existe_tabla_id("cita", id_cita):
-        return False, "La cita especificada no existe"
-    
+    # Las referencias las valida SQLite (foreign_keys=ON); solo si el INSERT
+    # falla se consulta, en una sola ida, cuál de ellas no existe
     try:
-        conn, cursor = conectar()
-        cursor.execute("""
-            INSERT INTO historial (fecha_registro, id_diagnostico, id_tratamiento, observaciones, alergias, resultado_examen, id_paciente, id_cita)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (fecha_registro, id_diagnostico, id_tratamiento, observaciones, alergias, resultado_examen, id_paciente, id_cita))
-        id_generado = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with abrir_conexion() as (conn, cursor):
+            cursor.execute(SQL_INSERTAR_HISTORIAL, (fecha_registro, id_diagnostico, id_tratamiento, observaciones, alergias, resultado_examen, id_paciente, id_cita))
+            id_generado = cursor.lastrowid
+            conn.commit()
         return True, f"Historial ID {id_generado} agregado correctamente"
+    except sqlite3.IntegrityError as e:
+        mensaje = primera_referencia_faltante([
+            ("diagnostico", id_diagnostico, "El diagnóstico especificado no existe"),
+            ("tratamiento", id_tratamiento, "El tratamiento especificado no existe"),
+            ("paciente", id_paciente, "El paciente especificado no existe"),
+            ("cita", id_cita, "La cita especificada no existe"),
+        ])
+        return False, mensaje or str(e)
     except Exception as e:
-        try:
-            conn.close()
-        except:
-            pass
         return False, str(e)
 
-def obtener_historiales():
+def agregar_historiales_lote(historiales):
+    """
+    Inserta muchos historiales validando todas sus referencias con una sola
+    consulta y escribiendo en una sola transacción (todos o ninguno).
+
+    Args:
+        historiales: Iterable de tuplas con los argumentos de agregar_historial, en el mismo orden
+
+    Returns:
+        tuple: (ok, mensaje, ids insertados en el mismo orden)
+    """
+    historiales = list(historiales)
+    if not historiales:
+        return True, "No hay historiales para agregar", []
+
+    faltantes = ids_faltantes({
+        "diagnostico": [h[1] for h in historiales],
+        "tratamiento": [h[2] for h in historiales],
+        "paciente": [h[6] for h in historiales],
+        "cita": [h[7] for h in historiales],
+    })
+    if faltantes:
+        return False, f"Referencias inexistentes ({describir_faltantes(faltantes)})", []
+
     try:
-        conn, cursor = conectar()
-        cursor.execute("""
-            SELECT h.id, h.fecha_registro,
-                   p.nombre || ' ' || p.apellido AS paciente,
-                   d.descripcion AS diagnostico,
-                   t.tratamiento AS tratamiento,
-                   h.observaciones, h.alergias, h.resultado_examen
-            FROM historial h
-            JOIN paciente p ON h.id_paciente = p.id
-            JOIN diagnostico d ON h.id_diagnostico = d.id
-            JOIN tratamiento t ON h.id_tratamiento = t.id
-            ORDER BY h.fecha_registro DESC
-        """)
-        datos = cursor.fetchall()
-        conn.close()
+        ids = []
+        with transaccion(), abrir_conexion() as (_, cursor):
+            for historial in historiales:
+                cursor.execute(SQL_INSERTAR_HISTORIAL, tuple(historial))
+                ids.append(cursor.lastrowid)
+        return True, f"{len(ids)} historial(es) agregado(s) correctamente", ids
+    except Exception as e:
+        return False, str(e), []
+
+def obtener_historiales(columnas=None):
+    """Devuelve los historiales como tuplas en el orden de 'columnas' (None = COLUMNAS_HISTORIALES)."""
+    _, select = seleccionar_columnas(COLUMNAS_HISTORIALES, columnas)
+    try:
+        with abrir_conexion() as (conn, cursor):
+            cursor.execute(f"""
+                SELECT {select}
+                FROM {ORIGEN_HISTORIALES}
+                ORDER BY h.fecha_registro DESC
+            """)
+            datos = cursor.fetchall()
         return datos
     except Exception as e:
-        try:
-            conn.close()
-        except:
-            pass
         return []
+
+def pagina_historiales(tamano, despues_de=None, columnas=None, desde=None, hasta=None, en=None):
+    """
+    Una página de historiales ordenados por (fecha_registro, id) descendente,
+    con paginación por cursor sobre idx_historial_fecha_registro.
+
+    Args:
+        tamano: Historiales por página
+        despues_de: Cursor devuelto por la página anterior (None = primera página)
+        columnas: Columnas de COLUMNAS_HISTORIALES (None = todas); se agregan las del orden
+        desde, hasta: Rango inclusivo de fecha_registro (None = abierto)
+        en: {"columna": iterable} pertenencia, p. ej. {"id": ids}
+
+    Returns:
+        tuple: (lista de diccionarios, cursor de la página siguiente o None)
+    """
+    return buscar_pagina(
+        COLUMNAS_HISTORIALES, tamano, despues_de,
+        origen=ORIGEN_HISTORIALES,
+        columnas=columnas,
+        entre={"fecha_registro": (desde, hasta)},
+        en=en,
+        orden=["-fecha_registro"],
+    )
+
+def iterar_historiales(columnas=None, tamano_bloque=LECTURA_TAMANO_BLOQUE, **opciones):
+    """
+    Generador sobre los historiales, del más reciente al más antiguo, leídos
+    con fetchmany: memoria constante aunque la tabla sea grande.
+
+    Args:
+        columnas: Columnas de COLUMNAS_HISTORIALES (None = todas)
+        tamano_bloque: Filas por fetchmany
+        **opciones: filtros, entre, en... como en buscar_registros
+    """
+    opciones.setdefault("orden", ["-fecha_registro"])
+    return iterar_registros(
+        COLUMNAS_HISTORIALES, tamano_bloque, origen=ORIGEN_HISTORIALES, columnas=columnas, **opciones
+    )
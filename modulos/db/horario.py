@@ -1,5 +1,5 @@
 from datetime import time
-from .db import conectar, existe_tabla_id, cifrar_dato, descifrar_dato
+from .db import abrir_conexion, transaccion, existe_tabla_id, cifrar_dato, descifrar_dato
 
 # Días: 0=Lunes ... 6=Domingo
 DIAS_LABEL = ["Lunes","Martes","Miércoles","Jueves","Viernes","Sábado","Domingo"]
@@ -23,10 +23,9 @@ def _validar_intervalos(bloques):
     return True, "OK"
 
 def obtener_horarios_medico(id_medico):
-    conexion, cursor = conectar()
-    cursor.execute("SELECT dia_semana, hora_inicio, hora_fin, tipo FROM horario_medico WHERE id_medico=? ORDER BY dia_semana, hora_inicio", (id_medico,))
-    filas = cursor.fetchall()
-    conexion.close()
+    with abrir_conexion() as (conexion, cursor):
+        cursor.execute("SELECT dia_semana, hora_inicio, hora_fin, tipo FROM horario_medico WHERE id_medico=? ORDER BY dia_semana, hora_inicio", (id_medico,))
+        filas = cursor.fetchall()
     resultado = {d: [] for d in range(7)}
     for dia, ini, fin, tipo in filas:
         resultado[dia].append((ini, fin, tipo))
@@ -53,48 +52,40 @@ def reemplazar_horarios_dia(id_medico, dia_semana, bloques, tipo=None):
     if not ok:
         return False, msg
     try:
-        conexion, cursor = conectar()
-        cursor.execute("DELETE FROM horario_medico WHERE id_medico=? AND dia_semana=?", (id_medico, dia_semana))
-        for ini, fin in bloques:
-            cursor.execute(
+        # Borrado e inserciones en una sola transacción (o dentro de la transacción en curso)
+        with transaccion(), abrir_conexion() as (_, cursor):
+            cursor.execute("DELETE FROM horario_medico WHERE id_medico=? AND dia_semana=?", (id_medico, dia_semana))
+            cursor.executemany(
                 "INSERT INTO horario_medico (id_medico, dia_semana, hora_inicio, hora_fin, tipo) VALUES (?,?,?,?,?)",
-                (id_medico, dia_semana, ini, fin, tipo)
+                [(id_medico, dia_semana, ini, fin, tipo) for ini, fin in bloques]
             )
-        conexion.commit()
-        conexion.close()
         return True, "Horarios reemplazados"
     except Exception as e:
-        try:
-            conexion.close()
-        except Exception:
-            pass
         return False, f"Error al guardar horarios: {e}"
 
 def eliminar_horarios_dia(id_medico, dia_semana):
     if not existe_tabla_id("medico", id_medico):
         return False, "No existe médico"
     try:
-        conexion, cursor = conectar()
-        cursor.execute("DELETE FROM horario_medico WHERE id_medico=? AND dia_semana=?", (id_medico, dia_semana))
-        cambios = cursor.rowcount
-        conexion.commit()
-        conexion.close()
+        with abrir_conexion() as (conexion, cursor):
+            cursor.execute("DELETE FROM horario_medico WHERE id_medico=? AND dia_semana=?", (id_medico, dia_semana))
+            cambios = cursor.rowcount
+            conexion.commit()
         return True, f"{cambios} bloque(s) eliminados"
     except Exception as e:
         return False, str(e)
 
 def medicos_disponibles(dia_semana, hora_str):
-    conexion, cursor = conectar()
-    cursor.execute(
-        """
-        SELECT DISTINCT m.id, m.nombre, m.apellido
-        FROM horario_medico h
-        JOIN medico m ON h.id_medico = m.id
-        WHERE h.dia_semana=? AND h.hora_inicio <= ? AND h.hora_fin > ?
-        ORDER BY m.nombre
-        """,
-        (dia_semana, hora_str, hora_str)
-    )
-    filas = cursor.fetchall()
-    conexion.close()
+    with abrir_conexion() as (conexion, cursor):
+        cursor.execute(
+            """
+            SELECT DISTINCT m.id, m.nombre, m.apellido
+            FROM horario_medico h
+            JOIN medico m ON h.id_medico = m.id
+            WHERE h.dia_semana=? AND h.hora_inicio <= ? AND h.hora_fin > ?
+            ORDER BY m.nombre
+            """,
+            (dia_semana, hora_str, hora_str)
+        )
+        filas = cursor.fetchall()
     return filas
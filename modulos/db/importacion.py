@@ -0,0 +1,207 @@
+import csv
+import json
+import sqlite3
+from datetime import date
+from itertools import islice
+from .db import abrir_conexion, transaccion, cifrar_lote, indice_ciego
+from .paciente import (
+    CAMPOS_CIFRADOS_PACIENTE,
+    SQL_INSERTAR_PACIENTE,
+    fila_paciente,
+    validar_datos_paciente
+)
+
+# ======================================================
+# IMPORTACIÓN MASIVA DE PACIENTES DESDE CSV
+# ======================================================
+# El archivo se lee por bloques de IMPORTACION_TAMANO_BLOQUE filas (memoria
+# constante). Cada bloque se valida completo, se revisan sus duplicados dentro
+# del archivo y contra la base con una sola consulta por índices ciegos, se
+# cifra con cifrar_lote y se inserta con executemany en una transacción.
+
+IMPORTACION_TAMANO_BLOQUE = 2000
+
+COLUMNAS_OBLIGATORIAS_PACIENTE = (
+    "rut", "nombre", "apellido", "fecha_nacimiento", "correo", "telefono",
+    "genero", "direccion", "sistema_salud", "nacionalidad"
+)
+COLUMNAS_OPCIONALES_PACIENTE = ("nombre_emergencia", "apellido_emergencia", "telefono_emergencia")
+
+# Columnas que se anteponen a la fila original en el archivo de rechazos
+COLUMNAS_RECHAZO = ("linea", "motivo")
+
+
+def _filas_numeradas(lector):
+    """(número de línea, fila) con las claves normalizadas a minúsculas."""
+    for fila in lector:
+        yield lector.line_num, {
+            (clave or "").strip().lower(): (valor or "").strip()
+            for clave, valor in fila.items() if clave is not None
+        }
+
+
+def _bloques(filas, tamano):
+    while True:
+        bloque = list(islice(filas, tamano))
+        if not bloque:
+            return
+        yield bloque
+
+
+def _hashes_existentes(ruts_hash, correos_hash):
+    """rut_hash y correo_hash que ya existen en paciente (una sola consulta)."""
+    with abrir_conexion() as (_, cursor):
+        cursor.execute(
+            """
+            SELECT rut_hash, correo_hash FROM paciente
+            WHERE rut_hash IN (SELECT value FROM json_each(?))
+               OR correo_hash IN (SELECT value FROM json_each(?))
+            """,
+            (json.dumps(ruts_hash), json.dumps(correos_hash))
+        )
+        filas = cursor.fetchall()
+    return {fila[0] for fila in filas}, {fila[1] for fila in filas}
+
+
+def _validar_fila(fila):
+    """(True, datos) o (False, motivo) para una fila del CSV."""
+    try:
+        fecha_nacimiento = date.fromisoformat(fila.get("fecha_nacimiento", ""))
+    except ValueError:
+        return False, "Fecha de nacimiento inválida (use AAAA-MM-DD)."
+    return validar_datos_paciente(
+        fila.get("rut"), fila.get("nombre"), fila.get("apellido"), fecha_nacimiento,
+        fila.get("correo"), fila.get("telefono"), fila.get("genero"), fila.get("direccion"),
+        fila.get("sistema_salud"), fila.get("nacionalidad"),
+        fila.get("nombre_emergencia") or None, fila.get("apellido_emergencia") or None,
+        fila.get("telefono_emergencia") or None
+    )
+
+
+def _insertar(validos):
+    """
+    Inserta el bloque con executemany en una transacción. Si otra sesión
+    insertó un RUT o correo entremedio, reintenta fila por fila para rechazar
+    solo las que chocan.
+
+    Returns:
+        list: (linea, fila, motivo) de las filas rechazadas
+    """
+    cifrados = cifrar_lote(datos[campo] for _, _, datos, _ in validos for campo in CAMPOS_CIFRADOS_PACIENTE)
+    ancho = len(CAMPOS_CIFRADOS_PACIENTE)
+    parametros = [
+        fila_paciente(datos, cifrados[i * ancho:(i + 1) * ancho])
+        for i, (_, _, datos, _) in enumerate(validos)
+    ]
+    try:
+        with transaccion(), abrir_conexion() as (_, cursor):
+            cursor.executemany(SQL_INSERTAR_PACIENTE, parametros)
+        return []
+    except sqlite3.IntegrityError:
+        pass
+
+    rechazos = []
+    with transaccion():
+        for (linea, fila, _, _), parametro in zip(validos, parametros):
+            # Dentro de transaccion() cada abrir_conexion() es un SAVEPOINT:
+            # el error de una fila no deshace las demás
+            try:
+                with abrir_conexion() as (_, cursor):
+                    cursor.execute(SQL_INSERTAR_PACIENTE, parametro)
+            except sqlite3.IntegrityError:
+                rechazos.append((linea, fila, "Ya existe un paciente con ese RUT o correo."))
+    return rechazos
+
+
+def importar_pacientes_csv(archivo, rechazos=None, tamano_bloque=IMPORTACION_TAMANO_BLOQUE,
+                           delimitador=",", al_avanzar=None):
+    """
+    Importa pacientes desde un CSV con encabezado, por bloques.
+
+    Columnas obligatorias: COLUMNAS_OBLIGATORIAS_PACIENTE (fecha_nacimiento en
+    formato AAAA-MM-DD); opcionales: COLUMNAS_OPCIONALES_PACIENTE, que son
+    obligatorias para menores de 18 años. Se aplican las mismas reglas que en
+    agregar_paciente (validar_datos_paciente).
+
+    Args:
+        archivo: Objeto de texto abierto (iterable de líneas)
+        rechazos: Objeto de texto donde se escriben las filas rechazadas como
+            CSV, con 'linea' y 'motivo' antes de las columnas originales
+            (None = no se escriben)
+        tamano_bloque: Filas por bloque (validación, cifrado y transacción)
+        delimitador: Separador de columnas del CSV
+        al_avanzar: Función opcional que recibe el resumen tras cada bloque
+
+    Returns:
+        tuple: (ok, mensaje, resumen) con resumen
+            {'leidas': n, 'insertadas': n, 'rechazadas': n}
+    """
+    resumen = {'leidas': 0, 'insertadas': 0, 'rechazadas': 0}
+    lector = csv.DictReader(archivo, delimiter=delimitador)
+    encabezado = [(columna or "").strip().lower() for columna in (lector.fieldnames or [])]
+    faltantes = [columna for columna in COLUMNAS_OBLIGATORIAS_PACIENTE if columna not in encabezado]
+    if faltantes:
+        return False, f"Faltan columnas en el archivo: {', '.join(faltantes)}", resumen
+
+    escritor = None
+    if rechazos is not None:
+        escritor = csv.writer(rechazos, delimiter=delimitador)
+        escritor.writerow([*COLUMNAS_RECHAZO, *encabezado])
+
+    def rechazar(linea, fila, motivo):
+        resumen['rechazadas'] += 1
+        if escritor is not None:
+            escritor.writerow([linea, motivo, *(fila.get(columna, "") for columna in encabezado)])
+
+    # Índices ciegos ya vistos en el archivo: duplicados entre bloques
+    vistos_rut, vistos_correo = set(), set()
+    try:
+        for bloque in _bloques(_filas_numeradas(lector), max(1, tamano_bloque)):
+            resumen['leidas'] += len(bloque)
+
+            # 1) Validación y duplicados dentro del archivo
+            candidatos = []
+            for linea, fila in bloque:
+                ok, datos = _validar_fila(fila)
+                if not ok:
+                    rechazar(linea, fila, datos)
+                    continue
+                hashes = (indice_ciego(datos["rut"]), indice_ciego(datos["correo"]))
+                if hashes[0] in vistos_rut or hashes[1] in vistos_correo:
+                    rechazar(linea, fila, "RUT o correo repetido en el archivo.")
+                    continue
+                vistos_rut.add(hashes[0])
+                vistos_correo.add(hashes[1])
+                candidatos.append((linea, fila, datos, hashes))
+
+            # 2) Duplicados contra la base: una consulta por bloque
+            validos = []
+            if candidatos:
+                ruts, correos = _hashes_existentes(
+                    [h[0] for *_, h in candidatos], [h[1] for *_, h in candidatos]
+                )
+                for candidato in candidatos:
+                    rut_hash, correo_hash = candidato[3]
+                    if rut_hash in ruts or correo_hash in correos:
+                        rechazar(candidato[0], candidato[1], "Ya existe un paciente con ese RUT o correo.")
+                    else:
+                        validos.append(candidato)
+
+            # 3) Cifrado en lote e inserción
+            if validos:
+                chocan = _insertar(validos)
+                for linea, fila, motivo in chocan:
+                    rechazar(linea, fila, motivo)
+                resumen['insertadas'] += len(validos) - len(chocan)
+
+            if al_avanzar is not None:
+                al_avanzar(resumen)
+    except csv.Error as e:
+        return False, f"Error de formato CSV cerca de la línea {lector.line_num}: {e}", resumen
+    except Exception as e:
+        return False, f"Error al importar pacientes: {e}", resumen
+
+    return True, (
+        f"{resumen['insertadas']} paciente(s) importado(s), "
+        f"{resumen['rechazadas']} rechazado(s) de {resumen['leidas']} fila(s)."
+    ), resumen
@@ -1,7 +1,44 @@
-from .db import conectar, existe_tabla_id, cifrar_dato, descifrar_dato
-from .busqueda import buscar_registros_exactos
-from .utilidades import formatear_rut, validar_rut, validar_email, validar_telefono
+from .db import abrir_conexion, existe_tabla_id, cifrar_dato, descifrar_lote, indice_ciego, seleccionar_columnas
+from .db import LECTURA_TAMANO_BLOQUE
+from .busqueda import buscar_registros_exactos, iterar_bloques
+from .registro import RegistroCifrado, iterar_descifrados
+from .utilidades import formatear_rut, validar_rut, validar_email, validar_telefono, normalizar_texto
 import re
+import sqlite3
+
+# Columnas disponibles en mostrar_medicos (nombre -> expresión SQL)
+COLUMNAS_MEDICOS = {
+    "id": "m.id",
+    "rut": "m.rut",
+    "nombre": "m.nombre",
+    "apellido": "m.apellido",
+    "correo": "m.correo",
+    "telefono": "m.telefono",
+    "id_especialidad": "m.id_especialidad",
+    "horario": "m.horario",
+    "especialidad": "e.nombre",
+}
+ORIGEN_MEDICOS = "medico m LEFT JOIN especialidad e ON m.id_especialidad = e.id"
+CAMPOS_CIFRADOS_MEDICO = ("rut", "correo", "telefono")
+
+
+def _duplicados_medico(cursor, rut_hash, correo_hash, telefono_hash, excluir_id=None):
+    """
+    Indica qué campos únicos ya están en uso consultando los índices ciegos.
+    Retorna una tupla de booleanos (rut, correo, telefono).
+    """
+    consulta = """
+        SELECT MAX(rut_hash = ?), MAX(correo_hash = ?), MAX(telefono_hash = ?)
+        FROM medico
+        WHERE (rut_hash = ? OR correo_hash = ? OR telefono_hash = ?)
+    """
+    params = [rut_hash, correo_hash, telefono_hash, rut_hash, correo_hash, telefono_hash]
+    if excluir_id is not None:
+        consulta += " AND id <> ?"
+        params.append(excluir_id)
+    cursor.execute(consulta, params)
+    fila = cursor.fetchone()
+    return tuple(bool(v) for v in fila)
 
 def crear_medico(rut, nombre, apellido, correo, telefono, id_especialidad, horario=None):
     """
@@ -46,115 +83,105 @@ def crear_medico(rut, nombre, apellido, correo, telefono, id_especialidad, horar
             return False, "Si se ingresa horario, no puede estar vacío."
 
     try:
-        conexion, cursor = conectar()
-
-        # Cargar todos para verificar duplicados descifrando (porque algunos pueden estar cifrados y otros no)
-        cursor.execute("SELECT id, rut, correo, telefono FROM medico")
-        filas = cursor.fetchall()
-        for _id, rut_db, correo_db, tel_db in filas:
-            # Intentar descifrar; si falla asumimos texto plano
-            try:
-                rut_dec = descifrar_dato(rut_db)
-            except Exception:
-                rut_dec = rut_db
-            try:
-                correo_dec = descifrar_dato(correo_db)
-            except Exception:
-                correo_dec = correo_db
-            try:
-                tel_dec = descifrar_dato(tel_db)
-            except Exception:
-                tel_dec = tel_db
-            if rut_dec == rut_formateado:
-                conexion.close()
+        with abrir_conexion() as (conexion, cursor):
+
+            # Verificar duplicados con una sola búsqueda indexada sobre los índices ciegos
+            rut_hash = indice_ciego(rut_formateado)
+            correo_hash = indice_ciego(correo.strip())
+            telefono_hash = indice_ciego(telefono.strip())
+            dup_rut, dup_correo, dup_tel = _duplicados_medico(cursor, rut_hash, correo_hash, telefono_hash)
+            if dup_rut:
                 return False, f"Ya existe un médico registrado con el RUT {rut_formateado}"
-            if correo_dec == correo.strip():
-                conexion.close()
+            if dup_correo:
                 return False, f"Ya existe un médico registrado con el correo {correo.strip()}"
-            if tel_dec == telefono.strip():
-                conexion.close()
+            if dup_tel:
                 return False, f"Ya existe un médico registrado con el teléfono {telefono.strip()}"
 
-        # Insertar cifrando campos sensibles
-        cursor.execute(
-            """
-            INSERT INTO medico (rut, nombre, apellido, correo, telefono, id_especialidad, horario)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                cifrar_dato(rut_formateado),
-                nombre.strip().title(),
-                apellido.strip().title(),
-                cifrar_dato(correo.strip()),
-                cifrar_dato(telefono.strip()),
-                id_especialidad,
-                horario if horario else None
+            # Insertar cifrando campos sensibles
+            cursor.execute(
+                """
+                INSERT INTO medico (rut, nombre, apellido, correo, telefono, id_especialidad, horario,
+                                    rut_hash, correo_hash, telefono_hash, nombre_norm, apellido_norm)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    cifrar_dato(rut_formateado),
+                    nombre.strip().title(),
+                    apellido.strip().title(),
+                    cifrar_dato(correo.strip()),
+                    cifrar_dato(telefono.strip()),
+                    id_especialidad,
+                    horario if horario else None,
+                    rut_hash,
+                    correo_hash,
+                    telefono_hash,
+                    normalizar_texto(nombre.strip().title()),
+                    normalizar_texto(apellido.strip().title())
+                )
             )
-        )
 
-        conexion.commit()
-        id_insertado = cursor.lastrowid
-        conexion.close()
+            conexion.commit()
+            id_insertado = cursor.lastrowid
 
         mensaje_ok = f"Médico '{nombre.strip().title()} {apellido.strip().title()}' agregado correctamente con ID {id_insertado}"
         return True, mensaje_ok
 
+    except sqlite3.IntegrityError:
+        return False, "Ya existe un médico registrado con ese RUT, correo o teléfono"
     except Exception as e:
-        try:
-            conexion.close()
-        except Exception:
-            pass
         return False, f"Error inesperado al crear médico: {str(e)}"
 
 
-def mostrar_medicos():
+def mostrar_medicos(columnas=None):
     """
-    Devuelve todos los médicos como lista de diccionarios con nombres de columnas reales.
+    Devuelve todos los médicos como RegistroCifrado con nombres de columnas reales;
+    rut, correo y teléfono se descifran solo al leerlos.
     SELECT explícito para asegurar el orden de columnas y que incluimos 'rut'.
+
+    Args:
+        columnas: Lista de columnas de COLUMNAS_MEDICOS a traer (None = todas).
+            Ej: ["id", "nombre", "apellido"] para un selectbox.
     """
+    nombres, select = seleccionar_columnas(COLUMNAS_MEDICOS, columnas)
+    cifrados = [campo for campo in CAMPOS_CIFRADOS_MEDICO if campo in nombres]
     try:
-        conexion, cursor = conectar()
-
-        cursor.execute(
-            """
-            SELECT m.id, m.rut, m.nombre, m.apellido, m.correo, m.telefono, 
-                   m.id_especialidad, m.horario, e.nombre as especialidad
-            FROM medico m
-            LEFT JOIN especialidad e ON m.id_especialidad = e.id
-            ORDER BY m.id
-            """
-        )
-
-        filas = cursor.fetchall()
-        
-        # Obtener nombres de columnas
-        columnas = [desc[0] for desc in cursor.description]
-
-        conexion.close()
-
-        # Convertir a lista de diccionarios y descifrar campos sensibles
-        lista_resultado = []
-        for fila in filas:
-            fila_dict = dict(zip(columnas, fila))
-            for campo in ["rut", "correo", "telefono"]:
-                if campo in fila_dict and fila_dict[campo] is not None:
-                    try:
-                        fila_dict[campo] = descifrar_dato(fila_dict[campo])
-                    except Exception:
-                        # Ya está en texto plano
-                        pass
-            lista_resultado.append(fila_dict)
-
-        return lista_resultado
+        with abrir_conexion() as (conexion, cursor):
+
+            cursor.execute(
+                f"""
+                SELECT {select}
+                FROM {ORIGEN_MEDICOS}
+                ORDER BY m.id
+                """
+            )
+
+            filas = cursor.fetchall()
+
+        # Filas con descifrado perezoso (los médicos en texto plano se cifran al iniciar)
+        return [RegistroCifrado(zip(nombres, fila), cifrados) for fila in filas]
 
     except Exception as e:
-        try:
-            conexion.close()
-        except:
-            pass
         return []
 
 
+def iterar_medicos(columnas=None, descifrar=True, tamano_bloque=LECTURA_TAMANO_BLOQUE, **opciones):
+    """
+    Generador sobre todos los médicos (ordenados por id) con memoria
+    constante: lee con fetchmany y descifra cada bloque en lote.
+
+    Args:
+        columnas: Columnas de COLUMNAS_MEDICOS (None = todas)
+        descifrar: True entrega dicts descifrados; False, RegistroCifrado
+        tamano_bloque: Filas por fetchmany (y por llamada a descifrar_lote)
+        **opciones: filtros, entre, en... como en buscar_registros
+    """
+    cifrados = [campo for campo in CAMPOS_CIFRADOS_MEDICO if columnas is None or campo in columnas]
+    bloques = iterar_bloques(
+        COLUMNAS_MEDICOS, tamano_bloque, origen=ORIGEN_MEDICOS, columnas=columnas, **opciones
+    )
+    return iterar_descifrados(bloques, cifrados, descifrar)
+
+
 def borrar_medico(id_med):
     """
     Elimina un médico por ID.
@@ -166,15 +193,14 @@ def borrar_medico(id_med):
         return False, "No existe médico con ese ID."
 
     try:
-        conexion, cursor = conectar()
+        with abrir_conexion() as (conexion, cursor):
 
-        cursor.execute(
-            "DELETE FROM medico WHERE id = ?",
-            (id_med,)
-        )
+            cursor.execute(
+                "DELETE FROM medico WHERE id = ?",
+                (id_med,)
+            )
 
-        conexion.commit()
-        conexion.close()
+            conexion.commit()
 
         msg_ok = "Médico ID " + str(id_med) + " eliminado correctamente"
         return True, msg_ok
@@ -224,71 +250,62 @@ def actualizar_medico(id_med, rut, nombre, apellido, correo, telefono, id_especi
             return False, "Si se ingresa horario, no puede estar vacío."
 
     try:
-        conexion, cursor = conectar()
-
-        # Verificar duplicados contra otros registros (descifrando si corresponde)
-        cursor.execute("SELECT id, rut, correo, telefono FROM medico")
-        filas = cursor.fetchall()
-        for _id, rut_db, correo_db, tel_db in filas:
-            if _id == id_med:
-                continue
-            try:
-                rut_dec = descifrar_dato(rut_db)
-            except Exception:
-                rut_dec = rut_db
-            try:
-                correo_dec = descifrar_dato(correo_db)
-            except Exception:
-                correo_dec = correo_db
-            try:
-                tel_dec = descifrar_dato(tel_db)
-            except Exception:
-                tel_dec = tel_db
-            if rut_dec == rut_formateado:
-                conexion.close()
+        with abrir_conexion() as (conexion, cursor):
+
+            # Verificar duplicados contra otros registros mediante los índices ciegos
+            rut_hash = indice_ciego(rut_formateado)
+            correo_hash = indice_ciego(correo.strip())
+            telefono_hash = indice_ciego(telefono.strip())
+            dup_rut, dup_correo, dup_tel = _duplicados_medico(
+                cursor, rut_hash, correo_hash, telefono_hash, excluir_id=id_med
+            )
+            if dup_rut:
                 return False, "Ya existe otro médico con ese RUT"
-            if correo_dec == correo.strip():
-                conexion.close()
+            if dup_correo:
                 return False, "Ya existe otro médico con ese correo"
-            if tel_dec == telefono.strip():
-                conexion.close()
+            if dup_tel:
                 return False, "Ya existe otro médico con ese teléfono"
 
-        cursor.execute(
-            """
-            UPDATE medico
-            SET rut = ?,
-                nombre = ?,
-                apellido = ?,
-                correo = ?,
-                telefono = ?,
-                id_especialidad = ?,
-                horario = ?
-            WHERE id = ?
-            """,
-            (
-                cifrar_dato(rut_formateado),
-                nombre.strip().title(),
-                apellido.strip().title(),
-                cifrar_dato(correo.strip()),
-                cifrar_dato(telefono.strip()),
-                id_especialidad,
-                horario if horario else None,
-                id_med
+            cursor.execute(
+                """
+                UPDATE medico
+                SET rut = ?,
+                    nombre = ?,
+                    apellido = ?,
+                    correo = ?,
+                    telefono = ?,
+                    id_especialidad = ?,
+                    horario = ?,
+                    rut_hash = ?,
+                    correo_hash = ?,
+                    telefono_hash = ?,
+                    nombre_norm = ?,
+                    apellido_norm = ?
+                WHERE id = ?
+                """,
+                (
+                    cifrar_dato(rut_formateado),
+                    nombre.strip().title(),
+                    apellido.strip().title(),
+                    cifrar_dato(correo.strip()),
+                    cifrar_dato(telefono.strip()),
+                    id_especialidad,
+                    horario if horario else None,
+                    rut_hash,
+                    correo_hash,
+                    telefono_hash,
+                    normalizar_texto(nombre.strip().title()),
+                    normalizar_texto(apellido.strip().title()),
+                    id_med
+                )
             )
-        )
 
-        conexion.commit()
-        conexion.close()
+            conexion.commit()
 
         msg_ok = "Médico ID " + str(id_med) + " actualizado correctamente"
         return True, msg_ok
 
     except Exception as e:
-        try:
-            conexion.close()
-        except Exception:
-            pass
         return False, "Error al actualizar médico. Verifique datos y duplicados."
 
 
@@ -297,8 +314,7 @@ def buscar_medicos(nombre=None, apellido=None, id_especialidad=None, id_medico=N
     Búsqueda exacta de médicos por uno o más campos.
     Usa buscar_registros_exactos, que asumo hace SELECT ... WHERE campo = valor AND ...
     """
-    # Debido a que rut, correo y telefono están cifrados, buscar por RUT requiere
-    # una comparación después de descifrar. Otros filtros pueden ir directos.
+    # El RUT está cifrado: se busca por su índice ciego (rut_hash, UNIQUE)
     filtros = {}
     if nombre:
         filtros["nombre"] = nombre.strip().title()
@@ -308,27 +324,16 @@ def buscar_medicos(nombre=None, apellido=None, id_especialidad=None, id_medico=N
         filtros["id_especialidad"] = id_especialidad
     if id_medico:
         filtros["id"] = id_medico
+    if rut and validar_rut(rut):
+        filtros["rut_hash"] = indice_ciego(formatear_rut(rut))
 
-    # Ejecutar búsqueda base sin rut primero
     base = buscar_registros_exactos("medico", filtros)
 
-    # Descifrar campos sensibles para consistencia con mostrar_medicos
+    # Descifrar solo las filas encontradas, en lote (igual que mostrar_medicos)
+    descifrados = iter(descifrar_lote(
+        fila.get(campo) for fila in base for campo in CAMPOS_CIFRADOS_MEDICO
+    ))
     for fila in base:
-        for campo in ["rut", "correo", "telefono"]:
-            val = fila.get(campo)
-            if val is not None:
-                try:
-                    fila[campo] = descifrar_dato(val)
-                except Exception:
-                    # ya podría estar plano
-                    pass
-
-    if rut and validar_rut(rut):
-        rut_normalizado = formatear_rut(rut)
-        filtrados = []
-        for fila in base:
-            valor_rut = fila.get("rut")
-            if valor_rut == rut_normalizado:
-                filtrados.append(fila)
-        return filtrados
+        for campo in CAMPOS_CIFRADOS_MEDICO:
+            fila[campo] = next(descifrados)
     return base
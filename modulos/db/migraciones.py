@@ -0,0 +1,347 @@
+import os
+import sqlite3
+from .db import SQL_PATH, TABLAS_TEXTO_COMPLETO, COLUMNAS_NORMALIZADAS
+from .db import cifrar_dato, descifrar_dato, es_cifrado, indice_ciego
+from .utilidades import normalizar_texto
+
+# ======================================================
+# MIGRACIONES DE ESQUEMA (PRAGMA user_version)
+# ======================================================
+# Cada migración es (número, descripción, función(cursor)). Se aplican en
+# orden, una transacción por migración, y el número queda guardado en
+# PRAGMA user_version dentro de la misma transacción. Deben ser idempotentes:
+# una base creada desde hospital.sql o migrada a medias puede volver a pasar
+# por ellas sin error.
+#
+# Al agregar una migración, reflejar el cambio también en hospital.sql y
+# actualizar allí el PRAGMA user_version final.
+
+
+def version_esquema(conexion):
+    """Versión del esquema guardada en la base (0 = sin migrar)."""
+    return conexion.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _sentencias_sql(script):
+    """Divide un script SQL en sentencias completas (respeta los CREATE TRIGGER ... END;)."""
+    actual = ""
+    for linea in script.splitlines(keepends=True):
+        actual += linea
+        if sqlite3.complete_statement(actual):
+            yield actual
+            actual = ""
+
+
+# ------------------------------------------------------
+# 1. Tabla horario_medico
+# ------------------------------------------------------
+def _crear_tabla_horario(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS horario_medico (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_medico INTEGER NOT NULL,
+            dia_semana INTEGER NOT NULL CHECK(dia_semana BETWEEN 0 AND 6),
+            hora_inicio TIME NOT NULL,
+            hora_fin TIME NOT NULL,
+            tipo TEXT,
+            FOREIGN KEY (id_medico) REFERENCES medico(id)
+                ON UPDATE NO ACTION ON DELETE CASCADE
+        );
+        """
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_horario_medico_medico_dia ON horario_medico(id_medico, dia_semana);")
+
+
+# ------------------------------------------------------
+# 2. Médicos guardados en texto plano
+# ------------------------------------------------------
+# Versiones antiguas guardaban rut/correo/telefono de algunos médicos sin cifrar
+CAMPOS_LEGADO_MEDICO = ('rut', 'correo', 'telefono')
+
+def _cifrar_medicos_legado(cursor):
+    """Cifra en un solo lote los campos de médicos que siguen en texto plano.
+    Tras esta migración las lecturas pueden descifrar sin tolerar texto plano.
+    """
+    campos = ", ".join(CAMPOS_LEGADO_MEDICO)
+    hay_texto = " OR ".join(f"typeof({campo}) = 'text'" for campo in CAMPOS_LEGADO_MEDICO)
+    cursor.execute(f"SELECT id, {campos} FROM medico WHERE {hay_texto}")
+    cambios = []
+    for id_fila, *valores in cursor.fetchall():
+        nuevos = [
+            v if v is None or es_cifrado(v) else cifrar_dato(str(v).strip())
+            for v in valores
+        ]
+        if nuevos != valores:
+            cambios.append((*nuevos, id_fila))
+    if cambios:
+        asignaciones = ", ".join(f"{campo} = ?" for campo in CAMPOS_LEGADO_MEDICO)
+        cursor.executemany(f"UPDATE medico SET {asignaciones} WHERE id = ?", cambios)
+        print(f"🔒 Cifrados {len(cambios)} médico(s) que estaban en texto plano.")
+
+
+# ------------------------------------------------------
+# 3. Índices ciegos de paciente y médico
+# ------------------------------------------------------
+# tabla -> columnas cifradas que llevan índice ciego UNIQUE (<columna>_hash)
+INDICES_CIEGOS = {
+    'paciente': ('rut', 'correo'),
+    'medico': ('rut', 'correo', 'telefono'),
+}
+
+def _descifrar_legado(valor):
+    """Descifra un valor que podría haber quedado en texto plano (filas antiguas).
+    Solo se usa durante la migración, nunca en las rutas de lectura habituales.
+    """
+    return descifrar_dato(valor) if es_cifrado(valor) else valor
+
+def _crear_indices_ciegos(cursor):
+    """Agrega las columnas <campo>_hash de INDICES_CIEGOS, rellena las filas
+    que aún no las tienen y crea los índices UNIQUE.
+    """
+    for tabla, campos in INDICES_CIEGOS.items():
+        cursor.execute(f"PRAGMA table_info({tabla})")
+        columnas = {fila[1] for fila in cursor.fetchall()}
+        for campo in campos:
+            if f"{campo}_hash" not in columnas:
+                cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {campo}_hash TEXT")
+
+        # Backfill: se descifra una sola vez cada fila pendiente
+        pendiente = " OR ".join(f"{campo}_hash IS NULL" for campo in campos)
+        cursor.execute(f"SELECT id, {', '.join(campos)} FROM {tabla} WHERE {pendiente}")
+        pendientes = cursor.fetchall()
+        asignaciones = ", ".join(f"{campo}_hash = ?" for campo in campos)
+        cursor.executemany(
+            f"UPDATE {tabla} SET {asignaciones} WHERE id = ?",
+            [
+                (*[indice_ciego(_descifrar_legado(v)) for v in valores], id_fila)
+                for id_fila, *valores in pendientes
+            ]
+        )
+        if pendientes:
+            print(f"🔎 Índices ciegos calculados para {len(pendientes)} registro(s) de {tabla}.")
+
+        for campo in campos:
+            cursor.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{tabla}_{campo}_hash ON {tabla}({campo}_hash);"
+            )
+
+
+# ------------------------------------------------------
+# 4. Índices de claves foráneas y de ordenamiento
+# ------------------------------------------------------
+# nombre -> (tabla, columnas). Cubren los JOIN, los COUNT de eliminar_* y los
+# ORDER BY de los listados.
+INDICES_CLAVES_FORANEAS = {
+    'idx_cita_paciente': ('cita', 'id_paciente'),
+    'idx_cita_medico': ('cita', 'id_medico'),
+    'idx_cita_fecha': ('cita', 'fecha'),
+    'idx_diagnostico_cita': ('diagnostico', 'id_cita'),
+    'idx_diagnostico_fecha': ('diagnostico', 'fecha'),
+    'idx_tratamiento_diagnostico': ('tratamiento', 'id_diagnostico'),
+    'idx_tratamiento_fecha_inicio': ('tratamiento', 'fecha_inicio'),
+    'idx_historial_paciente': ('historial', 'id_paciente'),
+    'idx_historial_diagnostico': ('historial', 'id_diagnostico'),
+    'idx_historial_tratamiento': ('historial', 'id_tratamiento'),
+    'idx_historial_cita': ('historial', 'id_cita'),
+    'idx_historial_fecha_registro': ('historial', 'fecha_registro'),
+    'idx_atencion_diagnostico': ('atencion', 'id_diagnostico'),
+    'idx_atencion_historial': ('atencion', 'id_historial'),
+    'idx_horario_medico_medico_dia_hora': ('horario_medico', 'id_medico, dia_semana, hora_inicio'),
+}
+
+def _crear_indices_claves_foraneas(cursor):
+    for nombre, (tabla, columnas) in INDICES_CLAVES_FORANEAS.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla}({columnas});")
+    # rut está cifrado (aleatorio): este índice nunca sirve y UNIQUE ya crea uno
+    cursor.execute("DROP INDEX IF EXISTS idx_paciente_rut;")
+    # Prefijo del índice de horario con hora_inicio (evita ordenar en B-tree temporal)
+    cursor.execute("DROP INDEX IF EXISTS idx_horario_medico_medico_dia;")
+    cursor.execute("ANALYZE;")
+
+
+# ------------------------------------------------------
+# 5. Búsqueda de texto completo (FTS5)
+# ------------------------------------------------------
+def sentencias_texto_completo(tabla, columnas):
+    """Tabla FTS5 de contenido externo sobre 'tabla' y los triggers que la
+    mantienen sincronizada. unicode61 con remove_diacritics 2 ignora tildes y
+    mayúsculas; prefix='2 3' acelera las búsquedas por prefijo.
+    """
+    fts = f"{tabla}_fts"
+    lista = ", ".join(columnas)
+    nuevos = ", ".join(f"new.{c}" for c in columnas)
+    viejos = ", ".join(f"old.{c}" for c in columnas)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({lista}, content='{tabla}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3');",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabla} BEGIN "
+        f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {nuevos}); END;",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabla} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {viejos}); END;",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {lista} ON {tabla} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.id, {viejos}); "
+        f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {nuevos}); END;",
+    ]
+
+def _crear_busqueda_texto(cursor):
+    for tabla, columnas in TABLAS_TEXTO_COMPLETO.items():
+        for sentencia in sentencias_texto_completo(tabla, columnas):
+            cursor.execute(sentencia)
+        # Indexa las filas existentes (idempotente)
+        cursor.execute(f"INSERT INTO {tabla}_fts({tabla}_fts) VALUES ('rebuild');")
+
+
+# ------------------------------------------------------
+# 6. Columnas normalizadas (sin tildes ni mayúsculas)
+# ------------------------------------------------------
+# Las columnas <campo>_norm las escribe la aplicación en cada INSERT/UPDATE
+# (normalizar_texto); el esquema no depende de funciones SQL propias, así que
+# la base se puede modificar desde cualquier cliente de SQLite.
+def sentencias_normalizadas(tabla, campos):
+    """Índices de las columnas <campo>_norm."""
+    return [
+        f"CREATE INDEX IF NOT EXISTS idx_{tabla}_{campo}_norm ON {tabla}({campo}_norm);"
+        for campo in campos
+    ]
+
+def _rellenar_normalizadas(cursor, tabla, campos):
+    """Recalcula <campo>_norm en Python para todas las filas de la tabla."""
+    cursor.execute(f"SELECT id, {', '.join(campos)} FROM {tabla}")
+    cambios = [
+        (*(normalizar_texto(valor) for valor in valores), id_fila)
+        for id_fila, *valores in cursor.fetchall()
+    ]
+    asignaciones = ", ".join(f"{campo}_norm = ?" for campo in campos)
+    cursor.executemany(f"UPDATE {tabla} SET {asignaciones} WHERE id = ?", cambios)
+
+def _crear_columnas_normalizadas(cursor):
+    for tabla, campos in COLUMNAS_NORMALIZADAS.items():
+        cursor.execute(f"PRAGMA table_info({tabla})")
+        columnas = {fila[1] for fila in cursor.fetchall()}
+        for campo in campos:
+            if f"{campo}_norm" not in columnas:
+                cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {campo}_norm TEXT")
+        for sentencia in sentencias_normalizadas(tabla, campos):
+            cursor.execute(sentencia)
+        _rellenar_normalizadas(cursor, tabla, campos)
+
+
+# ------------------------------------------------------
+# 7. Índices para la paginación por cursor
+# ------------------------------------------------------
+# Los índices secundarios de SQLite incluyen el rowid, así que (fecha, hora)
+# cubre el orden (fecha, hora, id) de pagina_citas; historial ya tiene
+# idx_historial_fecha_registro para (fecha_registro, id).
+def _crear_indices_paginacion(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cita_fecha_hora ON cita(fecha, hora);")
+    # Prefijo del anterior
+    cursor.execute("DROP INDEX IF EXISTS idx_cita_fecha;")
+    cursor.execute("ANALYZE;")
+
+
+# ------------------------------------------------------
+# 8. Columnas _norm sin triggers
+# ------------------------------------------------------
+# Las bases creadas con la migración 6 anterior tienen triggers que llaman a
+# normalizar(), una función que solo registra la aplicación: cualquier otro
+# cliente fallaba al escribir en esas tablas. Se quitan y se recalculan las
+# columnas por si alguna fila quedó sin normalizar.
+def _quitar_triggers_normalizados(cursor):
+    for tabla, campos in COLUMNAS_NORMALIZADAS.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {tabla}_norm_ai;")
+        cursor.execute(f"DROP TRIGGER IF EXISTS {tabla}_norm_au;")
+        _rellenar_normalizadas(cursor, tabla, campos)
+
+
+# ======================================================
+# REGISTRO ORDENADO
+# ======================================================
+MIGRACIONES = [
+    (1, "Tabla horario_medico", _crear_tabla_horario),
+    (2, "Cifrar médicos guardados en texto plano", _cifrar_medicos_legado),
+    (3, "Índices ciegos de paciente y médico", _crear_indices_ciegos),
+    (4, "Índices de claves foráneas y de ordenamiento", _crear_indices_claves_foraneas),
+    (5, "Búsqueda de texto completo (FTS5)", _crear_busqueda_texto),
+    (6, "Columnas normalizadas para búsqueda sin tildes", _crear_columnas_normalizadas),
+    (7, "Índices para la paginación por cursor", _crear_indices_paginacion),
+    (8, "Columnas normalizadas calculadas por la aplicación", _quitar_triggers_normalizados),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+
+class ErrorMigracion(RuntimeError):
+    """Una migración falló: la base quedó en una versión anterior a VERSION_ESQUEMA."""
+
+
+def _crear_esquema_si_vacia(conexion, informar):
+    """Crea el esquema completo desde hospital.sql si la base está vacía.
+    hospital.sql ya deja user_version en VERSION_ESQUEMA.
+    """
+    conexion.execute("BEGIN IMMEDIATE")
+    try:
+        vacia = version_esquema(conexion) == 0 and conexion.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='paciente'"
+        ).fetchone() is None
+        if vacia:
+            if not os.path.exists(SQL_PATH):
+                raise FileNotFoundError(f"No se encontró hospital.sql en: {SQL_PATH}")
+            with open(SQL_PATH, "r", encoding="utf-8") as f:
+                script = f.read()
+            cursor = conexion.cursor()
+            for sentencia in _sentencias_sql(script):
+                cursor.execute(sentencia)
+        conexion.commit()
+    except BaseException:
+        conexion.rollback()
+        raise
+    if vacia:
+        informar(f"✅ Base de datos creada desde hospital.sql (versión {version_esquema(conexion)}).")
+
+
+def aplicar_migraciones(conexion, informar=print):
+    """
+    Lleva la base a VERSION_ESQUEMA. Si ya está al día solo cuesta leer
+    PRAGMA user_version.
+
+    Cada migración pendiente corre en su propia transacción IMMEDIATE y vuelve
+    a leer la versión dentro de ella, por lo que varios procesos pueden
+    arrancar a la vez sin aplicarla dos veces. Si una migración falla se
+    revierte y se lanza ErrorMigracion: la aplicación no debe trabajar con un
+    esquema atrasado (el pool vuelve a intentarlo con la siguiente conexión).
+
+    Args:
+        conexion: sqlite3.Connection sin transacción abierta
+        informar: Función que recibe los mensajes de progreso
+
+    Returns:
+        list: Números de las migraciones aplicadas
+
+    Raises:
+        ErrorMigracion: Si alguna migración falla (las anteriores quedan aplicadas)
+    """
+    if version_esquema(conexion) >= VERSION_ESQUEMA:
+        return []
+
+    _crear_esquema_si_vacia(conexion, informar)
+
+    aplicadas = []
+    for numero, descripcion, migrar in MIGRACIONES:
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            if version_esquema(conexion) >= numero:
+                conexion.rollback()
+                continue
+            migrar(conexion.cursor())
+            conexion.execute(f"PRAGMA user_version = {int(numero)}")
+            conexion.commit()
+        except Exception as e:
+            conexion.rollback()
+            raise ErrorMigracion(
+                f"No se pudo aplicar la migración {numero} ({descripcion}): {e}. "
+                f"La base sigue en la versión {version_esquema(conexion)} de {VERSION_ESQUEMA}."
+            ) from e
+        aplicadas.append(numero)
+        informar(f"🛠️ Migración {numero} aplicada: {descripcion}")
+    return aplicadas
@@ -1,25 +1,59 @@
-import re
-from datetime import date
-from .db import conectar, existe_tabla_id, cifrar_dato, descifrar_dato
+import sqlite3
+from .db import abrir_conexion, existe_tabla_id, cifrar_dato, indice_ciego, seleccionar_columnas
+from .db import LECTURA_TAMANO_BLOQUE
 from .utilidades import (
     formatear_rut,
+    normalizar_texto,
     validar_rut,
     validar_email,
     validar_telefono,
     es_menor_de_edad
 )
-from .busqueda import buscar_registros_exactos
+from .busqueda import buscar_registros, buscar_pagina, iterar_bloques
+from .registro import RegistroCifrado, iterar_descifrados
 
+# Campos cifrados de paciente (los de emergencia pueden venir en NULL)
+CAMPOS_CIFRADOS_PACIENTE = (
+    "rut", "fecha_nacimiento", "correo", "telefono", "direccion",
+    "nombre_emergencia", "apellido_emergencia", "telefono_emergencia"
+)
 
-def agregar_paciente(rut, nombre, apellido, fecha_nacimiento, correo, telefono, 
-                     genero, direccion, sistema_salud, nacionalidad,
-                     nombre_emergencia=None, apellido_emergencia=None, telefono_emergencia=None):
+# Los campos cifrados van primero, en el orden de CAMPOS_CIFRADOS_PACIENTE
+SQL_INSERTAR_PACIENTE = """INSERT INTO paciente
+                           (rut, fecha_nacimiento, correo, telefono, direccion,
+                            nombre_emergencia, apellido_emergencia, telefono_emergencia,
+                            nombre, apellido, genero, sistema_salud, nacionalidad, rut_hash, correo_hash,
+                            nombre_norm, apellido_norm)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+
+def fila_paciente(datos, cifrados):
     """
-    Inserta un nuevo paciente en la base de datos con cifrado Fernet.
-    Valida RUT, correo, teléfono, etc. y evita duplicados.
-    Si el paciente es menor de 18 años, los campos de emergencia son obligatorios.
+    Parámetros de SQL_INSERTAR_PACIENTE (y del UPDATE de actualizar_paciente,
+    que usa el mismo orden de columnas).
+
+    Args:
+        datos: Resultado de validar_datos_paciente
+        cifrados: Valores de CAMPOS_CIFRADOS_PACIENTE ya cifrados, en ese orden
     """
+    return (
+        *cifrados, datos["nombre"], datos["apellido"], datos["genero"], datos["sistema_salud"],
+        datos["nacionalidad"], indice_ciego(datos["rut"]), indice_ciego(datos["correo"]),
+        normalizar_texto(datos["nombre"]), normalizar_texto(datos["apellido"])
+    )
 
+
+def validar_datos_paciente(rut, nombre, apellido, fecha_nacimiento, correo, telefono,
+                           genero, direccion, sistema_salud, nacionalidad,
+                           nombre_emergencia=None, apellido_emergencia=None, telefono_emergencia=None):
+    """
+    Normaliza y valida los datos de un paciente (reglas de agregar_paciente,
+    actualizar_paciente y la importación masiva). No consulta la base de datos.
+
+    Returns:
+        tuple: (True, dict con los campos normalizados y el RUT formateado)
+            o (False, mensaje de error)
+    """
     # Normalización básica
     rut = rut.strip().upper() if rut else ""
     nombre = nombre.strip().title() if nombre else ""
@@ -43,7 +77,10 @@ def agregar_paciente(rut, nombre, apellido, fecha_nacimiento, correo, telefono,
     if not nacionalidad:
         return False, "La nacionalidad es obligatoria."
 
-    rut_formateado = formatear_rut(rut)
+    try:
+        rut_formateado = formatear_rut(rut)
+    except ValueError:
+        return False, "RUT inválido o vacío."
 
     if not rut_formateado or not validar_rut(rut_formateado):
         return False, "RUT inválido o vacío."
@@ -71,105 +108,147 @@ def agregar_paciente(rut, nombre, apellido, fecha_nacimiento, correo, telefono,
         if not telefono_emergencia or not validar_telefono(telefono_emergencia):
             return False, "El teléfono de emergencia es obligatorio y debe tener formato válido para menores de 18 años."
 
-    # Verificar duplicados
+    return True, {
+        "rut": rut_formateado,
+        "nombre": nombre,
+        "apellido": apellido,
+        "fecha_nacimiento": fecha_nacimiento,
+        "correo": correo,
+        "telefono": telefono,
+        "genero": genero,
+        "direccion": direccion,
+        "sistema_salud": sistema_salud,
+        "nacionalidad": nacionalidad,
+        "nombre_emergencia": nombre_emergencia,
+        "apellido_emergencia": apellido_emergencia,
+        "telefono_emergencia": telefono_emergencia,
+    }
+
+
+def agregar_paciente(rut, nombre, apellido, fecha_nacimiento, correo, telefono, 
+                     genero, direccion, sistema_salud, nacionalidad,
+                     nombre_emergencia=None, apellido_emergencia=None, telefono_emergencia=None):
+    """
+    Inserta un nuevo paciente en la base de datos con sus datos sensibles cifrados.
+    Valida RUT, correo, teléfono, etc. y evita duplicados.
+    Si el paciente es menor de 18 años, los campos de emergencia son obligatorios.
+    """
+
+    ok, datos = validar_datos_paciente(
+        rut, nombre, apellido, fecha_nacimiento, correo, telefono,
+        genero, direccion, sistema_salud, nacionalidad,
+        nombre_emergencia, apellido_emergencia, telefono_emergencia
+    )
+    if not ok:
+        return False, datos
+
+    # Verificar duplicados mediante los índices ciegos (búsqueda indexada)
     try:
-        conexion, cursor = conectar()
-        cursor.execute("SELECT id, rut, correo FROM paciente")
-        filas = cursor.fetchall()
-        conexion.close()
+        with abrir_conexion() as (conexion, cursor):
+            cursor.execute(
+                "SELECT 1 FROM paciente WHERE rut_hash = ? OR correo_hash = ? LIMIT 1",
+                (indice_ciego(datos["rut"]), indice_ciego(datos["correo"]))
+            )
+            duplicado = cursor.fetchone() is not None
 
-        for id_existente, rut_cifrado, correo_cifrado in filas:
-            if descifrar_dato(rut_cifrado) == rut_formateado or descifrar_dato(correo_cifrado) == correo:
-                return False, "Ya existe un paciente con ese RUT o correo."
+        if duplicado:
+            return False, "Ya existe un paciente con ese RUT o correo."
 
     except Exception as e:
-        try:
-            conexion.close()
-        except Exception as cerrar_error:
-            print(f"No se pudo cerrar la conexión: {cerrar_error}")
         return False, f"Error al verificar duplicados: {e}"
 
-    # Cifrar campos de emergencia si existen
-    nombre_emergencia_cifrado = cifrar_dato(nombre_emergencia) if nombre_emergencia else None
-    apellido_emergencia_cifrado = cifrar_dato(apellido_emergencia) if apellido_emergencia else None
-    telefono_emergencia_cifrado = cifrar_dato(telefono_emergencia) if telefono_emergencia else None
-
-    # Insertar paciente
+    # Insertar paciente (los campos de emergencia vacíos quedan en NULL)
+    cifrados = [cifrar_dato(datos[campo]) if datos[campo] else None for campo in CAMPOS_CIFRADOS_PACIENTE]
     try:
-        conexion, cursor = conectar()
-        cursor.execute(
-            """
-            INSERT INTO paciente
-            (rut, nombre, apellido, fecha_nacimiento, correo, telefono, genero, direccion, 
-             sistema_salud, nacionalidad, nombre_emergencia, apellido_emergencia, telefono_emergencia)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                cifrar_dato(rut_formateado),
-                nombre,
-                apellido,
-                cifrar_dato(fecha_nacimiento),
-                cifrar_dato(correo),
-                cifrar_dato(telefono),
-                genero,
-                cifrar_dato(direccion),
-                sistema_salud,
-                nacionalidad,
-                nombre_emergencia_cifrado,
-                apellido_emergencia_cifrado,
-                telefono_emergencia_cifrado
-            )
-        )
-        conexion.commit()
-        id_insertado = cursor.lastrowid
-        conexion.close()
+        with abrir_conexion() as (conexion, cursor):
+            cursor.execute(SQL_INSERTAR_PACIENTE, fila_paciente(datos, cifrados))
+            conexion.commit()
+            id_insertado = cursor.lastrowid
         return True, f"Paciente agregado correctamente con ID {id_insertado}."
+    except sqlite3.IntegrityError:
+        return False, "Ya existe un paciente con ese RUT o correo."
     except Exception as e:
-        try:
-            conexion.close()
-        except Exception as cerrar_error:
-            print(f"No se pudo cerrar la conexión: {cerrar_error}")
         return False, f"Error al agregar paciente: {e}"
 
 
-def mostrar_pacientes():
+def mostrar_pacientes(columnas=None):
     """
-    Devuelve todos los pacientes descifrando RUT, correo, teléfono, dirección y campos de emergencia.
+    Devuelve todos los pacientes como RegistroCifrado: RUT, correo, teléfono,
+    dirección y campos de emergencia se descifran solo al leerlos.
+    Para mostrar la tabla completa conviene usar registro.a_diccionarios(),
+    que descifra todo en lote.
+
+    Args:
+        columnas: Lista de columnas a traer (None = todas), validada contra
+            la whitelist de 'paciente'. Ej: ["id", "nombre", "apellido"]
     """
+    nombres, select = seleccionar_columnas("paciente", columnas)
+    cifrados = [campo for campo in CAMPOS_CIFRADOS_PACIENTE if campo in nombres]
     try:
-        conexion, cursor = conectar()
-        cursor.execute("SELECT * FROM paciente")
-        filas = cursor.fetchall()
-        columnas = [desc[0] for desc in cursor.description]
-        conexion.close()
-
-        resultado = []
-        for fila in filas:
-            registro = dict(zip(columnas, fila))
-            # Descifrar campos sensibles
-            registro["rut"] = descifrar_dato(registro["rut"])
-            registro["fecha_nacimiento"] = descifrar_dato(registro["fecha_nacimiento"])
-            registro["correo"] = descifrar_dato(registro["correo"])
-            registro["telefono"] = descifrar_dato(registro["telefono"])
-            registro["direccion"] = descifrar_dato(registro["direccion"])
-            
-            # Descifrar campos de emergencia si existen
-            if registro.get("nombre_emergencia"):
-                registro["nombre_emergencia"] = descifrar_dato(registro["nombre_emergencia"])
-            if registro.get("apellido_emergencia"):
-                registro["apellido_emergencia"] = descifrar_dato(registro["apellido_emergencia"])
-            if registro.get("telefono_emergencia"):
-                registro["telefono_emergencia"] = descifrar_dato(registro["telefono_emergencia"])
-            
-            resultado.append(registro)
-
-        return resultado
+        with abrir_conexion() as (conexion, cursor):
+            cursor.execute(f"SELECT {select} FROM paciente")
+            filas = cursor.fetchall()
+
+        return [RegistroCifrado(zip(nombres, fila), cifrados) for fila in filas]
 
     except Exception as e:
-        try:
-            conexion.close()
-        except Exception as cerrar_error:
-            print(f"No se pudo cerrar la conexión: {cerrar_error}")
+        return []
+
+
+def pagina_pacientes(tamano, despues_de=None, columnas=None, **opciones):
+    """
+    Una página de pacientes ordenados por id, con paginación por cursor.
+    Los campos cifrados se descifran al leerlos (RegistroCifrado), así que el
+    costo depende del tamaño de página y no del total de pacientes.
+
+    Args:
+        tamano: Pacientes por página
+        despues_de: Cursor devuelto por la página anterior (None = primera página)
+        columnas: Columnas a traer (None = todas)
+        **opciones: filtros, prefijo, en... como en buscar_registros
+            (solo sobre columnas no cifradas)
+
+    Returns:
+        tuple: (lista de RegistroCifrado, cursor de la página siguiente o None)
+    """
+    filas, siguiente = buscar_pagina("paciente", tamano, despues_de, columnas=columnas, **opciones)
+    return [RegistroCifrado(fila, CAMPOS_CIFRADOS_PACIENTE) for fila in filas], siguiente
+
+
+def buscar_pacientes(columnas=None, **opciones):
+    """
+    Todos los pacientes que cumplen 'opciones' (filtros, prefijo, en... como en
+    buscar_registros, solo sobre columnas no cifradas), como RegistroCifrado.
+    """
+    filas = buscar_registros("paciente", columnas=columnas, **opciones)
+    return [RegistroCifrado(fila, CAMPOS_CIFRADOS_PACIENTE) for fila in filas]
+
+
+def iterar_pacientes(columnas=None, descifrar=True, tamano_bloque=LECTURA_TAMANO_BLOQUE, **opciones):
+    """
+    Generador sobre todos los pacientes (ordenados por id) con memoria
+    constante: lee con fetchmany y descifra cada bloque en lote.
+
+    Args:
+        columnas: Columnas a traer (None = todas)
+        descifrar: True entrega dicts descifrados; False, RegistroCifrado
+        tamano_bloque: Filas por fetchmany (y por llamada a descifrar_lote)
+        **opciones: filtros, prefijo, en... como en buscar_registros
+    """
+    cifrados = [campo for campo in CAMPOS_CIFRADOS_PACIENTE if columnas is None or campo in columnas]
+    bloques = iterar_bloques("paciente", tamano_bloque, columnas=columnas, **opciones)
+    return iterar_descifrados(bloques, cifrados, descifrar)
+
+
+def nacionalidades_pacientes():
+    """Nacionalidades distintas registradas (para los filtros de la interfaz)."""
+    try:
+        with abrir_conexion() as (conexion, cursor):
+            cursor.execute(
+                "SELECT DISTINCT nacionalidad FROM paciente WHERE nacionalidad IS NOT NULL ORDER BY nacionalidad"
+            )
+            return [fila[0] for fila in cursor.fetchall()]
+    except Exception as e:
         return []
 
 
@@ -184,16 +263,13 @@ def eliminar_paciente(id_val):
         return False, "No existe paciente con ese ID."
 
     try:
-        conexion, cursor = conectar()
-        cursor.execute("DELETE FROM paciente WHERE id = ?", (id_val,))
-        conexion.commit()
-        conexion.close()
+        with abrir_conexion() as (conexion, cursor):
+            cursor.execute("DELETE FROM paciente WHERE id = ?", (id_val,))
+            conexion.commit()
         return True, "Paciente eliminado correctamente."
+    except sqlite3.IntegrityError:
+        return False, "No se puede eliminar: el paciente tiene citas o historiales asociados."
     except Exception as e:
-        try:
-            conexion.close()
-        except Exception as cerrar_error:
-            print(f"No se pudo cerrar la conexión: {cerrar_error}")
         return False, f"Error al eliminar paciente: {e}"
 
 
@@ -210,121 +286,76 @@ def actualizar_paciente(
     if not existe_tabla_id("paciente", id_val):
         return False, "No existe paciente con ese ID."
 
-    # Normalizar
-    rut = rut.strip().upper() if rut else ""
-    nombre = nombre.strip().title() if nombre else ""
-    apellido = apellido.strip().title() if apellido else ""
-    correo = correo.strip() if correo else ""
-    telefono = telefono.strip() if telefono else ""
-    genero = genero.strip().capitalize() if genero else ""
-    direccion = direccion.strip() if direccion else ""
-    sistema_salud = sistema_salud.strip() if sistema_salud else ""
-    nacionalidad = nacionalidad.strip().title() if nacionalidad else ""
-
-    # Normalizar campos de emergencia
-    nombre_emergencia = nombre_emergencia.strip().title() if nombre_emergencia else None
-    apellido_emergencia = apellido_emergencia.strip().title() if apellido_emergencia else None
-    telefono_emergencia = telefono_emergencia.strip() if telefono_emergencia else None
-
-    if sistema_salud not in ("Isapre", "Fonasa"):
-        return False, "El sistema de salud debe ser 'Isapre' o 'Fonasa'."
-
-    if not nacionalidad:
-        return False, "La nacionalidad es obligatoria."
+    ok, datos = validar_datos_paciente(
+        rut, nombre, apellido, fecha_nacimiento, correo, telefono,
+        genero, direccion, sistema_salud, nacionalidad,
+        nombre_emergencia, apellido_emergencia, telefono_emergencia
+    )
+    if not ok:
+        return False, datos
 
-    rut_formateado = formatear_rut(rut)
-
-    if not rut_formateado or not validar_rut(rut_formateado):
-        return False, "RUT inválido o vacío."
-    if not nombre:
-        return False, "El nombre es obligatorio."
-    if not apellido:
-        return False, "El apellido es obligatorio."
-    if not fecha_nacimiento:
-        return False, "La fecha de nacimiento es obligatoria."
-    if not correo or not validar_email(correo):
-        return False, "El correo es obligatorio o no tiene formato válido."
-    if not telefono or not validar_telefono(telefono):
-        return False, "El teléfono es obligatorio o no tiene formato válido."
-    if genero not in ("Masculino", "Femenino"):
-        return False, "El género debe ser 'Masculino' o 'Femenino'."
-    if not direccion:
-        return False, "La dirección es obligatoria."
-
-    # Validar campos de emergencia para menores de edad
-    if es_menor_de_edad(fecha_nacimiento):
-        if not nombre_emergencia:
-            return False, "El nombre de contacto de emergencia es obligatorio para menores de 18 años."
-        if not apellido_emergencia:
-            return False, "El apellido de contacto de emergencia es obligatorio para menores de 18 años."
-        if not telefono_emergencia or not validar_telefono(telefono_emergencia):
-            return False, "El teléfono de emergencia es obligatorio y debe tener formato válido para menores de 18 años."
-
-    # Verificar conflicto con otros pacientes
+    # Verificar conflicto con otros pacientes mediante los índices ciegos
     try:
-        conexion, cursor = conectar()
-        cursor.execute("SELECT id, rut, correo FROM paciente")
-        filas = cursor.fetchall()
-        conexion.close()
-
-        for id_existente, rut_cifrado, correo_cifrado in filas:
-            if id_existente != id_val:
-                if descifrar_dato(rut_cifrado) == rut_formateado or descifrar_dato(correo_cifrado) == correo:
-                    return False, "Ya existe otro paciente con ese RUT o correo."
+        with abrir_conexion() as (conexion, cursor):
+            cursor.execute(
+                "SELECT 1 FROM paciente WHERE (rut_hash = ? OR correo_hash = ?) AND id <> ? LIMIT 1",
+                (indice_ciego(datos["rut"]), indice_ciego(datos["correo"]), id_val)
+            )
+            duplicado = cursor.fetchone() is not None
+
+        if duplicado:
+            return False, "Ya existe otro paciente con ese RUT o correo."
     except Exception as e:
-        try:
-            conexion.close()
-        except Exception as cerrar_error:
-            print(f"No se pudo cerrar la conexión: {cerrar_error}")
         return False, f"Error al verificar duplicados antes de actualizar: {e}"
 
-    # Cifrar campos de emergencia si existen
-    nombre_emergencia_cifrado = cifrar_dato(nombre_emergencia) if nombre_emergencia else None
-    apellido_emergencia_cifrado = cifrar_dato(apellido_emergencia) if apellido_emergencia else None
-    telefono_emergencia_cifrado = cifrar_dato(telefono_emergencia) if telefono_emergencia else None
-
-    # Actualizar paciente
+    # Actualizar paciente (los campos de emergencia vacíos quedan en NULL)
+    cifrados = [cifrar_dato(datos[campo]) if datos[campo] else None for campo in CAMPOS_CIFRADOS_PACIENTE]
     try:
-        conexion, cursor = conectar()
-        cursor.execute(
-            """
-            UPDATE paciente
-            SET rut = ?, nombre = ?, apellido = ?, fecha_nacimiento = ?,
-                correo = ?, telefono = ?, genero = ?, direccion = ?, sistema_salud = ?,
-                nacionalidad = ?, nombre_emergencia = ?, apellido_emergencia = ?, telefono_emergencia = ?
-            WHERE id = ?
-            """,
-            (
-                cifrar_dato(rut_formateado),
-                nombre,
-                apellido,
-                cifrar_dato(str(fecha_nacimiento)),
-                cifrar_dato(correo),
-                cifrar_dato(telefono),
-                genero,
-                cifrar_dato(direccion),
-                sistema_salud,
-                nacionalidad,
-                nombre_emergencia_cifrado,
-                apellido_emergencia_cifrado,
-                telefono_emergencia_cifrado,
-                id_val
+        with abrir_conexion() as (conexion, cursor):
+            cursor.execute(
+                """
+                UPDATE paciente
+                SET rut = ?, fecha_nacimiento = ?, correo = ?, telefono = ?, direccion = ?,
+                    nombre_emergencia = ?, apellido_emergencia = ?, telefono_emergencia = ?,
+                    nombre = ?, apellido = ?, genero = ?, sistema_salud = ?, nacionalidad = ?,
+                    rut_hash = ?, correo_hash = ?, nombre_norm = ?, apellido_norm = ?
+                WHERE id = ?
+                """,
+                (*fila_paciente(datos, cifrados), id_val)
             )
-        )
-        conexion.commit()
-        conexion.close()
+            conexion.commit()
         return True, "Paciente actualizado correctamente."
+    except sqlite3.IntegrityError:
+        return False, "Ya existe otro paciente con ese RUT o correo."
     except Exception as e:
-        try:
-            conexion.close()
-        except Exception as cerrar_error:
-            print(f"No se pudo cerrar la conexión: {cerrar_error}")
         return False, f"Error al actualizar paciente: {e}"
 
 
+def id_paciente_por_rut(rut):
+    """
+    ID del paciente con ese RUT, o None si no existe o el RUT no es válido.
+
+    El RUT está cifrado con nonce aleatorio, así que no se compara el texto:
+    se busca su índice ciego en rut_hash (índice UNIQUE), una sola fila.
+    """
+    if not rut or not rut.strip():
+        return None
+    try:
+        rut_form = formatear_rut(rut.strip().upper())
+    except ValueError:
+        return None
+    if not validar_rut(rut_form):
+        return None
+
+    with abrir_conexion() as (conexion, cursor):
+        cursor.execute("SELECT id FROM paciente WHERE rut_hash = ?", (indice_ciego(rut_form),))
+        fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
 def eliminar_paciente_por_rut(rut):
     """
-    Elimina un paciente buscando por RUT cifrado.
+    Elimina un paciente buscando por el índice ciego del RUT.
     """
     if not rut:
         return False, "Debe proporcionar un RUT."
@@ -336,19 +367,10 @@ def eliminar_paciente_por_rut(rut):
         return False, "RUT inválido."
 
     try:
-        conexion, cursor = conectar()
-        cursor.execute("SELECT id, rut FROM paciente")
-        filas = cursor.fetchall()
-        conexion.close()
-
-        for id_encontrado, rut_cifrado in filas:
-            if descifrar_dato(rut_cifrado) == rut_form:
-                return eliminar_paciente(id_encontrado)
+        id_paciente = id_paciente_por_rut(rut_form)
+        if id_paciente is not None:
+            return eliminar_paciente(id_paciente)
 
         return False, "No existe paciente con ese RUT."
     except Exception as e:
-        try:
-            conexion.close()
-        except Exception as cerrar_error:
-            print(f"No se pudo cerrar la conexión: {cerrar_error}")
         return False, f"Error al buscar paciente por RUT: {e}"
\ No newline at end of file
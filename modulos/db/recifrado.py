@@ -0,0 +1,232 @@
+import os
+import json
+import threading
+import time
+from cryptography.fernet import Fernet
+from . import db
+from .db import BASE_PATH, abrir_conexion, cifrar_dato, descifrar_lote, requiere_recifrado
+from .db import guardar_claves, recargar_clave, LARGO_CABECERA, PREFIJO_FERNET
+from .paciente import CAMPOS_CIFRADOS_PACIENTE
+from .medico import CAMPOS_CIFRADOS_MEDICO
+
+# ======================================================
+# RECIFRADO A LA CLAVE ACTIVA Y AL FORMATO VERSIONADO
+# ======================================================
+# tabla -> columnas cifradas que se reescriben con la clave activa
+TABLAS_RECIFRADO = {
+    'paciente': CAMPOS_CIFRADOS_PACIENTE,
+    'medico': CAMPOS_CIFRADOS_MEDICO,
+}
+
+TAMANO_LOTE_RECIFRADO = 500
+CHECKPOINT_ROTACION = os.path.join(BASE_PATH, "rotacion_clave.json")
+
+
+def _condicion_pendiente(campos):
+    """SQL que selecciona filas con algún token Fernet o BLOB de otra clave."""
+    return " OR ".join(
+        f"(typeof({campo}) = 'text' AND substr({campo}, 1, {len(PREFIJO_FERNET)}) = '{PREFIJO_FERNET}')"
+        f" OR (typeof({campo}) = 'blob' AND substr({campo}, 2, {LARGO_CABECERA - 1}) <> ?)"
+        for campo in campos
+    )
+
+
+def recifrar_tabla(tabla, tamano_lote=TAMANO_LOTE_RECIFRADO, pausa=0.0, detener=None,
+                   desde_id=0, al_terminar_lote=None):
+    """
+    Recorre la tabla por rangos de id y reescribe con la clave activa y en el
+    formato versionado los campos que aún guardan tokens Fernet o BLOBs de una
+    clave anterior. Cada lote es una transacción corta; la actualización solo
+    se aplica si la fila no cambió desde que se leyó, por lo que puede convivir
+    con la aplicación en uso.
+
+    Args:
+        tabla: 'paciente' o 'medico'
+        tamano_lote: Filas leídas por lote
+        pausa: Segundos de espera entre lotes (para no acaparar la base)
+        detener: threading.Event opcional para cancelar entre lotes
+        desde_id: Reanuda después de este id (checkpoint)
+        al_terminar_lote: Callback opcional (ultimo_id, resumen) tras cada commit
+
+    Returns:
+        dict: {'recifrados': int, 'conflictos': int, 'ultimo_id': int}
+    """
+    if tabla not in TABLAS_RECIFRADO:
+        raise ValueError(f"Tabla sin campos cifrados: {tabla}")
+    campos = TABLAS_RECIFRADO[tabla]
+    lista = ", ".join(campos)
+    pendiente = _condicion_pendiente(campos)
+    asignaciones = ", ".join(f"{campo} = ?" for campo in campos)
+    sin_cambios = " AND ".join(f"{campo} IS ?" for campo in campos)
+
+    resumen = {'recifrados': 0, 'conflictos': 0, 'ultimo_id': desde_id}
+    while detener is None or not detener.is_set():
+        id_activa = db.llavero.id_activa
+        with abrir_conexion() as (conexion, cursor):
+            cursor.execute(
+                f"SELECT id, {lista} FROM {tabla} WHERE id > ? AND ({pendiente}) ORDER BY id LIMIT ?",
+                (resumen['ultimo_id'], *([id_activa] * len(campos)), tamano_lote)
+            )
+            filas = cursor.fetchall()
+            if not filas:
+                break
+
+            viejos = [v for fila in filas for v in fila[1:] if requiere_recifrado(v, id_activa)]
+            planos = iter(descifrar_lote(viejos))
+
+            for id_fila, *valores in filas:
+                nuevos = [
+                    cifrar_dato(next(planos)) if requiere_recifrado(valor, id_activa) else valor
+                    for valor in valores
+                ]
+                cursor.execute(
+                    f"UPDATE {tabla} SET {asignaciones} WHERE id = ? AND {sin_cambios}",
+                    (*nuevos, id_fila, *valores)
+                )
+                if cursor.rowcount:
+                    resumen['recifrados'] += 1
+                else:
+                    resumen['conflictos'] += 1
+            conexion.commit()
+        resumen['ultimo_id'] = filas[-1][0]
+        if al_terminar_lote is not None:
+            al_terminar_lote(resumen['ultimo_id'], resumen)
+        if pausa:
+            time.sleep(pausa)
+    return resumen
+
+
+def recifrar_todo(tamano_lote=TAMANO_LOTE_RECIFRADO, pausa=0.0, detener=None):
+    """Recifra todas las tablas de TABLAS_RECIFRADO. Retorna {tabla: resumen}."""
+    return {
+        tabla: recifrar_tabla(tabla, tamano_lote, pausa, detener)
+        for tabla in TABLAS_RECIFRADO
+    }
+
+
+def iniciar_recifrado_en_segundo_plano(tamano_lote=TAMANO_LOTE_RECIFRADO, pausa=0.05):
+    """
+    Lanza recifrar_todo en un hilo daemon.
+
+    Returns:
+        tuple: (hilo, evento) — evento.set() detiene el trabajo al terminar el lote actual
+    """
+    detener = threading.Event()
+
+    def _trabajo():
+        try:
+            resumen = recifrar_todo(tamano_lote, pausa, detener)
+            print(f"🔁 Recifrado finalizado: {resumen}")
+        except Exception as e:
+            print(f"[WARN] Recifrado interrumpido: {e}")
+
+    hilo = threading.Thread(target=_trabajo, name="recifrado", daemon=True)
+    hilo.start()
+    return hilo, detener
+
+
+# ======================================================
+# ROTACIÓN DE CLAVE (por lotes y reanudable)
+# ======================================================
+def _leer_checkpoint(ruta):
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _guardar_checkpoint(ruta, checkpoint):
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(temporal, ruta)
+
+
+def contar_pendientes_rotacion():
+    """Cuenta, por tabla, las filas que aún usan un token Fernet o una clave no activa."""
+    conteo = {}
+    id_activa = db.llavero.id_activa
+    with abrir_conexion() as (_, cursor):
+        for tabla, campos in TABLAS_RECIFRADO.items():
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {tabla} WHERE {_condicion_pendiente(campos)}",
+                [id_activa] * len(campos)
+            )
+            conteo[tabla] = cursor.fetchone()[0]
+    return conteo
+
+
+def rotar_clave(tamano_lote=TAMANO_LOTE_RECIFRADO, pausa=0.0, retirar_antiguas=False,
+                ruta_checkpoint=CHECKPOINT_ROTACION, informar=print):
+    """
+    Rota la clave de cifrado sin detener la aplicación.
+
+    1. Genera una clave nueva y la deja primera (activa) en 'clave.key',
+       conservando las anteriores para poder descifrar mientras dura la rotación.
+       Las demás instancias la detectan por el mtime del archivo.
+    2. Recifra 'paciente' y 'medico' por lotes con transacciones cortas,
+       guardando un checkpoint JSON tras cada lote. Si el proceso se interrumpe,
+       volver a llamar a rotar_clave reanuda desde el checkpoint.
+    3. Si se pide, retira del llavero las claves antiguas una vez verificado
+       que ninguna fila las usa.
+
+    Returns:
+        dict: {tabla: resumen} más 'pendientes' con el conteo final
+    """
+    checkpoint = _leer_checkpoint(ruta_checkpoint)
+    if checkpoint is None:
+        guardar_claves([Fernet.generate_key(), *db.llavero.claves])
+        recargar_clave()
+        checkpoint = {'id_clave': db.llavero.id_activa.hex(), 'tablas': {}}
+        _guardar_checkpoint(ruta_checkpoint, checkpoint)
+        informar(f"🔑 Nueva clave activa {checkpoint['id_clave']} ({len(db.llavero.claves)} en el llavero).")
+    else:
+        recargar_clave()
+        if checkpoint['id_clave'] != db.llavero.id_activa.hex():
+            raise ValueError(
+                "El checkpoint de rotación no corresponde a la clave activa de 'clave.key'."
+            )
+        informar(f"↪️ Reanudando rotación de la clave {checkpoint['id_clave']}.")
+
+    resultados = {}
+    for tabla in TABLAS_RECIFRADO:
+        estado = checkpoint['tablas'].setdefault(tabla, {'ultimo_id': 0, 'recifrados': 0, 'completa': False})
+        if estado['completa']:
+            continue
+        inicio = time.perf_counter()
+        base = estado['recifrados']
+
+        def _al_terminar_lote(ultimo_id, resumen, estado=estado, base=base, inicio=inicio, tabla=tabla):
+            estado['ultimo_id'] = ultimo_id
+            estado['recifrados'] = base + resumen['recifrados']
+            _guardar_checkpoint(ruta_checkpoint, checkpoint)
+            segundos = max(time.perf_counter() - inicio, 1e-9)
+            informar(
+                f"   {tabla}: hasta id {ultimo_id}, {estado['recifrados']} fila(s) "
+                f"({resumen['recifrados'] / segundos:.0f} filas/s)"
+            )
+
+        resultados[tabla] = recifrar_tabla(
+            tabla, tamano_lote, pausa,
+            desde_id=estado['ultimo_id'],
+            al_terminar_lote=_al_terminar_lote
+        )
+        estado['completa'] = True
+        _guardar_checkpoint(ruta_checkpoint, checkpoint)
+
+    # Segunda pasada corta: filas escritas con la clave anterior por instancias
+    # que aún no habían detectado la rotación
+    for tabla in TABLAS_RECIFRADO:
+        recifrar_tabla(tabla, tamano_lote, pausa)
+
+    pendientes = contar_pendientes_rotacion()
+    resultados['pendientes'] = pendientes
+    if retirar_antiguas:
+        if any(pendientes.values()):
+            informar(f"[WARN] Quedan filas con claves antiguas {pendientes}; no se retiran.")
+        elif len(db.llavero.claves) > 1:
+            guardar_claves(db.llavero.claves[:1])
+            recargar_clave()
+            informar("🗑️ Claves antiguas retiradas de 'clave.key'.")
+    os.remove(ruta_checkpoint)
+    return resultados
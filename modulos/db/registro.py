@@ -0,0 +1,94 @@
+from collections.abc import Mapping
+from .db import descifrar_dato, descifrar_lote, es_cifrado
+
+
+class RegistroCifrado(Mapping):
+    """
+    Fila de solo lectura que descifra cada campo sensible la primera vez que se
+    lee y luego recuerda el valor. Se comporta como un diccionario (p['nombre'],
+    p.get(...), dict(p), pd.DataFrame(lista)), por lo que quien solo lee campos
+    no cifrados (id, nombre, apellido) no paga ningún descifrado.
+    """
+
+    __slots__ = ("_datos", "_pendientes", "_tolerar_texto_plano")
+
+    def __init__(self, datos, campos_cifrados, tolerar_texto_plano=False):
+        self._datos = dict(datos)
+        self._pendientes = {c for c in campos_cifrados if self._datos.get(c) is not None}
+        self._tolerar_texto_plano = tolerar_texto_plano
+
+    def __getitem__(self, campo):
+        if campo in self._pendientes:
+            valor = self._datos[campo]
+            if not self._tolerar_texto_plano or es_cifrado(valor):
+                self._datos[campo] = descifrar_dato(valor)
+            self._pendientes.discard(campo)
+        return self._datos[campo]
+
+    def __iter__(self):
+        return iter(self._datos)
+
+    def __len__(self):
+        return len(self._datos)
+
+    def __repr__(self):
+        pendientes = ", ".join(sorted(self._pendientes))
+        return f"RegistroCifrado(id={self._datos.get('id')!r}, pendientes=[{pendientes}])"
+
+    def a_dict(self):
+        """Devuelve un dict con todos los campos ya descifrados."""
+        return {campo: self[campo] for campo in self._datos}
+
+
+def precargar(registros, campos=None):
+    """
+    Descifra en una sola llamada a descifrar_lote los campos pendientes de muchos
+    registros. Útil antes de construir una tabla que mostrará todos los campos.
+
+    Args:
+        registros: Lista de RegistroCifrado
+        campos: Campos a precargar (None = todos los pendientes)
+    """
+    objetivos = []
+    for registro in registros:
+        for campo in registro._pendientes:
+            if campos is None or campo in campos:
+                objetivos.append((registro, campo))
+    if not objetivos:
+        return registros
+
+    tolerar = any(registro._tolerar_texto_plano for registro, _ in objetivos)
+    descifrados = descifrar_lote(
+        [registro._datos[campo] for registro, campo in objetivos],
+        tolerar_texto_plano=tolerar
+    )
+    for (registro, campo), valor in zip(objetivos, descifrados):
+        registro._datos[campo] = valor
+        registro._pendientes.discard(campo)
+    return registros
+
+
+def a_diccionarios(registros):
+    """Descifra en lote y convierte una lista de RegistroCifrado en lista de dicts."""
+    precargar(registros)
+    return [dict(registro._datos) for registro in registros]
+
+
+def iterar_descifrados(bloques, campos_cifrados, descifrar=True):
+    """
+    Generador sobre bloques de diccionarios (busqueda.iterar_bloques). Cada
+    bloque se descifra con una sola llamada a descifrar_lote antes de
+    entregar sus filas, así que la memoria depende del tamaño de bloque.
+
+    Args:
+        bloques: Iterable de listas de diccionarios
+        campos_cifrados: Campos a descifrar
+        descifrar: True entrega dicts ya descifrados; False entrega
+            RegistroCifrado (descifrado perezoso, campo a campo)
+    """
+    for bloque in bloques:
+        registros = [RegistroCifrado(fila, campos_cifrados) for fila in bloque]
+        if descifrar:
+            yield from a_diccionarios(registros)
+        else:
+            yield from registros
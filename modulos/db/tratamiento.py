@@ -1,72 +1,84 @@
-from .db import conectar
+import sqlite3
+from .db import abrir_conexion, seleccionar_columnas, primera_referencia_faltante, LECTURA_TAMANO_BLOQUE
+from .busqueda import iterar_registros
+
+# Columnas disponibles en obtener_tratamientos (nombre -> expresión SQL), en el orden por defecto
+COLUMNAS_TRATAMIENTOS = {
+    "id": "t.id",
+    "tratamiento": "t.tratamiento",
+    "fecha_inicio": "t.fecha_inicio",
+    "fecha_termino": "t.fecha_termino",
+    "diagnostico": "d.descripcion",
+}
+ORIGEN_TRATAMIENTOS = """tratamiento t
+                JOIN diagnostico d ON t.id_diagnostico = d.id"""
 
 def eliminar_tratamiento(id_tratamiento):
     try:
-        conn, cursor = conectar()
-        # Primero verificar si hay registros relacionados
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM historial 
-            WHERE id_tratamiento = ?
-        """, (id_tratamiento,))
-        if cursor.fetchone()[0] > 0:
-            return False, "No se puede eliminar el tratamiento porque tiene historiales asociados"
+        with abrir_conexion() as (conn, cursor):
+            # Primero verificar si hay registros relacionados
+            cursor.execute("""
+                SELECT COUNT(*) 
+                FROM historial 
+                WHERE id_tratamiento = ?
+            """, (id_tratamiento,))
+            if cursor.fetchone()[0] > 0:
+                return False, "No se puede eliminar el tratamiento porque tiene historiales asociados"
         
-        # Si no hay registros relacionados, eliminar
-        cursor.execute("DELETE FROM tratamiento WHERE id = ?", (id_tratamiento,))
-        cambios = cursor.rowcount
-        conn.commit()
-        conn.close()
+            # Si no hay registros relacionados, eliminar
+            cursor.execute("DELETE FROM tratamiento WHERE id = ?", (id_tratamiento,))
+            cambios = cursor.rowcount
+            conn.commit()
         if cambios > 0:
             return True, f"Tratamiento ID {id_tratamiento} eliminado correctamente"
         return False, f"No se encontró el tratamiento con ID {id_tratamiento}"
     except Exception as e:
-        try:
-            conn.close()
-        except:
-            pass
         return False, str(e)
 
 def agregar_tratamiento(fecha_inicio, fecha_termino, tratamiento, id_diagnostico):
-    from .db import existe_tabla_id
-    
-    # Validar que exista el diagnóstico
-    if not existe_tabla_id("diagnostico", id_diagnostico):
-        return False, "El diagnóstico especificado no existe"
-    
     try:
-        conn, cursor = conectar()
-        cursor.execute("""
-            INSERT INTO tratamiento (fecha_inicio, fecha_termino, tratamiento, id_diagnostico)
-            VALUES (?, ?, ?, ?)
-        """, (fecha_inicio, fecha_termino, tratamiento, id_diagnostico))
-        id_generado = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with abrir_conexion() as (conn, cursor):
+            cursor.execute("""
+                INSERT INTO tratamiento (fecha_inicio, fecha_termino, tratamiento, id_diagnostico)
+                VALUES (?, ?, ?, ?)
+            """, (fecha_inicio, fecha_termino, tratamiento, id_diagnostico))
+            id_generado = cursor.lastrowid
+            conn.commit()
         return True, f"Tratamiento ID {id_generado} agregado correctamente"
+    except sqlite3.IntegrityError as e:
+        mensaje = primera_referencia_faltante([
+            ("diagnostico", id_diagnostico, "El diagnóstico especificado no existe"),
+        ])
+        return False, mensaje or str(e)
     except Exception as e:
-        try:
-            conn.close()
-        except:
-            pass
         return False, str(e)
 
-def obtener_tratamientos():
+def obtener_tratamientos(columnas=None):
+    """Devuelve los tratamientos como tuplas en el orden de 'columnas' (None = COLUMNAS_TRATAMIENTOS)."""
+    _, select = seleccionar_columnas(COLUMNAS_TRATAMIENTOS, columnas)
     try:
-        conn, cursor = conectar()
-        cursor.execute("""
-            SELECT t.id, t.tratamiento, t.fecha_inicio, t.fecha_termino,
-                   d.descripcion AS diagnostico
-            FROM tratamiento t
-            JOIN diagnostico d ON t.id_diagnostico = d.id
-            ORDER BY t.fecha_inicio DESC
-        """)
-        datos = cursor.fetchall()
-        conn.close()
+        with abrir_conexion() as (conn, cursor):
+            cursor.execute(f"""
+                SELECT {select}
+                FROM {ORIGEN_TRATAMIENTOS}
+                ORDER BY t.fecha_inicio DESC
+            """)
+            datos = cursor.fetchall()
         return datos
     except Exception as e:
-        try:
-            conn.close()
-        except:
-            pass
         return []
+
+def iterar_tratamientos(columnas=None, tamano_bloque=LECTURA_TAMANO_BLOQUE, **opciones):
+    """
+    Generador sobre los tratamientos, del más reciente al más antiguo, leídos
+    con fetchmany: memoria constante aunque la tabla sea grande.
+
+    Args:
+        columnas: Columnas de COLUMNAS_TRATAMIENTOS (None = todas)
+        tamano_bloque: Filas por fetchmany
+        **opciones: filtros, entre, en... como en buscar_registros
+    """
+    opciones.setdefault("orden", ["-fecha_inicio"])
+    return iterar_registros(
+        COLUMNAS_TRATAMIENTOS, tamano_bloque, origen=ORIGEN_TRATAMIENTOS, columnas=columnas, **opciones
+    )
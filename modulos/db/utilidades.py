@@ -11,20 +11,10 @@ def normalizar_texto(texto):
     if texto is None:
         return ""
 
-    # Convertir a minúsculas
-    texto = str(texto).lower()
-    
-    # Normalizar caracteres unicode (separar letras de acentos)
-    texto = unicodedata.normalize('NFD', texto)
-    
-    # Remover acentos
-    texto_sin_acentos = ""
-    for char in texto:
-        # Si el caracter NO es una marca diacrítica (acento), lo agregamos
-        if unicodedata.category(char) != 'Mn':
-            texto_sin_acentos += char
-    
-    return texto_sin_acentos
+    # Minúsculas y NFD (separa letras de acentos); luego se descartan las
+    # marcas diacríticas. También la usa SQLite como normalizar() (ver db.py).
+    texto = unicodedata.normalize('NFD', str(texto).lower())
+    return "".join(char for char in texto if unicodedata.category(char) != 'Mn')
 
 
 def validar_email(email):
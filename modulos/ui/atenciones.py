@@ -1,8 +1,11 @@
 import streamlit as st
-import pandas as pd
-from modulos.db.atencion import agregar_atencion, obtener_atenciones
-from modulos.db.diagnostico import obtener_diagnosticos
+from modulos.db.atencion import agregar_atencion
+from modulos.db.diagnostico import obtener_diagnosticos, descripciones_diagnosticos
+from modulos.db.busqueda import buscar_registros
 from modulos.db.historial import obtener_historiales
+from modulos.db.dataframes import atenciones_df
+from modulos.ui.common import mostrar_total
+from modulos.ui.filtros import filtrar, LIMITE_LISTADO
 
 def mostrar_seccion_atenciones():
     st.header("Atenciones")
@@ -10,20 +13,9 @@ def mostrar_seccion_atenciones():
 
     with tab_listar:
         st.subheader("Lista de Atenciones")
-        datos = obtener_atenciones()
-        if not datos:
+        if not buscar_registros("atencion", columnas=["id"], limite=1):
             st.info("No hay atenciones registradas.")
         else:
-            df = pd.DataFrame(datos)
-            # Columnas según SELECT en obtener_atenciones
-            df.columns = [
-                "ID",
-                "Descripción",
-                "Diagnóstico",
-                "Historial",
-                "Fecha Registro",
-            ]
-
             # Filtros
             st.markdown("### 🔍 Filtros")
             col_f1, col_f2, col_f3 = st.columns([3, 2, 2])
@@ -34,58 +26,28 @@ def mostrar_seccion_atenciones():
                     placeholder="Ej: seguimiento, control, evaluación"
                 )
             with col_f2:
-                diag_values = []
-                for x in df["Diagnóstico"].dropna().unique().tolist():
-                    diag_values.append(x)
-                diag_values = sorted(diag_values)
-                diag_opts = ["Todos"]
-                for v in diag_values:
-                    diag_opts.append(v)
+                diag_opts = ["Todos"] + descripciones_diagnosticos()
                 filtro_diag = st.selectbox("Diagnóstico", diag_opts, key="aten_list_diag")
             with col_f3:
                 desde = st.date_input("Desde", value=None, key="aten_list_desde")
                 hasta = st.date_input("Hasta", value=None, key="aten_list_hasta")
 
-            df_filtrado = df.copy()
-            if q:
-                qn = q.strip().lower()
-                mask_list = []
-                for idx in range(len(df_filtrado)):
-                    desc_val = str(df_filtrado.iloc[idx]["Descripción"]).lower()
-                    diag_val = str(df_filtrado.iloc[idx]["Diagnóstico"]).lower()
-                    ok = False
-                    if qn in desc_val:
-                        ok = True
-                    if qn in diag_val:
-                        ok = True
-                    mask_list.append(ok)
-                df_filtrado = df_filtrado[pd.Series(mask_list)]
-
-            if filtro_diag != "Todos":
-                df_filtrado = df_filtrado[df_filtrado["Diagnóstico"] == filtro_diag]
-
-            if desde or hasta:
-                def _to_date(s):
-                    try:
-                        return pd.to_datetime(s).date()
-                    except Exception:
-                        return None
-                fr_list = []
-                for val in df_filtrado["Fecha Registro"]:
-                    fr_list.append(_to_date(val))
-                mask_list = []
-                for d in fr_list:
-                    ok = True
-                    if desde:
-                        if d is None or d < desde:
-                            ok = False
-                    if hasta:
-                        if d is None or d > hasta:
-                            ok = False
-                    mask_list.append(ok)
-                df_filtrado = df_filtrado[pd.Series(mask_list)]
+            # Descripción por texto completo (FTS5); el diagnóstico viene del JOIN
+            df_filtrado = filtrar(
+                atenciones_df, "atencion", q, ["diagnostico"],
+                iguales={"diagnostico": filtro_diag},
+                fechas={"fecha_registro": (desde, hasta)},
+            )
+            # Columnas en el orden de COLUMNAS_ATENCIONES
+            df_filtrado.columns = [
+                "ID",
+                "Descripción",
+                "Diagnóstico",
+                "Historial",
+                "Fecha Registro",
+            ]
 
-            st.info(f"Total: {len(df_filtrado)} registro(s)")
+            mostrar_total(df_filtrado, LIMITE_LISTADO)
             st.dataframe(df_filtrado, hide_index=True, width="stretch")
 
     with tab_crear:
@@ -93,7 +55,7 @@ def mostrar_seccion_atenciones():
         
         col1, col2 = st.columns([1, 1])
         with col1:
-            diag_rows = obtener_diagnosticos()
+            diag_rows = obtener_diagnosticos(["id", "fecha"])
             diag_opts = []
             if diag_rows:
                 for d in diag_rows:
@@ -113,11 +75,11 @@ def mostrar_seccion_atenciones():
                 id_diag = None
         
         with col2:
-            hist_rows = obtener_historiales()
+            hist_rows = obtener_historiales(["id", "paciente"])
             hist_opts = []
             if hist_rows:
                 for h in hist_rows:
-                    etiqueta = f"ID {h[0]} - {h[2]}"
+                    etiqueta = f"ID {h[0]} - {h[1]}"
                     hist_opts.append((h[0], etiqueta))
             if hist_opts:
                 hist_map = {}
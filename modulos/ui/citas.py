@@ -2,14 +2,16 @@ import streamlit as st
 import pandas as pd
 from modulos.db.cita import (
     agregar_cita,
-    mostrar_citas,
+    pagina_citas_detalle,
     eliminar_cita,
-    actualizar_cita,
-    mostrar_paciente_nombre,
-    mostrar_paciente_rut
+    actualizar_cita
 )
+from modulos.db.db import transaccion
+from modulos.db.busqueda import buscar_registros
 from modulos.db.medico import mostrar_medicos
-from modulos.db.paciente import mostrar_pacientes
+from modulos.db.paciente import mostrar_pacientes, id_paciente_por_rut
+from modulos.db.registro import a_diccionarios
+from modulos.ui.common import paginar
 
 def mostrar_seccion_citas():
     st.header("Citas")
@@ -26,15 +28,11 @@ def mostrar_seccion_citas():
     with tab_gestionar:
         st.subheader("Gestión Integral de Citas")
         st.caption("Visualiza, edita estado y elimina citas desde un solo lugar")
-        data = mostrar_citas()
+        hay_citas = bool(buscar_registros("cita", columnas=["id"], limite=1))
 
-        if not data:
+        if not hay_citas:
             st.info("No hay citas registradas.")
         else:
-            # Obtener datos de médicos para mostrar especialidad
-            medicos = mostrar_medicos()
-            medicos_dict = {m['id']: m for m in medicos}
-            
             # Filtros en la parte superior
             st.markdown("#### 🔍 Filtros")
             col_f1, col_f2, col_f3, col_f4 = st.columns(4)
@@ -70,28 +68,35 @@ def mostrar_seccion_citas():
             
             st.markdown("---")
             
-            # Aplicar filtros
-            citas_filtradas = []
-            for cita in data:
-                # Filtro por ID
-                if filtro_id > 0 and cita['id'] != filtro_id:
-                    continue
-                
-                # Filtro por RUT
-                if filtro_rut:
-                    rut_paciente = mostrar_paciente_rut(cita['id_paciente'])
-                    if filtro_rut.lower() not in rut_paciente.lower():
-                        continue
-                
-                # Filtro por fecha
-                if filtro_fecha and str(cita['fecha']) != str(filtro_fecha):
-                    continue
-                
-                # Filtro por estado
-                if filtro_estado != "Todos" and cita['estado'] != filtro_estado:
-                    continue
-                
-                citas_filtradas.append(cita)
+            # Aplicar filtros: ID, fecha y estado en SQLite (con índices)
+            filtros = {
+                "id": filtro_id or None,
+                "fecha": str(filtro_fecha) if filtro_fecha else None,
+                "estado": None if filtro_estado == "Todos" else filtro_estado,
+            }
+            
+            # Filtro por RUT: el RUT está cifrado, se resuelve a IDs de paciente.
+            # Un RUT completo se busca por su índice ciego (una fila); solo un
+            # fragmento obliga a descifrar los RUT para compararlos
+            en = None
+            id_por_rut = id_paciente_por_rut(filtro_rut)
+            if id_por_rut is not None:
+                en = {"id_paciente": [id_por_rut]}
+            elif filtro_rut:
+                pacientes_rut = a_diccionarios(mostrar_pacientes(["id", "rut"]))
+                en = {"id_paciente": [
+                    p['id'] for p in pacientes_rut
+                    if filtro_rut.lower() in (p['rut'] or "").lower()
+                ]}
+            
+            # Una página a la vez, por cursor (fecha, hora, id), con paciente,
+            # RUT, médico y especialidad en la misma consulta
+            citas_filtradas = paginar(
+                "cit_pagina",
+                lambda tamano, cursor: pagina_citas_detalle(tamano, cursor, filtros=filtros, en=en),
+                tamano=20,
+                filtros=(tuple(filtros.values()), filtro_rut),
+            )
             
             if not citas_filtradas:
                 st.warning("No se encontraron citas con los filtros aplicados.")
@@ -109,40 +114,50 @@ def mostrar_seccion_citas():
                         if st.button("💾 Guardar Todos los Cambios", type="primary", key="guardar_cambios_top", width="stretch"):
                             errores = []
                             
-                            # Actualizar estados modificados
-                            for cita_id, nuevo_estado in st.session_state.citas_estados_modificados.items():
-                                cita_original = next((c for c in data if c['id'] == cita_id), None)
-                                if cita_original:
-                                    ok, msg = actualizar_cita(
-                                        cita_id,
-                                        cita_original['fecha'],
-                                        cita_original['hora'],
-                                        nuevo_estado,
-                                        cita_original['motivo'],
-                                        cita_original['id_paciente'],
-                                        cita_original['id_medico']
-                                    )
+                            # Datos actuales de las citas modificadas, aunque el filtro ya no las muestre
+                            originales = {
+                                c['id']: c for c in buscar_registros(
+                                    "cita", en={"id": list(st.session_state.citas_estados_modificados)}
+                                )
+                            }
+                            
+                            # Todos los cambios en una sola transacción: se guardan todos o ninguno
+                            with transaccion() as tx:
+                                # Actualizar estados modificados
+                                for cita_id, nuevo_estado in st.session_state.citas_estados_modificados.items():
+                                    cita_original = originales.get(cita_id)
+                                    if cita_original:
+                                        ok, msg = actualizar_cita(
+                                            cita_id,
+                                            cita_original['fecha'],
+                                            cita_original['hora'],
+                                            nuevo_estado,
+                                            cita_original['motivo'],
+                                            cita_original['id_paciente'],
+                                            cita_original['id_medico']
+                                        )
+                                        if not ok:
+                                            errores.append(f"Cita #{cita_id}: {msg}")
+                                
+                                # Eliminar citas marcadas
+                                for cita_id in st.session_state.citas_a_eliminar:
+                                    ok, msg = eliminar_cita(cita_id)
                                     if not ok:
                                         errores.append(f"Cita #{cita_id}: {msg}")
-                            
-                            # Eliminar citas marcadas
-                            for cita_id in st.session_state.citas_a_eliminar:
-                                ok, msg = eliminar_cita(cita_id)
-                                if not ok:
-                                    errores.append(f"Cita #{cita_id}: {msg}")
-                            
-                            # Limpiar session_state y mostrar resultado
-                            st.session_state.citas_estados_modificados = {}
-                            st.session_state.citas_a_eliminar = set()
+                                
+                                if errores:
+                                    tx.revertir()
                             
                             if errores:
-                                st.error("❌ Algunos cambios no se pudieron guardar:")
+                                # Nada se guardó: se conservan los cambios pendientes para reintentar
+                                st.error("❌ No se guardó ningún cambio porque algunos fallaron:")
                                 for error in errores:
                                     st.error(f"  • {error}")
                             else:
+                                st.session_state.citas_estados_modificados = {}
+                                st.session_state.citas_a_eliminar = set()
                                 st.success("✅ Todos los cambios guardados correctamente")
-                            
-                            st.rerun()
+                                st.rerun()
                     
                     st.markdown("---")
                 
@@ -156,13 +171,11 @@ def mostrar_seccion_citas():
                 
                 # Mostrar cada cita como tarjeta editable
                 for cita in citas_filtradas:
-                    # Obtener datos del paciente y médico
-                    nombre_paciente = mostrar_paciente_nombre(cita['id_paciente'])
-                    rut_paciente = mostrar_paciente_rut(cita['id_paciente'])
-                    
-                    medico_info = medicos_dict.get(cita['id_medico'], {})
-                    nombre_medico = f"{medico_info.get('nombre', 'N/A')} {medico_info.get('apellido', '')}"
-                    especialidad_medico = medico_info.get('especialidad', 'Sin especialidad')
+                    # Datos del paciente y médico (ya vienen en la fila)
+                    nombre_paciente = cita['paciente'] or "Desconocido"
+                    rut_paciente = cita['rut_paciente'] or "Desconocido"
+                    nombre_medico = cita['medico'] or "N/A"
+                    especialidad_medico = cita['especialidad'] or "Sin especialidad"
                     
                     # Verificar si está marcada para eliminar
                     if cita['id'] in st.session_state.citas_a_eliminar:
@@ -214,8 +227,8 @@ def mostrar_seccion_citas():
     # Tab Crear
     with tab_crear:
         st.subheader("Crear Cita")
-        pacientes = mostrar_pacientes()
-        medicos = mostrar_medicos()
+        pacientes = mostrar_pacientes(["id", "nombre", "apellido"])
+        medicos = mostrar_medicos(["id", "nombre", "apellido"])
 
         if not pacientes:
             st.warning("No hay pacientes registrados.")
@@ -1,22 +1,78 @@
 import streamlit as st
 import pandas as pd
+from modulos.db.dataframes import COLUMNAS_SOLO_FECHA
+
+# Filas por página de los listados paginados
+TAMANO_PAGINA = 50
+
+def columnas_fecha(*columnas):
+    """column_config que muestra 'columnas' (datetime64 de aplicar_tipos) solo como fecha."""
+    return {columna: st.column_config.DateColumn(format="YYYY-MM-DD") for columna in columnas}
 
 def mostrar_resultados(resultados, nombre_tabla=""):
     """
     Muestra resultados en un DataFrame de Streamlit con el ID real como índice.
     Evita confundir el índice de Pandas con el ID de la base de datos.
+    Acepta una lista de diccionarios o directamente un DataFrame (modulos/db/dataframes.py).
     """
-    if not resultados:
+    if resultados is None or len(resultados) == 0:
         st.warning(f"No se encontraron resultados en {nombre_tabla}.")
         return
 
-    df = pd.DataFrame(resultados)
+    df = resultados if isinstance(resultados, pd.DataFrame) else pd.DataFrame(resultados)
+    config = columnas_fecha(*[columna for columna in df.columns if columna in COLUMNAS_SOLO_FECHA])
 
     # Asegurarse de que exista columna id
     if "id" in df.columns:
         df = df.sort_values("id").set_index("id")
-        st.dataframe(df, width="stretch")
+        st.dataframe(df, width="stretch", column_config=config)
     else:
         # Si no existe 'id', mostramos sin índice y avisamos
-        st.dataframe(df, hide_index=True, width="stretch")
-        st.info("Esta tabla no contiene columna 'id'.")
\ No newline at end of file
+        st.dataframe(df, hide_index=True, width="stretch", column_config=config)
+        st.info("Esta tabla no contiene columna 'id'.")
+
+def mostrar_total(df, limite):
+    """Total de un listado leído con 'limite' filas como máximo (ver filtros.filtrar)."""
+    if len(df) >= limite:
+        st.info(f"Se muestran los primeros {limite} registro(s); afine los filtros para ver el resto.")
+    else:
+        st.info(f"Total: {len(df)} registro(s)")
+
+def paginar(clave, cargar_pagina, tamano=TAMANO_PAGINA, filtros=None):
+    """
+    Controles "Anterior / Siguiente" para un listado con paginación por cursor.
+
+    En session_state se guarda la pila de cursores de las páginas visitadas
+    (la primera es None), de modo que volver atrás no recorre la tabla. Si
+    cambian los filtros se vuelve a la primera página.
+
+    Args:
+        clave: Prefijo único para las claves de session_state y de los botones
+        cargar_pagina: Función (tamano, despues_de) -> (filas, cursor siguiente o None)
+        tamano: Filas por página
+        filtros: Valor comparable con los filtros activos
+
+    Returns:
+        list: Filas de la página actual
+    """
+    clave_pila = f"{clave}_cursores"
+    clave_filtros = f"{clave}_filtros"
+    if clave_pila not in st.session_state or st.session_state.get(clave_filtros) != filtros:
+        st.session_state[clave_pila] = [None]
+        st.session_state[clave_filtros] = filtros
+    pila = st.session_state[clave_pila]
+
+    filas, siguiente = cargar_pagina(tamano, pila[-1])
+
+    col_anterior, col_pagina, col_siguiente = st.columns([1, 2, 1])
+    with col_anterior:
+        if st.button("◀ Anterior", key=f"{clave}_anterior", disabled=len(pila) == 1):
+            pila.pop()
+            st.rerun()
+    with col_pagina:
+        st.caption(f"Página {len(pila)} · {len(filas)} registro(s)")
+    with col_siguiente:
+        if st.button("Siguiente ▶", key=f"{clave}_siguiente", disabled=siguiente is None):
+            pila.append(siguiente)
+            st.rerun()
+    return filas
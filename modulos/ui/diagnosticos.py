@@ -1,8 +1,11 @@
 import streamlit as st
-import pandas as pd
-from modulos.db.diagnostico import agregar_diagnostico, obtener_diagnosticos
+from modulos.db.diagnostico import agregar_diagnostico
+from modulos.db.busqueda import buscar_registros
 from modulos.db.medico import mostrar_medicos
 from modulos.db.cita import mostrar_citas
+from modulos.db.dataframes import diagnosticos_df
+from modulos.ui.common import mostrar_total, columnas_fecha
+from modulos.ui.filtros import filtrar, LIMITE_LISTADO
 
 def mostrar_seccion_diagnosticos():
     st.header("Diagnósticos")
@@ -10,21 +13,9 @@ def mostrar_seccion_diagnosticos():
 
     with tab_listar:
         st.subheader("Lista de Diagnósticos")
-        datos = obtener_diagnosticos()
-        if not datos:
+        if not buscar_registros("diagnostico", columnas=["id"], limite=1):
             st.info("No hay diagnósticos registrados.")
         else:
-            df = pd.DataFrame(datos)
-            # Columnas según SELECT en obtener_diagnosticos
-            df.columns = [
-                "ID",
-                "Fecha",
-                "Descripción",
-                "Médico",
-                "Fecha Cita",
-                "Motivo Cita",
-            ]
-
             # Filtros
             st.markdown("### 🔍 Filtros")
             col_f1, col_f2, col_f3 = st.columns([3, 2, 2])
@@ -35,53 +26,35 @@ def mostrar_seccion_diagnosticos():
                     placeholder="Ej: Hipertensión, Diabetes, Gripe"
                 )
             with col_f2:
-                med_values = []
-                for x in df["Médico"].dropna().unique().tolist():
-                    med_values.append(x)
-                med_values = sorted(med_values)
-                med_opts = ["Todos"]
-                for v in med_values:
-                    med_opts.append(v)
+                # Mismo formato que la columna 'medico' de COLUMNAS_DIAGNOSTICOS
+                nombres = {f"{m.get('nombre','')} {m.get('apellido','')}" for m in mostrar_medicos(["nombre", "apellido"])}
+                med_opts = ["Todos"] + sorted(nombres)
                 filtro_med = st.selectbox("Médico", med_opts, key="diag_list_med")
             with col_f3:
                 desde = st.date_input("Desde", value=None, key="diag_list_desde")
                 hasta = st.date_input("Hasta", value=None, key="diag_list_hasta")
 
-            df_filtrado = df.copy()
-            if q:
-                qn = q.strip().lower()
-                df_filtrado = df_filtrado[
-                    df_filtrado["Descripción"].astype(str).str.lower().str.contains(qn)
-                    | df_filtrado["Médico"].astype(str).str.lower().str.contains(qn)
-                    | df_filtrado["Motivo Cita"].astype(str).str.lower().str.contains(qn)
-                ]
-
-            if filtro_med != "Todos":
-                df_filtrado = df_filtrado[df_filtrado["Médico"] == filtro_med]
-
-            if desde or hasta:
-                def _to_date(s):
-                    try:
-                        return pd.to_datetime(s).date()
-                    except Exception:
-                        return None
-                f_list = []
-                for val in df_filtrado["Fecha"]:
-                    f_list.append(_to_date(val))
-                mask_list = []
-                for d in f_list:
-                    ok = True
-                    if desde:
-                        if d is None or d < desde:
-                            ok = False
-                    if hasta:
-                        if d is None or d > hasta:
-                            ok = False
-                    mask_list.append(ok)
-                df_filtrado = df_filtrado[pd.Series(mask_list)]
+            # Descripción por texto completo (FTS5); médico y motivo de la cita vienen del JOIN
+            df_filtrado = filtrar(
+                diagnosticos_df, "diagnostico", q, ["medico", "motivo_cita"],
+                iguales={"medico": filtro_med},
+                fechas={"fecha": (desde, hasta)},
+            )
+            # Columnas en el orden de COLUMNAS_DIAGNOSTICOS
+            df_filtrado.columns = [
+                "ID",
+                "Fecha",
+                "Descripción",
+                "Médico",
+                "Fecha Cita",
+                "Motivo Cita",
+            ]
 
-            st.info(f"Total: {len(df_filtrado)} registro(s)")
-            st.dataframe(df_filtrado, hide_index=True, width="stretch")
+            mostrar_total(df_filtrado, LIMITE_LISTADO)
+            st.dataframe(
+                df_filtrado, hide_index=True, width="stretch",
+                column_config=columnas_fecha("Fecha", "Fecha Cita")
+            )
 
     with tab_crear:
         st.subheader("Crear Diagnóstico")
@@ -91,7 +64,7 @@ def mostrar_seccion_diagnosticos():
             fecha = st.date_input("Fecha")
             
             # Seleccionar médico
-            med_rows = mostrar_medicos()
+            med_rows = mostrar_medicos(["id", "nombre", "apellido"])
             med_options = []
             if med_rows:
                 for m in med_rows:
@@ -112,7 +85,7 @@ def mostrar_seccion_diagnosticos():
         
         with col2:
             # Seleccionar cita
-            cita_rows = mostrar_citas()
+            cita_rows = mostrar_citas(["id", "fecha", "hora"])
             cita_options = []
             if cita_rows:
                 for c in cita_rows:
@@ -1,23 +1,11 @@
 import streamlit as st
-import pandas as pd
-import unicodedata
 from modulos.db.especialidad import (
-    mostrar_especialidades,
     agregar_especialidad,
     actualizar_especialidad,
     eliminar_especialidad
 )
-
-def normalizar_texto(texto):
-    """Elimina tildes y acentos de un texto para comparación."""
-    if pd.isna(texto):
-        return ""
-    texto = str(texto)
-    # Normalizar a NFD (descompone caracteres acentuados)
-    nfd = unicodedata.normalize('NFD', texto)
-    # Filtrar solo caracteres que no sean marcas diacríticas
-    sin_tildes = ''.join(c for c in nfd if unicodedata.category(c) != 'Mn')
-    return sin_tildes.lower()
+from modulos.db.busqueda import buscar_ids_normalizados
+from modulos.db.dataframes import especialidades_df
 
 def mostrar_seccion_especialidades():
     """Interfaz Streamlit para gestionar las especialidades médicas."""
@@ -51,7 +39,7 @@ def mostrar_seccion_especialidades():
             )
         with col2:
             filtro_nombre = st.text_input(
-                "Nombre contiene", 
+                "Nombre comienza con", 
                 key="esp_list_filtro_nombre", 
                 placeholder="Ej: Cardiología"
             )
@@ -63,39 +51,29 @@ def mostrar_seccion_especialidades():
             )
 
         # Obtener datos
-        data = mostrar_especialidades()
+        df = especialidades_df()
 
-        if not data:
+        if df.empty:
             st.warning("No hay especialidades registradas.")
         else:
-            df = pd.DataFrame(data)
-            cols_lower = []
-            for c in df.columns:
-                cols_lower.append(c.lower())
-            df.columns = cols_lower
-
-            # Crear columnas normalizadas para búsqueda
-            df['nombre_normalizado'] = df['nombre'].apply(normalizar_texto)
-            df['descripcion_normalizada'] = df['descripcion'].apply(normalizar_texto)
 
             if filtro_id > 0:
                 id_col = 'id' if 'id' in df.columns else 'id_especialidad'
                 df = df[df[id_col] == filtro_id]
             
-            # Filtros por texto (ignorando tildes)
-            if filtro_nombre and filtro_nombre.strip():
-                filtro_nombre_norm = normalizar_texto(filtro_nombre)
-                df = df[df["nombre_normalizado"].str.contains(filtro_nombre_norm, na=False)]
-            
-            if filtro_desc and filtro_desc.strip():
-                filtro_desc_norm = normalizar_texto(filtro_desc)
-                df = df[df["descripcion_normalizada"].str.contains(filtro_desc_norm, na=False)]
+            # Filtros por texto (ignorando tildes): se resuelven en SQL sobre las
+            # columnas *_norm; el nombre por prefijo con índice
+            ids_texto = buscar_ids_normalizados(
+                "especialidad",
+                prefijos={"nombre": filtro_nombre},
+                contiene={"descripcion": filtro_desc}
+            )
+            if ids_texto is not None:
+                df = df[df["id"].isin(ids_texto)]
 
             if not df.empty:
                 id_col = 'id' if 'id' in df.columns else 'id_especialidad'
-                # Eliminar columnas normalizadas antes de mostrar
-                df_mostrar = df.drop(columns=['nombre_normalizado', 'descripcion_normalizada'], errors='ignore')
-                df_mostrar = df_mostrar.rename(columns={
+                df_mostrar = df.rename(columns={
                     id_col: "ID",
                     "nombre": "Nombre",
                     "descripcion": "Descripción"
@@ -147,13 +125,10 @@ def mostrar_seccion_especialidades():
             st.session_state["esp_upd_desc"] = ""
             st.session_state["esp_reset_form_upd"] = False
 
-        data = mostrar_especialidades()
-        if not data:
+        df = especialidades_df()
+        if df.empty:
             st.warning("No hay especialidades registradas.")
         else:
-            df = pd.DataFrame(data)
-
-            df.columns = [c.lower() for c in df.columns]
             id_col = 'id' if 'id' in df.columns else 'id_especialidad'
 
             # Filtro por ID
@@ -221,12 +196,9 @@ def mostrar_seccion_especialidades():
     #Eliminar
     with tab_eliminar:
         st.markdown("### Eliminar Especialidad")
-        data = mostrar_especialidades()
-
-        if data:
-            df = pd.DataFrame(data)
+        df = especialidades_df()
 
-            df.columns = [c.lower() for c in df.columns]
+        if not df.empty:
             id_col = 'id' if 'id' in df.columns else 'id_especialidad'
 
             # Filtro
@@ -0,0 +1,86 @@
+import pandas as pd
+from datetime import date
+
+# ======================================================
+# FILTROS DE LOS LISTADOS
+# ======================================================
+# filtrar() traduce los controles de un listado a opciones de
+# construir_consulta: igualdades, rangos de fechas, búsqueda de texto y
+# LIMIT se resuelven en SQL, de modo que cada rerun lee solo las filas que se
+# muestran. Los demás helpers trabajan sobre columnas ya leídas, sin recorrer
+# filas en Python.
+
+# Valores de los selectbox que significan "sin filtro"
+SIN_FILTRO = (None, "", "Todos", "Todas")
+
+# Máximo de filas que lee un listado filtrado
+LIMITE_LISTADO = 500
+
+
+def como_fechas(serie):
+    """Serie de fechas datetime64 (normalizada a medianoche); la convierte una
+    sola vez si viene como texto. Los valores inválidos quedan NaT."""
+    if not pd.api.types.is_datetime64_any_dtype(serie):
+        serie = pd.to_datetime(serie, errors="coerce", format="ISO8601")
+    return serie.dt.normalize()
+
+
+def filtrar(cargar, tabla=None, q=None, columnas_texto=(), iguales=None, fechas=None, limite=LIMITE_LISTADO):
+    """
+    Lee un listado con todos sus filtros resueltos en la consulta.
+
+    Args:
+        cargar: Función de modulos/db/dataframes.py (p. ej. diagnosticos_df)
+        tabla: Tabla con búsqueda de texto completo (FTS5) para 'q'; sus
+            coincidencias se leen en SQL ordenadas por relevancia (texto_completo)
+        q: Texto del cuadro "Buscar"
+        columnas_texto: Columnas donde además se busca 'q' sin distinguir
+            mayúsculas ni tildes (nombres que vienen de otras tablas por JOIN)
+        iguales: {"columna": valor} igualdad; "Todos", "Todas", "" o None se ignoran
+        fechas: {"columna": (desde, hasta)} rango inclusivo de fechas
+        limite: Máximo de filas
+
+    Returns:
+        DataFrame: Hasta 'limite' filas que cumplen todos los filtros, con
+            índice reiniciado. Si hubo búsqueda FTS5, sus coincidencias van
+            primero por relevancia y después, hasta completar 'limite', las
+            que solo coinciden en 'columnas_texto'.
+    """
+    opciones = {
+        "filtros": {columna: valor for columna, valor in (iguales or {}).items() if valor not in SIN_FILTRO},
+        "entre": {
+            # 'hasta' incluye todo el día también en columnas con hora
+            columna: (str(desde) if desde else None, f"{hasta} 23:59:59" if hasta else None)
+            for columna, (desde, hasta) in (fechas or {}).items()
+        },
+        "limite": limite,
+    }
+
+    if not q or not q.strip():
+        return cargar(**opciones).reset_index(drop=True)
+
+    partes = []
+    if tabla is not None:
+        # Las mejores coincidencias FTS5 según rank, ya filtradas y limitadas en SQL
+        partes.append(cargar(texto_completo=(tabla, q), **opciones))
+    if columnas_texto and sum(len(parte) for parte in partes) < limite:
+        # Las filas que además coinciden por FTS5 se descartan al unir
+        partes.append(cargar(alguno={"contiene": {columna: q.strip() for columna in columnas_texto}}, **opciones))
+    if not partes:
+        # Nada donde buscar 'q': ninguna fila coincide
+        return cargar(**{**opciones, "limite": 0})
+    resultado = pd.concat(partes) if len(partes) > 1 else partes[0]
+    return resultado.drop_duplicates("id").head(limite).reset_index(drop=True)
+
+
+def edades(fechas_nacimiento, hoy=None):
+    """Edad en años cumplidos para una serie de fechas (NaN si falta la fecha)."""
+    hoy = hoy or date.today()
+    fechas = como_fechas(fechas_nacimiento)
+    cumplio = (fechas.dt.month < hoy.month) | ((fechas.dt.month == hoy.month) & (fechas.dt.day <= hoy.day))
+    return hoy.year - fechas.dt.year - (~cumplio).astype(int)
+
+
+def limpiar_ruts(serie):
+    """RUTs sin puntos, guiones ni espacios y en minúsculas (vacío si falta)."""
+    return serie.fillna("").astype(str).str.replace(r"[^0-9kK]", "", regex=True).str.lower()
@@ -1,33 +1,36 @@
 import streamlit as st
 import pandas as pd
-from modulos.db.historial import agregar_historial, obtener_historiales
+from modulos.db.historial import agregar_historial, pagina_historiales
+from modulos.db.historial import COLUMNAS_HISTORIALES
+from modulos.db.busqueda import buscar_registros
+from modulos.db.dataframes import historiales_df, aplicar_tipos
 from modulos.db.diagnostico import obtener_diagnosticos
 from modulos.db.tratamiento import obtener_tratamientos
 from modulos.db.paciente import mostrar_pacientes
 from modulos.db.cita import mostrar_citas
+from modulos.ui.common import paginar, mostrar_total
+from modulos.ui.filtros import filtrar, LIMITE_LISTADO
+
+# Encabezados del listado, en el orden de COLUMNAS_HISTORIALES
+ENCABEZADOS_HISTORIALES = [
+    "ID",
+    "Fecha Registro",
+    "Paciente",
+    "Diagnóstico",
+    "Tratamiento",
+    "Observaciones",
+    "Alergias",
+    "Resultado Examen",
+]
 
 def mostrar_seccion_historiales():
     st.header("Historiales")
     tab_listar, tab_crear = st.tabs(["📋 Listar", "➕ Crear"])
     with tab_listar:
         st.subheader("Lista de Historiales")
-        datos = obtener_historiales()
-        if not datos:
+        if not buscar_registros("historial", columnas=["id"], limite=1):
             st.info("No hay historiales registrados.")
         else:
-            df = pd.DataFrame(datos)
-            # Columnas según SELECT en obtener_historiales
-            df.columns = [
-                "ID",
-                "Fecha Registro",
-                "Paciente",
-                "Diagnóstico",
-                "Tratamiento",
-                "Observaciones",
-                "Alergias",
-                "Resultado Examen",
-            ]
-
             # Filtros
             st.markdown("### 🔍 Filtros")
             col_f1, col_f2, col_f3 = st.columns([2, 1, 1])
@@ -35,51 +38,45 @@ def mostrar_seccion_historiales():
                 q = st.text_input(
                     "Buscar",
                     key="hist_list_q",
-                    placeholder="Ej: Paciente, Diagnóstico o Tratamiento"
+                    placeholder="Ej: Paciente, Diagnóstico, Tratamiento u Observaciones"
                 )
             with col_f2:
                 desde = st.date_input("Desde", value=None, key="hist_list_desde")
             with col_f3:
                 hasta = st.date_input("Hasta", value=None, key="hist_list_hasta")
 
-            df_filtrado = df.copy()
-            if q:
-                qn = q.strip().lower()
-                df_filtrado = df_filtrado[
-                    df_filtrado["Paciente"].astype(str).str.lower().str.contains(qn)
-                    | df_filtrado["Diagnóstico"].astype(str).str.lower().str.contains(qn)
-                    | df_filtrado["Tratamiento"].astype(str).str.lower().str.contains(qn)
-                ]
-
-            if desde or hasta:
-                def _to_date(s):
-                    try:
-                        return pd.to_datetime(s).date()
-                    except Exception:
-                        return None
-                fr_list = []
-                for val in df_filtrado["Fecha Registro"]:
-                    fr_list.append(_to_date(val))
-                mask_list = []
-                for d in fr_list:
-                    ok = True
-                    if desde:
-                        if d is None or d < desde:
-                            ok = False
-                    if hasta:
-                        if d is None or d > hasta:
-                            ok = False
-                    mask_list.append(ok)
-                df_filtrado = df_filtrado[pd.Series(mask_list)]
+            if not q or not q.strip():
+                # Sin búsqueda de texto: una página a la vez, por cursor
+                # (fecha_registro, id), con el rango de fechas resuelto en SQL
+                filas = paginar(
+                    "hist_pagina",
+                    lambda tamano, cursor: pagina_historiales(
+                        tamano, cursor,
+                        desde=str(desde) if desde else None,
+                        hasta=f"{hasta} 23:59:59" if hasta else None,
+                    ),
+                    filtros=(desde, hasta),
+                )
+                df_pagina = aplicar_tipos(pd.DataFrame(filas, columns=list(COLUMNAS_HISTORIALES)))
+                df_pagina.columns = ENCABEZADOS_HISTORIALES
+                st.dataframe(df_pagina, hide_index=True, width="stretch")
+            else:
+                # Observaciones, alergias y resultado de examen por texto completo
+                # (FTS5); paciente, diagnóstico y tratamiento vienen del JOIN
+                df_filtrado = filtrar(
+                    historiales_df, "historial", q, ["paciente", "diagnostico", "tratamiento"],
+                    fechas={"fecha_registro": (desde, hasta)},
+                )
+                df_filtrado.columns = ENCABEZADOS_HISTORIALES
 
-            st.info(f"Total: {len(df_filtrado)} registro(s)")
-            st.dataframe(df_filtrado, hide_index=True, width="stretch")
+                mostrar_total(df_filtrado, LIMITE_LISTADO)
+                st.dataframe(df_filtrado, hide_index=True, width="stretch")
 
     with tab_crear:
         st.subheader("Crear Historial")
         fecha_reg = st.date_input("Fecha registro")
         # Seleccionar diagnóstico
-        diag_rows = obtener_diagnosticos()
+        diag_rows = obtener_diagnosticos(["id", "fecha"])
         diag_options = []
         if diag_rows:
             for d in diag_rows:
@@ -98,7 +95,7 @@ def mostrar_seccion_historiales():
             id_diag = None
 
         # Seleccionar tratamiento
-        trat_rows = obtener_tratamientos()
+        trat_rows = obtener_tratamientos(["id", "tratamiento"])
         trat_options = []
         if trat_rows:
             for t in trat_rows:
@@ -121,7 +118,7 @@ def mostrar_seccion_historiales():
         resultado_ex = st.text_area("Resultado examen", placeholder="Ej: Exámenes dentro de parámetros normales")
 
         # Paciente
-        pac_rows = mostrar_pacientes()
+        pac_rows = mostrar_pacientes(["id", "nombre", "apellido"])
         pac_map = {}
         if pac_rows:
             for p in pac_rows:
@@ -138,7 +135,7 @@ def mostrar_seccion_historiales():
             id_pac = None
 
         # Cita
-        cita_rows = mostrar_citas()
+        cita_rows = mostrar_citas(["id", "fecha", "hora"])
         cita_map = {}
         if cita_rows:
             for c in cita_rows:
@@ -3,10 +3,11 @@ import pandas as pd
 import re
 from modulos.db.medico import (
     crear_medico,
-    mostrar_medicos,
     borrar_medico,
     actualizar_medico
 )
+from modulos.db.dataframes import medicos_df
+from modulos.db.busqueda import buscar_ids_normalizados
 from modulos.db.utilidades import (
     formatear_rut,
     validar_rut,
@@ -88,18 +89,13 @@ def mostrar_seccion_medicos():
 
         with st.spinner("Cargando lista de médicos..."):
             # Obtener datos
-            data = mostrar_medicos()
+            # Descifrado por columna, en lote
+            df = medicos_df()
         
-            if data:
-                df = pd.DataFrame(data)
-
-                if df.empty:
-                    st.warning("No hay datos para mostrar")
-                    return
-
-                # Crear columna de RUT limpio para búsqueda
+            if not df.empty:
+                # Crear columna de RUT limpio para búsqueda (vectorizado)
                 if "rut" in df.columns:
-                    df["rut_limpio"] = df["rut"].apply(limpiar_rut_med)
+                    df["rut_limpio"] = df["rut"].fillna("").str.replace(r"[^0-9kK]", "", regex=True).str.lower()
 
                 df_filtrado = df.copy()
                 filtros_aplicados = False
@@ -115,12 +111,12 @@ def mostrar_seccion_medicos():
                     filtros_aplicados = True
 
             
-                if filtro_nombre.strip():
-                    df_filtrado = df_filtrado[df_filtrado["nombre"].str.contains(filtro_nombre, case=False, na=False)]
-                    filtros_aplicados = True
-
-                if filtro_apellido.strip():
-                    df_filtrado = df_filtrado[df_filtrado["apellido"].str.contains(filtro_apellido, case=False, na=False)]
+                # Nombre y apellido: prefijo sin tildes, resuelto en SQL con índice
+                ids_nombre = buscar_ids_normalizados(
+                    "medico", prefijos={"nombre": filtro_nombre, "apellido": filtro_apellido}
+                )
+                if ids_nombre is not None:
+                    df_filtrado = df_filtrado[df_filtrado["id"].isin(ids_nombre)]
                     filtros_aplicados = True
 
                 if filtro_rut.strip():
@@ -259,13 +255,8 @@ def mostrar_seccion_medicos():
     with tab_actualizar:
         st.subheader("Actualizar Médico")
         
-        data = mostrar_medicos()
-        if data:
-            df = pd.DataFrame(data)
-            cols_lower = []
-            for c in df.columns:
-                cols_lower.append(c.lower())
-            df.columns = cols_lower
+        df = medicos_df()
+        if not df.empty:
             
             # Filtro por ID
             filtro_id = st.number_input(
@@ -395,12 +386,8 @@ def mostrar_seccion_medicos():
 
     # Tab Eliminar
     with tab_eliminar:
-        data = mostrar_medicos()
-        if data:
-            df = pd.DataFrame(data)
-
-            # Normalizar columnas
-            df.columns = [c.lower() for c in df.columns]
+        df = medicos_df()
+        if not df.empty:
 
         
             filtro_id = st.number_input(
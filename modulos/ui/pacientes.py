@@ -1,16 +1,26 @@
 import streamlit as st
 import pandas as pd
+import io
 import re
 import time
-from datetime import date, datetime
+from datetime import date
 from modulos.db.paciente import (
     agregar_paciente,
     mostrar_pacientes,
+    pagina_pacientes,
+    buscar_pacientes,
+    nacionalidades_pacientes,
     eliminar_paciente_por_rut,
     actualizar_paciente,
     eliminar_paciente
 )
+from modulos.db.importacion import importar_pacientes_csv, COLUMNAS_OBLIGATORIAS_PACIENTE
+from modulos.db.registro import a_diccionarios
+from modulos.db.busqueda import buscar_registros
+from modulos.ui.common import paginar
+from modulos.ui.filtros import edades, limpiar_ruts
 from modulos.db.utilidades import (
+    normalizar_texto,
     formatear_rut,
     validar_rut,
     validar_email,
@@ -54,16 +64,6 @@ def limpiar_rut(rut_valor):
     rut_limpio = re.sub(r"[^0-9kK]", "", rut_texto)
     return rut_limpio.lower()
 
-def calcular_edad(fecha_nacimiento):
-    """Calcula la edad a partir de la fecha de nacimiento."""
-    if pd.isna(fecha_nacimiento):
-        return None
-    if isinstance(fecha_nacimiento, str):
-        fecha_nacimiento = datetime.strptime(fecha_nacimiento, "%Y-%m-%d").date()
-    hoy = date.today()
-    edad = hoy.year - fecha_nacimiento.year - ((hoy.month, hoy.day) < (fecha_nacimiento.month, fecha_nacimiento.day))
-    return edad
-
 def mostrar_seccion_pacientes():
     st.header("Pacientes")
     tab_listar, tab_crear, tab_actualizar, tab_eliminar = st.tabs(
@@ -74,11 +74,7 @@ def mostrar_seccion_pacientes():
     with tab_listar:
         st.subheader("Lista de Pacientes")
         
-        data = mostrar_pacientes()
-        if data:
-            df = pd.DataFrame(data)
-            df.columns = [c.lower() for c in df.columns]
-            
+        if buscar_registros("paciente", columnas=["id"], limite=1):
             # Búsqueda avanzada
             st.markdown("### 🔍 Búsqueda Avanzada")
             with st.expander("Filtros de búsqueda", expanded=True):
@@ -125,9 +121,7 @@ def mostrar_seccion_pacientes():
                 
                 with col6:
                     # Definir filtro de nacionalidad
-                    nac_unicas = ["Todas"]
-                    if "nacionalidad" in df.columns:
-                        nac_unicas = ["Todas"] + sorted(df["nacionalidad"].dropna().unique().tolist())
+                    nac_unicas = ["Todas"] + nacionalidades_pacientes()
                     filtro_nacionalidad = st.selectbox(
                         "Nacionalidad",
                         nac_unicas,
@@ -148,39 +142,48 @@ def mostrar_seccion_pacientes():
                         key="pac_list_filtro_edad"
                     )
             
-            # Crear una copia del DataFrame para aplicar filtros
-            df_filtrado = df.copy()
-            
-            # Aplicar filtros
-            if "rut" in df_filtrado.columns:
-                df_filtrado["rut_limpio"] = df_filtrado["rut"].apply(limpiar_rut)
+            # Filtros sobre columnas no cifradas: en SQL. Nombre y apellido
+            # por prefijo sin tildes sobre las columnas _norm (con índice)
+            opciones = {
+                "filtros": {
+                    "id": filtro_id or None,
+                    "genero": None if filtro_genero == "Todos" else filtro_genero,
+                    "nacionalidad": None if filtro_nacionalidad == "Todas" else filtro_nacionalidad,
+                    "sistema_salud": None if filtro_sistema == "Todos" else filtro_sistema,
+                },
+                "prefijo": {
+                    "nombre_norm": normalizar_texto((filtro_nombre or "").strip()),
+                    "apellido_norm": normalizar_texto((filtro_apellido or "").strip()),
+                },
+            }
             
-            # Filtro por ID
-            if filtro_id > 0:
-                df_filtrado = df_filtrado[df_filtrado["id"] == filtro_id]
+            if (filtro_rut and filtro_rut.strip()) or filtro_edad != "Todos":
+                # RUT y fecha de nacimiento están cifrados: hay que descifrar
+                # todos los pacientes que cumplen los demás filtros
+                data = buscar_pacientes(**opciones)
+            else:
+                # Una página a la vez, por cursor (id)
+                data = paginar(
+                    "pac_pagina",
+                    lambda tamano, cursor: pagina_pacientes(tamano, cursor, **opciones),
+                    filtros=opciones,
+                )
             
-            if filtro_nombre and filtro_nombre.strip():
-                df_filtrado = df_filtrado[df_filtrado["nombre"].str.contains(filtro_nombre, case=False, na=False)]
+            # Se muestran todos los campos: descifrar en lote
+            df_filtrado = pd.DataFrame(a_diccionarios(data))
+            df_filtrado.columns = [c.lower() for c in df_filtrado.columns]
             
-            if filtro_apellido and filtro_apellido.strip():
-                df_filtrado = df_filtrado[df_filtrado["apellido"].str.contains(filtro_apellido, case=False, na=False)]
+            # Aplicar filtros que requieren los datos descifrados (vectorizados)
+            if "rut" in df_filtrado.columns:
+                df_filtrado["rut_limpio"] = limpiar_ruts(df_filtrado["rut"])
             
             if filtro_rut and filtro_rut.strip():
                 filtro_rut_limpio = limpiar_rut(filtro_rut)
                 if "rut_limpio" in df_filtrado.columns:
-                    df_filtrado = df_filtrado[df_filtrado["rut_limpio"].str.contains(filtro_rut_limpio, na=False)]
-            
-            if filtro_genero != "Todos":
-                df_filtrado = df_filtrado[df_filtrado["genero"] == filtro_genero]
-            
-            if "nacionalidad" in df_filtrado.columns and filtro_nacionalidad != "Todas":
-                df_filtrado = df_filtrado[df_filtrado["nacionalidad"] == filtro_nacionalidad]
-            
-            if "sistema_salud" in df_filtrado.columns and filtro_sistema != "Todos":
-                df_filtrado = df_filtrado[df_filtrado["sistema_salud"] == filtro_sistema]
+                    df_filtrado = df_filtrado[df_filtrado["rut_limpio"].str.contains(filtro_rut_limpio, regex=False, na=False)]
             
             if filtro_edad != "Todos" and "fecha_nacimiento" in df_filtrado.columns:
-                df_filtrado["edad"] = df_filtrado["fecha_nacimiento"].apply(calcular_edad)
+                df_filtrado["edad"] = edades(df_filtrado["fecha_nacimiento"])
                 if filtro_edad == "Menores de 18":
                     df_filtrado = df_filtrado[df_filtrado["edad"] < 18]
                 else:
@@ -190,13 +193,8 @@ def mostrar_seccion_pacientes():
                 # Agregar badges visuales
                 if "fecha_nacimiento" in df_filtrado.columns:
                     if "edad" not in df_filtrado.columns:
-                        df_filtrado["edad"] = df_filtrado["fecha_nacimiento"].apply(calcular_edad)
-                    def _es_menor(x):
-                        if x and x < 18:
-                            return "Sí"
-                        else:
-                            return "No"
-                    df_filtrado["👶 Menor"] = df_filtrado["edad"].apply(_es_menor)
+                        df_filtrado["edad"] = edades(df_filtrado["fecha_nacimiento"])
+                    df_filtrado["👶 Menor"] = (df_filtrado["edad"] < 18).map({True: "Sí", False: "No"})
                 
                 # Resultados
                 st.markdown(f"### 📋 Resultados ({len(df_filtrado)} pacientes encontrados)")
@@ -410,6 +408,41 @@ def mostrar_seccion_pacientes():
                 else:
                     st.error(msg)
 
+        # Importación masiva: el archivo se procesa por bloques
+        with st.expander("📥 Importar pacientes desde CSV"):
+            st.caption(
+                "Encabezado obligatorio: " + ", ".join(COLUMNAS_OBLIGATORIAS_PACIENTE)
+                + " (fecha en formato AAAA-MM-DD). Opcionales: nombre_emergencia, "
+                "apellido_emergencia y telefono_emergencia (obligatorias para menores de edad)."
+            )
+            archivo_csv = st.file_uploader("Archivo CSV", type=["csv"], key="pac_importar_csv")
+            if archivo_csv is not None and st.button("Importar", key="pac_importar_btn"):
+                barra = st.progress(0.0, text="Importando...")
+                total_bytes = max(1, archivo_csv.size)
+                texto = io.TextIOWrapper(archivo_csv, encoding="utf-8-sig", newline="")
+                rechazos = io.StringIO()
+
+                def _avance(resumen):
+                    barra.progress(
+                        min(1.0, archivo_csv.tell() / total_bytes),
+                        text=f"{resumen['leidas']} fila(s) leídas, {resumen['insertadas']} importada(s)"
+                    )
+
+                ok, msg, resumen = importar_pacientes_csv(texto, rechazos, al_avanzar=_avance)
+                barra.empty()
+                if ok:
+                    st.success(msg)
+                else:
+                    st.error(msg)
+                if resumen['rechazadas']:
+                    st.download_button(
+                        "Descargar filas rechazadas",
+                        rechazos.getvalue().encode("utf-8"),
+                        file_name="pacientes_rechazados.csv",
+                        mime="text/csv",
+                        key="pac_importar_rechazos"
+                    )
+
     # Tab Actualizar
     with tab_actualizar:
         st.subheader("Actualizar Paciente")
@@ -425,7 +458,7 @@ def mostrar_seccion_pacientes():
         registros = mostrar_pacientes()
         if registros:
             registros_normalizados = []
-            for registro in registros:
+            for registro in a_diccionarios(registros):
                 registro_min = {}
                 for k, v in registro.items():
                     llave_min = k.lower()
@@ -630,7 +663,7 @@ def mostrar_seccion_pacientes():
         data = mostrar_pacientes()
 
         if data:
-            df = pd.DataFrame(data)
+            df = pd.DataFrame(a_diccionarios(data))
             df.columns = [c.lower() for c in df.columns]
 
             # Filtro por ID
@@ -1,27 +1,19 @@
 import streamlit as st
-import pandas as pd
-from modulos.db.tratamiento import agregar_tratamiento, obtener_tratamientos
-from modulos.db.diagnostico import obtener_diagnosticos
+from modulos.db.tratamiento import agregar_tratamiento
+from modulos.db.diagnostico import obtener_diagnosticos, descripciones_diagnosticos
+from modulos.db.busqueda import buscar_registros
+from modulos.db.dataframes import tratamientos_df
+from modulos.ui.common import mostrar_total, columnas_fecha
+from modulos.ui.filtros import filtrar, LIMITE_LISTADO
 
 def mostrar_seccion_tratamientos():
     st.header("Tratamientos")
     tab_listar, tab_crear = st.tabs(["📋 Listar", "➕ Crear"])
     with tab_listar:
         st.subheader("Lista de Tratamientos")
-        datos = obtener_tratamientos()
-        if not datos:
+        if not buscar_registros("tratamiento", columnas=["id"], limite=1):
             st.info("No hay tratamientos registrados.")
         else:
-            df = pd.DataFrame(datos)
-            # Asignar nombres de columnas coherentes con el SELECT en obtener_tratamientos
-            df.columns = [
-                "ID",
-                "Tratamiento",
-                "Fecha Inicio",
-                "Fecha Término",
-                "Diagnóstico",
-            ]
-
             # Filtros sencillos
             st.markdown("### 🔍 Filtros")
             col_f1, col_f2, col_f3 = st.columns([3, 2, 2])
@@ -32,54 +24,32 @@ def mostrar_seccion_tratamientos():
                     placeholder="Tratamiento o Diagnóstico"
                 )
             with col_f2:
-                valores_diag = []
-                for x in df["Diagnóstico"].dropna().unique().tolist():
-                    valores_diag.append(x)
-                valores_diag = sorted(valores_diag)
-                diag_opts = ["Todos"]
-                for v in valores_diag:
-                    diag_opts.append(v)
+                diag_opts = ["Todos"] + descripciones_diagnosticos()
                 filtro_diag = st.selectbox("Diagnóstico", diag_opts, key="trat_list_diag")
             with col_f3:
                 desde = st.date_input("Desde (inicio)", value=None, key="trat_list_desde")
                 hasta = st.date_input("Hasta (inicio)", value=None, key="trat_list_hasta")
 
-            df_filtrado = df.copy()
-
-            if q:
-                qn = q.strip().lower()
-                df_filtrado = df_filtrado[
-                    df_filtrado["Tratamiento"].astype(str).str.lower().str.contains(qn)
-                    | df_filtrado["Diagnóstico"].astype(str).str.lower().str.contains(qn)
-                ]
-
-            if filtro_diag != "Todos":
-                df_filtrado = df_filtrado[df_filtrado["Diagnóstico"] == filtro_diag]
-
-            # Filtro por rango de fechas (Fecha Inicio)
-            if desde or hasta:
-                def _to_date(s):
-                    try:
-                        return pd.to_datetime(s).date()
-                    except Exception:
-                        return None
-                fi_list = []
-                for val in df_filtrado["Fecha Inicio"]:
-                    fi_list.append(_to_date(val))
-                mask_list = []
-                for d in fi_list:
-                    ok = True
-                    if desde:
-                        if d is None or d < desde:
-                            ok = False
-                    if hasta:
-                        if d is None or d > hasta:
-                            ok = False
-                    mask_list.append(ok)
-                df_filtrado = df_filtrado[pd.Series(mask_list)]
+            # Tratamiento por texto completo (FTS5); el diagnóstico viene del JOIN
+            df_filtrado = filtrar(
+                tratamientos_df, "tratamiento", q, ["diagnostico"],
+                iguales={"diagnostico": filtro_diag},
+                fechas={"fecha_inicio": (desde, hasta)},
+            )
+            # Nombres de columnas en el orden de COLUMNAS_TRATAMIENTOS
+            df_filtrado.columns = [
+                "ID",
+                "Tratamiento",
+                "Fecha Inicio",
+                "Fecha Término",
+                "Diagnóstico",
+            ]
 
-            st.info(f"Total: {len(df_filtrado)} registro(s)")
-            st.dataframe(df_filtrado, hide_index=True, width="stretch")
+            mostrar_total(df_filtrado, LIMITE_LISTADO)
+            st.dataframe(
+                df_filtrado, hide_index=True, width="stretch",
+                column_config=columnas_fecha("Fecha Inicio", "Fecha Término")
+            )
 
     with tab_crear:
         st.subheader("Crear Tratamiento")
@@ -90,7 +60,7 @@ def mostrar_seccion_tratamientos():
             fecha_termino = st.date_input("Fecha término")
         
         with col2:
-            diag_rows = obtener_diagnosticos()
+            diag_rows = obtener_diagnosticos(["id", "fecha"])
             diag_options = []
             if diag_rows:
                 for d in diag_rows:
@@ -0,0 +1,92 @@
+"""
+Script para revisar los planes de las consultas que emite modulos/db
+Ejecutar desde la raíz del proyecto:
+    python scripts/asesor_indices.py [--todas]
+
+Ejecuta una carga representativa (listados, búsquedas y las verificaciones de
+eliminación, estas últimas dentro de una transacción que se revierte), captura
+el SQL real y reporta los recorridos completos de tabla (SCAN) y los
+ordenamientos con B-tree temporal según EXPLAIN QUERY PLAN.
+No modifica la base de datos.
+"""
+import os
+import sys
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from modulos.db.db import transaccion
+from modulos.db.asesor_indices import capturar_consultas, analizar_consultas, informe
+from modulos.db import atencion, cita, diagnostico, especialidad, historial, horario
+from modulos.db import medico, paciente, tratamiento
+
+
+def _primer_id(filas, clave=0):
+    for fila in filas:
+        return fila[clave]
+    return None
+
+
+def carga_representativa():
+    """Llama a las funciones de lectura y de eliminación más usadas por la interfaz."""
+    pacientes = paciente.mostrar_pacientes()
+    medicos = medico.mostrar_medicos()
+    citas = cita.mostrar_citas()
+    especialidad.mostrar_especialidades()
+    diagnosticos = diagnostico.obtener_diagnosticos()
+    tratamientos = tratamiento.obtener_tratamientos()
+    historiales = historial.obtener_historiales()
+    atencion.obtener_atenciones()
+
+    # Listados paginados: primera página y la siguiente (condición del cursor)
+    for pagina in (cita.pagina_citas, cita.pagina_citas_detalle, paciente.pagina_pacientes,
+                   historial.pagina_historiales):
+        _, siguiente = pagina(1)
+        if siguiente is not None:
+            pagina(1, siguiente)
+
+    id_paciente = _primer_id(pacientes, 'id')
+    id_medico = _primer_id(medicos, 'id')
+    if id_paciente is not None:
+        cita.buscar_citas(id_paciente=id_paciente)
+    if id_medico is not None:
+        cita.buscar_citas(id_medico=id_medico)
+        medico.buscar_medicos(id_medico=id_medico)
+        horario.obtener_horarios_medico(id_medico)
+    horario.medicos_disponibles(0, "10:00")
+
+    # Las eliminaciones ejecutan sus COUNT de dependencias; nada se guarda
+    with transaccion() as tx:
+        id_diagnostico = _primer_id(diagnosticos)
+        id_tratamiento = _primer_id(tratamientos)
+        id_historial = _primer_id(historiales)
+        id_cita = _primer_id(citas, 'id')
+        if id_diagnostico is not None:
+            diagnostico.eliminar_diagnostico(id_diagnostico)
+        if id_tratamiento is not None:
+            tratamiento.eliminar_tratamiento(id_tratamiento)
+        if id_historial is not None:
+            historial.eliminar_historial(id_historial)
+        if id_cita is not None:
+            cita.eliminar_cita(id_cita)
+        tx.revertir()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reporta SCAN y B-tree temporales del SQL de modulos/db.")
+    parser.add_argument("--todas", action="store_true", help="Muestra también las consultas sin problemas")
+    args = parser.parse_args()
+
+    with capturar_consultas() as consultas:
+        carga_representativa()
+
+    print("=" * 60)
+    print("ASESOR DE ÍNDICES")
+    print("=" * 60)
+    print(informe(analizar_consultas(consultas), solo_problemas=not args.todas))
+
+
+if __name__ == "__main__":
+    main()
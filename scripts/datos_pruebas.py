@@ -18,15 +18,15 @@ if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
 from modulos.db.especialidad import agregar_especialidad, mostrar_especialidades
-from modulos.db.paciente import agregar_paciente, mostrar_pacientes
-from modulos.db.medico import crear_medico, mostrar_medicos
-from modulos.db.cita import agregar_cita, mostrar_citas
+from modulos.db.paciente import agregar_paciente, iterar_pacientes
+from modulos.db.medico import crear_medico, iterar_medicos
+from modulos.db.cita import agregar_citas_lote
 from modulos.db.utilidades import calcular_dv, formatear_rut, normalizar_texto
-from modulos.db.diagnostico import agregar_diagnostico, obtener_diagnosticos
-from modulos.db.tratamiento import agregar_tratamiento, obtener_tratamientos
-from modulos.db.historial import agregar_historial, obtener_historiales
+from modulos.db.diagnostico import agregar_diagnostico, iterar_diagnosticos
+from modulos.db.tratamiento import agregar_tratamiento, iterar_tratamientos
+from modulos.db.historial import agregar_historiales_lote
 from modulos.db.atencion import agregar_atencion, obtener_atenciones
-from modulos.db.db import obtener_fernet
+from modulos.db.db import obtener_fernet, transaccion
 # Horarios estructurados removidos temporalmente
 
 
@@ -93,13 +93,15 @@ def main():
         especialidades += [f"Especialidad Extra {i+1}" for i in range(faltan)]
 
     print("Insertando especialidades...")
-    for nombre in especialidades:
-        ok, msg = agregar_especialidad(nombre, f"Descripción de {nombre}")
-        resultados["especialidad"].append((ok, msg))
-        print(f"  {nombre}: {ok} - {msg}")
+    # Cada sección se inserta en una sola transacción: un solo commit por sección
+    with transaccion():
+        for nombre in especialidades:
+            ok, msg = agregar_especialidad(nombre, f"Descripción de {nombre}")
+            resultados["especialidad"].append((ok, msg))
+            print(f"  {nombre}: {ok} - {msg}")
 
     # Obtener IDs de especialidades
-    espe_rows = mostrar_especialidades()
+    espe_rows = mostrar_especialidades(["id", "nombre"])
     espe_map = {r['nombre']: r['id'] for r in espe_rows}
     espe_ids = [r['id'] for r in espe_rows]
 
@@ -122,62 +124,63 @@ def main():
                       "Ecuador", "Venezuela", "México", "España", "Estados Unidos", "Canadá", "Alemania", "Francia"]
 
     base_rut = 20000000
-    for i in range(N):
-        es_mujer = (i % 2 == 1)
-        nom = nombres_f[i % len(nombres_f)] if es_mujer else nombres_m[i % len(nombres_m)]
-        ape = apellidos[i % len(apellidos)]
+    with transaccion():
+        for i in range(N):
+            es_mujer = (i % 2 == 1)
+            nom = nombres_f[i % len(nombres_f)] if es_mujer else nombres_m[i % len(nombres_m)]
+            ape = apellidos[i % len(apellidos)]
 
-        # Definir fecha nacimiento: cada 5º registro será menor de edad
-        if i % 5 == 0:
-            # Menor entre 12 y 17 años, determinista
-            anio = (date.today().year - (12 + (i % 6)))
-        else:
-            # Adulto entre 20 y 60 años
-            anio = (date.today().year - (20 + (i % 41)))
-        mes = (i % 12) + 1
-        dia = ((i * 3) % 28) + 1
-        fecha_nac = date(anio, mes, dia)
+            # Definir fecha nacimiento: cada 5º registro será menor de edad
+            if i % 5 == 0:
+                # Menor entre 12 y 17 años, determinista
+                anio = (date.today().year - (12 + (i % 6)))
+            else:
+                # Adulto entre 20 y 60 años
+                anio = (date.today().year - (20 + (i % 41)))
+            mes = (i % 12) + 1
+            dia = ((i * 3) % 28) + 1
+            fecha_nac = date(anio, mes, dia)
 
-        # Contacto de emergencia si es menor
-        nom_emerg = ape_emerg = tel_emerg = None
-        hoy = date.today()
-        edad = (hoy - fecha_nac).days // 365
-        if edad < 18:
-            nom_emerg = "Contacto"
-            ape_emerg = ape
-            tel_emerg = f"+569{88000000 + i}"
+            # Contacto de emergencia si es menor
+            nom_emerg = ape_emerg = tel_emerg = None
+            hoy = date.today()
+            edad = (hoy - fecha_nac).days // 365
+            if edad < 18:
+                nom_emerg = "Contacto"
+                ape_emerg = ape
+                tel_emerg = f"+569{88000000 + i}"
 
-        num = base_rut + i
-        rut = gen_rut(num)
-        correo = f"{normalizar_texto(nom)}.{normalizar_texto(ape)}{i}@ejemplo.com"
-        telefono = f"+569{70000000 + i}"
-        genero = "Femenino" if es_mujer else "Masculino"
-        direccion = f"Calle {i+1} #123, Ciudad"
-        sistema_salud = "Fonasa" if i % 2 == 0 else "Isapre"
-        nacionalidad = nacionalidades[i % len(nacionalidades)]
+            num = base_rut + i
+            rut = gen_rut(num)
+            correo = f"{normalizar_texto(nom)}.{normalizar_texto(ape)}{i}@ejemplo.com"
+            telefono = f"+569{70000000 + i}"
+            genero = "Femenino" if es_mujer else "Masculino"
+            direccion = f"Calle {i+1} #123, Ciudad"
+            sistema_salud = "Fonasa" if i % 2 == 0 else "Isapre"
+            nacionalidad = nacionalidades[i % len(nacionalidades)]
 
-        ok, msg = agregar_paciente(
-            rut,
-            nom,
-            ape,
-            fecha_nac,
-            correo,
-            telefono,
-            genero,
-            direccion,
-            sistema_salud,
-            nacionalidad,
-            nom_emerg,
-            ape_emerg,
-            tel_emerg
-        )
-        resultados["paciente"].append((ok, msg, rut))
-        info_menor = f" [MENOR: {edad} años, Contacto: {nom_emerg} {ape_emerg}]" if nom_emerg else ""
-        print(f"  {nom} {ape}: {ok} - {msg} (RUT: {rut}){info_menor}")
+            ok, msg = agregar_paciente(
+                rut,
+                nom,
+                ape,
+                fecha_nac,
+                correo,
+                telefono,
+                genero,
+                direccion,
+                sistema_salud,
+                nacionalidad,
+                nom_emerg,
+                ape_emerg,
+                tel_emerg
+            )
+            resultados["paciente"].append((ok, msg, rut))
+            info_menor = f" [MENOR: {edad} años, Contacto: {nom_emerg} {ape_emerg}]" if nom_emerg else ""
+            print(f"  {nom} {ape}: {ok} - {msg} (RUT: {rut}){info_menor}")
 
     # Obtener IDs de pacientes
-    pacientes_rows = mostrar_pacientes()
-    pacientes_ids = [r['id'] for r in pacientes_rows]
+    # Solo los IDs, leídos por bloques (sin listas intermedias de filas)
+    pacientes_ids = [r['id'] for r in iterar_pacientes(["id"])]
 
     # 3) Médicos
     print("\nInsertando médicos...")
@@ -203,19 +206,19 @@ def main():
     ]
 
     base_rut_med = 30000000
-    for i, (nom, ape) in enumerate(med_nombres[:N]):
-        num = base_rut_med + i
-        rut = gen_rut(num)
-        correo = f"{normalizar_texto(nom)}.{normalizar_texto(ape)}@hospital.com"
-        telefono = f"+569{61000000 + i}"
-        # Usar IDs reales desde la base
-        id_esp = espe_ids[i % len(espe_ids)] if espe_ids else 1
-        ok, msg = crear_medico(rut, nom, ape, correo, telefono, id_esp)
-        resultados["medico"].append((ok, msg, rut))
-        print(f"  Dr/a {nom} {ape}: {ok} - {msg} (RUT: {rut}, EspID: {id_esp})")
+    with transaccion():
+        for i, (nom, ape) in enumerate(med_nombres[:N]):
+            num = base_rut_med + i
+            rut = gen_rut(num)
+            correo = f"{normalizar_texto(nom)}.{normalizar_texto(ape)}@hospital.com"
+            telefono = f"+569{61000000 + i}"
+            # Usar IDs reales desde la base
+            id_esp = espe_ids[i % len(espe_ids)] if espe_ids else 1
+            ok, msg = crear_medico(rut, nom, ape, correo, telefono, id_esp)
+            resultados["medico"].append((ok, msg, rut))
+            print(f"  Dr/a {nom} {ape}: {ok} - {msg} (RUT: {rut}, EspID: {id_esp})")
 
-    med_rows = mostrar_medicos()
-    med_ids = [r['id'] for r in med_rows]
+    med_ids = [r['id'] for r in iterar_medicos(["id"])]
 
     # (Horarios estructurados omitidos)
 
@@ -225,26 +228,18 @@ def main():
                "Primera vez", "Chequeo preventivo", "Evaluación prequirúrgica", "Control postoperatorio",
                "Certificado médico", "Receta", "Vacunación", "Procedimiento menor"]
     fecha_base = date.today()
-    cita_ids = []  # Almacenar IDs de citas para usar en diagnósticos
+    citas = []
     for i in range(N):
         fecha = fecha_base + timedelta(days=i)
         hora = time(hour=9 + (i % 8), minute=30)
         motivo = motivos[i % len(motivos)]
         id_paciente = pacientes_ids[i % len(pacientes_ids)] if pacientes_ids else 1
         id_medico = med_ids[i % len(med_ids)] if med_ids else 1
-        ok, msg = agregar_cita(fecha, hora, motivo, id_paciente, id_medico)
-        resultados["cita"].append((ok, msg))
-        # Obtener el ID de la cita recién insertada
-        if ok:
-            citas_actuales = mostrar_citas()
-            for cita in citas_actuales:
-                if (cita['fecha'] == str(fecha) and 
-                    cita['hora'] == str(hora) and 
-                    cita['id_paciente'] == id_paciente and 
-                    cita['id_medico'] == id_medico):
-                    cita_ids.append(cita['id'])
-                    break
-        print(f"  Cita {i+1}: {ok} - {msg} (PacienteID: {id_paciente}, MedicoID: {id_medico})")
+        citas.append((fecha, hora, motivo, id_paciente, id_medico))
+    # Una sola validación de referencias y una sola transacción; los IDs vuelven en orden
+    ok, msg, cita_ids = agregar_citas_lote(citas)
+    resultados["cita"].append((ok, msg))
+    print(f"  Citas: {ok} - {msg}")
         
     # 5) Diagnósticos
     print("\nInsertando diagnósticos...")
@@ -270,18 +265,18 @@ def main():
     ]
     
     diag_ids = []
-    for i, desc in enumerate(diagnosticos[:N]):
-        if i < len(cita_ids):
-            fecha = fecha_base + timedelta(days=i)
-            id_medico = med_ids[i % len(med_ids)]
-            id_cita = cita_ids[i]
-            ok, msg = agregar_diagnostico(fecha, desc, id_medico, id_cita)
-            resultados["diagnostico"].append((ok, msg))
-            print(f"  Diagnóstico {i+1}: {ok} - {msg}")
+    with transaccion():
+        for i, desc in enumerate(diagnosticos[:N]):
+            if i < len(cita_ids):
+                fecha = fecha_base + timedelta(days=i)
+                id_medico = med_ids[i % len(med_ids)]
+                id_cita = cita_ids[i]
+                ok, msg = agregar_diagnostico(fecha, desc, id_medico, id_cita)
+                resultados["diagnostico"].append((ok, msg))
+                print(f"  Diagnóstico {i+1}: {ok} - {msg}")
     
     # Obtener IDs de diagnósticos creados
-    diag_rows = obtener_diagnosticos()
-    diag_ids = [d[0] for d in diag_rows] if diag_rows else []
+    diag_ids = [d['id'] for d in iterar_diagnosticos(["id"])]
 
     # 6) Tratamientos
     print("\nInsertando tratamientos...")
@@ -325,18 +320,18 @@ def main():
     ]
     
     trat_ids = []
-    for i, desc in enumerate(tratamientos[:N]):
-        if i < len(diag_ids):
-            fecha_inicio = fecha_base
-            fecha_termino = fecha_base + timedelta(days=30)
-            id_diagnostico = diag_ids[i]
-            ok, msg = agregar_tratamiento(fecha_inicio, fecha_termino, desc, id_diagnostico)
-            resultados["tratamiento"].append((ok, msg))
-            print(f"  Tratamiento {i+1}: {ok} - {msg}")
+    with transaccion():
+        for i, desc in enumerate(tratamientos[:N]):
+            if i < len(diag_ids):
+                fecha_inicio = fecha_base
+                fecha_termino = fecha_base + timedelta(days=30)
+                id_diagnostico = diag_ids[i]
+                ok, msg = agregar_tratamiento(fecha_inicio, fecha_termino, desc, id_diagnostico)
+                resultados["tratamiento"].append((ok, msg))
+                print(f"  Tratamiento {i+1}: {ok} - {msg}")
     
     # Obtener IDs de tratamientos creados
-    trat_rows = obtener_tratamientos()
-    trat_ids = [t[0] for t in trat_rows] if trat_rows else []
+    trat_ids = [t['id'] for t in iterar_tratamientos(["id"])]
 
     # 7) Historiales
     print("\nInsertando historiales...")
@@ -379,37 +374,31 @@ def main():
         "Infección oportunista tratada", "Profilaxis antimicrobiana"
     ]
     
-    hist_ids = []
+    historiales = []
     for i, obs in enumerate(observaciones[:N]):
         if i < len(diag_ids) and i < len(trat_ids) and i < len(pacientes_ids) and i < len(cita_ids):
             fecha_registro = (datetime.now() - timedelta(days=i)).date()
-            id_diagnostico = diag_ids[i]
-            id_tratamiento = trat_ids[i]
             alergias = "Sin alergias conocidas"
             resultado = "Pendiente"
-            id_paciente = pacientes_ids[i]
-            id_cita = cita_ids[i]
-            ok, msg = agregar_historial(
-                fecha_registro, id_diagnostico, id_tratamiento,
-                obs, alergias, resultado, id_paciente, id_cita
-            )
-            resultados["historial"].append((ok, msg))
-            print(f"  Historial {i+1}: {ok} - {msg}")
-    
-    # Obtener IDs de historiales creados
-    hist_rows = obtener_historiales()
-    hist_ids = [h[0] for h in hist_rows] if hist_rows else []
+            historiales.append((
+                fecha_registro, diag_ids[i], trat_ids[i],
+                obs, alergias, resultado, pacientes_ids[i], cita_ids[i]
+            ))
+    ok, msg, hist_ids = agregar_historiales_lote(historiales)
+    resultados["historial"].append((ok, msg))
+    print(f"  Historiales: {ok} - {msg}")
 
     # 8) Atenciones
     print("\nInsertando atenciones...")
-    for i in range(N):
-        if i < len(diag_ids) and i < len(hist_ids):
-            descripcion = f"Atención de seguimiento #{i+1}"
-            id_diagnostico = diag_ids[i]
-            id_historial = hist_ids[i]
-            ok, msg = agregar_atencion(id_diagnostico, id_historial, descripcion)
-            resultados["atencion"].append((ok, msg))
-            print(f"  Atención {i+1}: {ok} - {msg}")
+    with transaccion():
+        for i in range(N):
+            if i < len(diag_ids) and i < len(hist_ids):
+                descripcion = f"Atención de seguimiento #{i+1}"
+                id_diagnostico = diag_ids[i]
+                id_historial = hist_ids[i]
+                ok, msg = agregar_atencion(id_diagnostico, id_historial, descripcion)
+                resultados["atencion"].append((ok, msg))
+                print(f"  Atención {i+1}: {ok} - {msg}")
 
     # Resumen final
     print("\n" + "="*60)
@@ -0,0 +1,305 @@
+"""
+Script para generar grandes volúmenes de datos sintéticos (pruebas de escala)
+Ejecutar desde la raíz del proyecto:
+    python scripts/generar_datos_masivos.py [--pacientes 100000] [--citas 1000000] [--semilla 42]
+
+Ejemplo a escala de producción:
+    python scripts/generar_datos_masivos.py --pacientes 1000000 --citas 10000000 --modo procesos
+
+No es interactivo. Con la misma semilla y las mismas opciones (incluida
+--hasta) genera los mismos datos; solo cambian los BLOB cifrados, porque cada
+uno lleva su propio nonce. La carga de citas por médico sigue una distribución
+de Zipf (--zipf-medicos), y la de pacientes también si se indica --zipf-pacientes.
+
+Los campos sensibles se cifran con cifrar_lote (en paralelo según --modo y
+--workers), los índices ciegos se calculan con indice_ciego y las columnas
+_norm con normalizar_texto. Especialidades, pacientes y citas usan los mismos
+INSERT que la aplicación (SQL_INSERTAR_* y fila_* de modulos/db). Todo se
+inserta con executemany, con una transacción por cada --lote filas.
+Solo agrega datos; no elimina ni resetea tablas.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from array import array
+from datetime import date, timedelta
+from itertools import accumulate
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import modulos.db.db as base
+from modulos.db.db import abrir_conexion, transaccion, cifrar_lote, indice_ciego
+from modulos.db.cita import SQL_INSERTAR_CITA
+from modulos.db.especialidad import SQL_INSERTAR_ESPECIALIDAD, fila_especialidad
+from modulos.db.paciente import CAMPOS_CIFRADOS_PACIENTE, SQL_INSERTAR_PACIENTE, fila_paciente
+from modulos.db.utilidades import calcular_dv, formatear_rut, normalizar_texto
+
+# Rangos numéricos propios para que los RUT, correos y teléfonos no choquen
+# con los de scripts/datos_pruebas.py (20.000.000, 30.000.000, +56961..., +56970...)
+RUT_BASE_PACIENTE = 40000000
+RUT_BASE_MEDICO = 60000000
+TELEFONO_BASE_PACIENTE = 50000000
+TELEFONO_BASE_MEDICO = 62000000
+
+NOMBRES_M = ["Luis", "Carlos", "Pedro", "Andrés", "Diego", "Mateo", "Benjamín", "Tomás", "Sebastián", "Jorge",
+             "Manuel", "Pablo", "Javier", "Ricardo", "Francisco", "Roberto", "Raúl", "Martín", "Nicolás", "Emilio"]
+NOMBRES_F = ["María", "Ana", "Sofía", "Lucía", "Camila", "Valentina", "Josefa", "Antonia", "Fernanda", "Daniela",
+             "Isabel", "Carmen", "Elena", "Laura", "Patricia", "Carolina", "Andrea", "Mónica", "Teresa", "Rosa"]
+APELLIDOS = ["González", "Fernández", "Soto", "Rojas", "López", "Molina", "Vargas", "Cruz", "Castro", "Vega",
+             "Sánchez", "Torres", "Medina", "Pérez", "Suárez", "Navarro", "Herrera", "Ortega", "Muñoz", "Ramos",
+             "Silva", "Reyes", "Morales", "Jiménez", "Díaz", "Álvarez", "Romero", "Gutiérrez", "Núñez", "Araya"]
+# (nacionalidad, peso): mayoría chilena, como en producción
+NACIONALIDADES = [("Chile", 85), ("Venezuela", 5), ("Perú", 3), ("Colombia", 3), ("Argentina", 2),
+                  ("Bolivia", 1), ("Haití", 1)]
+ESPECIALIDADES = ["Cardiología", "Pediatría", "Neurología", "Dermatología", "Ginecología", "Oftalmología",
+                  "Psiquiatría", "Oncología", "Urología", "Traumatología", "Medicina Interna", "Medicina Familiar",
+                  "Endocrinología", "Gastroenterología", "Neumología", "Otorrinolaringología"]
+MOTIVOS = ["Control", "Urgencia", "Consulta", "Revisión", "Examen", "Seguimiento", "Primera vez",
+           "Chequeo preventivo", "Receta", "Vacunación", "Procedimiento menor"]
+
+# Citas en bloques de 15 minutos entre 08:00 y 17:45
+HORAS_CITA = [f"{8 + m // 60:02d}:{m % 60:02d}:00" for m in range(0, 10 * 60, 15)]
+# Las citas de los últimos días siguen pendientes; las anteriores, realizadas o canceladas
+DIAS_PENDIENTES = 7
+ESTADOS_PASADOS = ["REALIZADA", "CANCELADA"]
+PESOS_ESTADOS_PASADOS = [85, 15]
+
+SQL_INSERTAR_MEDICO = """INSERT INTO medico (rut, nombre, apellido, correo, telefono, id_especialidad, horario,
+                                              rut_hash, correo_hash, telefono_hash, nombre_norm, apellido_norm)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+
+def gen_rut(num):
+    """Genera un RUT válido a partir de la parte numérica (int)."""
+    return formatear_rut(f"{num}{calcular_dv(num)}")
+
+
+def pesos_zipf(n, exponente):
+    """Pesos acumulados de Zipf para n elementos (el k-ésimo pesa 1/k^exponente).
+    Con exponente 0 retorna None: todos pesan lo mismo."""
+    if exponente <= 0:
+        return None
+    return list(accumulate(1.0 / (k ** exponente) for k in range(1, n + 1)))
+
+
+def leer_ids(tabla):
+    """IDs de la tabla en un array compacto (8 bytes por ID)."""
+    ids = array("q")
+    with abrir_conexion() as (_, cursor):
+        cursor.execute(f"SELECT id FROM {tabla} ORDER BY id")
+        while True:
+            bloque = cursor.fetchmany(base.LECTURA_TAMANO_BLOQUE * 20)
+            if not bloque:
+                break
+            ids.extend(fila[0] for fila in bloque)
+    return ids
+
+
+def ultimo_id(tabla):
+    with abrir_conexion() as (_, cursor):
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabla}")
+        return cursor.fetchone()[0]
+
+
+def cifrar_filas(filas, ancho):
+    """Cifra con una sola llamada a cifrar_lote las primeras 'ancho' columnas
+    de cada fila y las devuelve como listas de 'ancho' BLOBs."""
+    cifrados = cifrar_lote(valor for fila in filas for valor in fila[:ancho])
+    return [cifrados[i:i + ancho] for i in range(0, len(cifrados), ancho)]
+
+
+def insertar_en_lotes(etiqueta, sql, total, lote, generar_lote):
+    """
+    Inserta 'total' filas en transacciones de 'lote' filas.
+
+    Args:
+        etiqueta: Nombre de la sección para el avance
+        sql: INSERT con parámetros
+        total: Filas a insertar
+        lote: Filas por transacción
+        generar_lote: Función (desde, cantidad) -> lista de tuplas para sql
+    """
+    inicio = time.perf_counter()
+    hechas = 0
+    while hechas < total:
+        cantidad = min(lote, total - hechas)
+        filas = generar_lote(hechas, cantidad)
+        with transaccion(), abrir_conexion() as (_, cursor):
+            cursor.executemany(sql, filas)
+        hechas += cantidad
+        duracion = time.perf_counter() - inicio
+        print(f"  {etiqueta}: {hechas}/{total} ({hechas / duracion:,.0f} filas/s)", flush=True)
+
+
+def generar_especialidades(cantidad):
+    """Completa hasta 'cantidad' especialidades; retorna sus IDs."""
+    existentes = len(leer_ids("especialidad"))
+    nuevas = [
+        ESPECIALIDADES[i] if i < len(ESPECIALIDADES) else f"Especialidad Extra {i + 1}"
+        for i in range(existentes, cantidad)
+    ]
+    if nuevas:
+        with transaccion(), abrir_conexion() as (_, cursor):
+            cursor.executemany(
+                SQL_INSERTAR_ESPECIALIDAD, [fila_especialidad(nombre, f"Descripción de {nombre}") for nombre in nuevas]
+            )
+        print(f"  especialidades: {len(nuevas)} nueva(s)")
+    return leer_ids("especialidad")
+
+
+def generar_medicos(rng, total, lote, especialidades):
+    primero = ultimo_id("medico") + 1
+
+    def generar_lote(desde, cantidad):
+        planas = []
+        for i in range(desde, desde + cantidad):
+            num = primero + i
+            nombre = rng.choice(NOMBRES_M + NOMBRES_F)
+            apellido = rng.choice(APELLIDOS)
+            rut = gen_rut(RUT_BASE_MEDICO + num)
+            correo = f"{normalizar_texto(nombre)}.{normalizar_texto(apellido)}.{num}@hospital.cl"
+            telefono = f"+569{TELEFONO_BASE_MEDICO + num}"
+            planas.append((rut, correo, telefono, nombre, apellido, rng.choice(especialidades)))
+        return [
+            (rut_c, nombre, apellido, correo_c, telefono_c, id_esp, None,
+             indice_ciego(rut), indice_ciego(correo), indice_ciego(telefono),
+             normalizar_texto(nombre), normalizar_texto(apellido))
+            for (rut_c, correo_c, telefono_c), (rut, correo, telefono, nombre, apellido, id_esp)
+            in zip(cifrar_filas(planas, 3), planas)
+        ]
+
+    insertar_en_lotes("médicos", SQL_INSERTAR_MEDICO, total, lote, generar_lote)
+
+
+def generar_pacientes(rng, total, lote, hasta):
+    primero = ultimo_id("paciente") + 1
+    mayoria_edad = hasta.replace(year=hasta.year - 18, day=min(hasta.day, 28))
+    nacionalidades = [n for n, _ in NACIONALIDADES]
+    pesos_nacionalidad = [p for _, p in NACIONALIDADES]
+
+    def generar_lote(desde, cantidad):
+        # Mismas claves que validar_datos_paciente, para usar fila_paciente
+        lote_datos = []
+        for i in range(desde, desde + cantidad):
+            num = primero + i
+            es_mujer = rng.random() < 0.5
+            nombre = rng.choice(NOMBRES_F if es_mujer else NOMBRES_M)
+            apellido = rng.choice(APELLIDOS)
+            fecha_nacimiento = hasta - timedelta(days=rng.randrange(95 * 365))
+            rut = gen_rut(RUT_BASE_PACIENTE + num)
+            correo = f"{normalizar_texto(nombre)}.{normalizar_texto(apellido)}.{num}@ejemplo.com"
+            # Los menores de edad requieren contacto de emergencia
+            emergencia = (None, None, None)
+            if fecha_nacimiento > mayoria_edad:
+                emergencia = (rng.choice(NOMBRES_M + NOMBRES_F), apellido, f"+569{rng.randrange(80000000, 90000000)}")
+            lote_datos.append({
+                "rut": rut,
+                "nombre": nombre,
+                "apellido": apellido,
+                "fecha_nacimiento": fecha_nacimiento,
+                "correo": correo,
+                "telefono": f"+569{TELEFONO_BASE_PACIENTE + num}",
+                "genero": "Femenino" if es_mujer else "Masculino",
+                "direccion": f"Calle {rng.randrange(1, 5000)} #{rng.randrange(1, 3000)}, Ciudad",
+                "sistema_salud": "Fonasa" if rng.random() < 0.75 else "Isapre",
+                "nacionalidad": rng.choices(nacionalidades, pesos_nacionalidad)[0],
+                "nombre_emergencia": emergencia[0],
+                "apellido_emergencia": emergencia[1],
+                "telefono_emergencia": emergencia[2],
+            })
+        ancho = len(CAMPOS_CIFRADOS_PACIENTE)
+        cifrados = cifrar_lote(datos[campo] for datos in lote_datos for campo in CAMPOS_CIFRADOS_PACIENTE)
+        return [
+            fila_paciente(datos, cifrados[i * ancho:(i + 1) * ancho])
+            for i, datos in enumerate(lote_datos)
+        ]
+
+    insertar_en_lotes("pacientes", SQL_INSERTAR_PACIENTE, total, lote, generar_lote)
+
+
+def generar_citas(rng, total, lote, hasta, dias, zipf_medicos, zipf_pacientes):
+    pacientes = leer_ids("paciente")
+    medicos = leer_ids("medico")
+    if not pacientes or not medicos:
+        print("  citas: se necesitan pacientes y médicos")
+        return
+    # El rango de Zipf se asigna en orden aleatorio (pero fijo por la semilla)
+    # para que la carga no dependa del ID
+    rng.shuffle(medicos)
+    rng.shuffle(pacientes)
+    pesos_medicos = pesos_zipf(len(medicos), zipf_medicos)
+    pesos_pacientes = pesos_zipf(len(pacientes), zipf_pacientes)
+    fechas = [str(hasta - timedelta(days=d)) for d in range(dias)]
+    ultima_pasada = str(hasta - timedelta(days=DIAS_PENDIENTES))
+
+    def generar_lote(desde, cantidad):
+        # Columna por columna con rng.choices: mucho más rápido que fila por fila
+        fechas_lote = rng.choices(fechas, k=cantidad)
+        estados = rng.choices(ESTADOS_PASADOS, PESOS_ESTADOS_PASADOS, k=cantidad)
+        return list(zip(
+            fechas_lote,
+            rng.choices(HORAS_CITA, k=cantidad),
+            [estado if fecha <= ultima_pasada else "PENDIENTE" for fecha, estado in zip(fechas_lote, estados)],
+            rng.choices(MOTIVOS, k=cantidad),
+            rng.choices(pacientes, cum_weights=pesos_pacientes, k=cantidad),
+            rng.choices(medicos, cum_weights=pesos_medicos, k=cantidad),
+        ))
+
+    insertar_en_lotes("citas", SQL_INSERTAR_CITA, total, lote, generar_lote)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos masivos para pruebas de escala.")
+    parser.add_argument("--pacientes", type=int, default=100000, help="Pacientes nuevos")
+    parser.add_argument("--medicos", type=int, default=500, help="Médicos nuevos")
+    parser.add_argument("--especialidades", type=int, default=len(ESPECIALIDADES),
+                        help="Total de especialidades (se completan las que falten)")
+    parser.add_argument("--citas", type=int, default=1000000, help="Citas nuevas")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla del generador aleatorio")
+    parser.add_argument("--zipf-medicos", type=float, default=1.1,
+                        help="Exponente de Zipf para la carga de citas por médico (0 = uniforme)")
+    parser.add_argument("--zipf-pacientes", type=float, default=0.0,
+                        help="Exponente de Zipf para las citas por paciente (0 = uniforme)")
+    parser.add_argument("--hasta", type=date.fromisoformat, default=date.today(),
+                        help="Fecha más reciente de las citas (AAAA-MM-DD)")
+    parser.add_argument("--dias", type=int, default=3 * 365, help="Días hacia atrás que abarcan las citas")
+    parser.add_argument("--lote", type=int, default=50000, help="Filas por transacción")
+    parser.add_argument("--modo", choices=("hilos", "procesos"), default=base.DESCIFRADO_MODO,
+                        help="Pool de cifrado (procesos reparte entre núcleos)")
+    parser.add_argument("--workers", type=int, default=base.DESCIFRADO_WORKERS, help="Workers del pool de cifrado")
+    args = parser.parse_args()
+
+    # El pool se crea en el primer cifrar_lote, así que basta fijarlo antes
+    base.DESCIFRADO_MODO = args.modo
+    base.DESCIFRADO_WORKERS = args.workers
+    rng = random.Random(args.semilla)
+
+    print("=" * 60)
+    print("GENERADOR DE DATOS MASIVOS - SISTEMA HOSPITALARIO")
+    print("=" * 60)
+    inicio = time.perf_counter()
+
+    print("Especialidades...")
+    especialidades = generar_especialidades(args.especialidades)
+    print("Médicos...")
+    generar_medicos(rng, args.medicos, args.lote, especialidades)
+    print("Pacientes...")
+    generar_pacientes(rng, args.pacientes, args.lote, args.hasta)
+    print("Citas...")
+    generar_citas(rng, args.citas, args.lote, args.hasta, args.dias, args.zipf_medicos, args.zipf_pacientes)
+
+    # Estadísticas al día para que el planificador elija bien los índices
+    print("Actualizando estadísticas (ANALYZE)...")
+    with abrir_conexion() as (conexion, cursor):
+        cursor.execute("ANALYZE")
+        conexion.commit()
+
+    print(f"\n✅ Listo en {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Script para importar pacientes desde un archivo CSV
+Ejecutar desde la raíz del proyecto:
+    python scripts/importar_pacientes.py pacientes.csv [--rechazos rechazos.csv] [--bloque 2000]
+
+El CSV debe tener encabezado con las columnas rut, nombre, apellido,
+fecha_nacimiento (AAAA-MM-DD), correo, telefono, genero, direccion,
+sistema_salud y nacionalidad; y opcionalmente nombre_emergencia,
+apellido_emergencia y telefono_emergencia (obligatorias para menores de edad).
+Las filas rechazadas se guardan, con su línea y el motivo, en el archivo de
+rechazos (por defecto <archivo>.rechazos.csv).
+"""
+import os
+import sys
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from modulos.db.importacion import importar_pacientes_csv, IMPORTACION_TAMANO_BLOQUE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa pacientes desde un CSV por bloques.")
+    parser.add_argument("archivo", help="Archivo CSV con encabezado")
+    parser.add_argument("--rechazos", help="CSV donde guardar las filas rechazadas")
+    parser.add_argument("--bloque", type=int, default=IMPORTACION_TAMANO_BLOQUE, help="Filas por bloque")
+    parser.add_argument("--delimitador", default=",", help="Separador de columnas")
+    args = parser.parse_args()
+
+    ruta_rechazos = args.rechazos or f"{os.path.splitext(args.archivo)[0]}.rechazos.csv"
+
+    print("=" * 60)
+    print("IMPORTACIÓN DE PACIENTES")
+    print("=" * 60)
+
+    def avance(resumen):
+        print(
+            f"  {resumen['leidas']} leída(s) | {resumen['insertadas']} importada(s) | "
+            f"{resumen['rechazadas']} rechazada(s)",
+            flush=True
+        )
+
+    # utf-8-sig acepta los CSV exportados desde Excel (con BOM)
+    with open(args.archivo, newline="", encoding="utf-8-sig") as archivo, \
+            open(ruta_rechazos, "w", newline="", encoding="utf-8") as rechazos:
+        ok, msg, resumen = importar_pacientes_csv(
+            archivo, rechazos, tamano_bloque=args.bloque, delimitador=args.delimitador, al_avanzar=avance
+        )
+
+    print(f"\n{'✅' if ok else '❌'} {msg}")
+    if resumen['rechazadas']:
+        print(f"Filas rechazadas en: {ruta_rechazos}")
+    else:
+        os.remove(ruta_rechazos)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
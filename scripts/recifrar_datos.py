@@ -0,0 +1,41 @@
+"""
+Script para migrar los campos cifrados con Fernet al formato versionado (AES-GCM)
+Ejecutar desde la raíz del proyecto:
+    python scripts/recifrar_datos.py [--lote 500] [--pausa 0.05]
+
+Puede ejecutarse con la aplicación en uso: trabaja por lotes cortos y no
+sobrescribe filas modificadas mientras tanto. Es seguro repetirlo.
+"""
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from modulos.db.recifrado import recifrar_tabla, TABLAS_RECIFRADO, TAMANO_LOTE_RECIFRADO
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recifra tokens Fernet al formato AES-GCM.")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE_RECIFRADO, help="Filas por lote")
+    parser.add_argument("--pausa", type=float, default=0.0, help="Segundos de espera entre lotes")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("RECIFRADO DE DATOS SENSIBLES")
+    print("=" * 60)
+    for tabla in TABLAS_RECIFRADO:
+        inicio = time.perf_counter()
+        resumen = recifrar_tabla(tabla, tamano_lote=args.lote, pausa=args.pausa)
+        duracion = time.perf_counter() - inicio
+        print(
+            f"✅ {tabla}: {resumen['recifrados']} recifrado(s), "
+            f"{resumen['conflictos']} conflicto(s) en {duracion:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Script para rotar la clave de cifrado de 'clave.key' sin detener la aplicación
+Ejecutar desde la raíz del proyecto:
+    python scripts/rotar_clave.py [--lote 500] [--pausa 0.05] [--retirar-antiguas]
+
+Recifra por lotes con transacciones cortas y guarda un checkpoint en
+'rotacion_clave.json'; si se interrumpe, basta con volver a ejecutarlo.
+Respalde 'clave.key' antes de usar --retirar-antiguas.
+"""
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from modulos.db.recifrado import rotar_clave, TAMANO_LOTE_RECIFRADO
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rota la clave de cifrado de los datos sensibles.")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE_RECIFRADO, help="Filas por lote")
+    parser.add_argument("--pausa", type=float, default=0.05, help="Segundos de espera entre lotes")
+    parser.add_argument(
+        "--retirar-antiguas", action="store_true",
+        help="Quita las claves antiguas de 'clave.key' si ninguna fila las usa"
+    )
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("ROTACIÓN DE CLAVE DE CIFRADO")
+    print("=" * 60)
+    inicio = time.perf_counter()
+    resultados = rotar_clave(args.lote, args.pausa, args.retirar_antiguas)
+    duracion = time.perf_counter() - inicio
+    pendientes = resultados.pop('pendientes')
+    total = sum(resumen['recifrados'] for resumen in resultados.values())
+    print(f"✅ {total} fila(s) recifradas en {duracion:.2f}s ({total / max(duracion, 1e-9):.0f} filas/s)")
+    if any(pendientes.values()):
+        print(f"⚠️ Filas que aún usan claves antiguas: {pendientes}")
+
+
+if __name__ == "__main__":
+    main()